@@ -1,178 +1,481 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
-from pathlib import Path
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+import asyncio
+import json
 import logging
-from app.models.card import Card as CardSchema, CardCreate, CardScanResponse
-from app.db.database import get_db
-from app.db.models import Card as CardModel
-from app.services.image_service import ImageService
-from app.services.vision_service import VisionService
+from app.models.card import (
+    Card as CardSchema, CardCreate, CardDetail, CardImportResult, CardPage, CardPrice,
+    CardScanResponse, CardSearchResults, CollectionStats
+)
+from app.models.catalog import CatalogMatch
+from app.models.job import JobAccepted, JobStatus, ScanJobAccepted
 from app.core.config import settings
+from app.core.responses import JSONResponse
+from app.db.database import get_db
+from app.db.models import Card as CardModel, CardImage, Job
+from app.db.writer import db_writer, write
+from app.services.batch_scan import BatchScanService
+from app.services import card_transfer
+from app.services import catalog
+from app.services.card_listing import get_card_row, list_cards
+from app.services.card_search import search_cards
+from app.services import collection_stats
+from app.services.collection_stats import CardFacts
+from app.services.extraction_service import get_extraction_service, resolve_mode
+from app.services.image_executor import get_image_executor
+from app.services.image_service import ImageService, StoredImage
+from app.services.job_queue import job_queue, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED
+from app.services.pricing import PRICE_REFRESH_JOB, PriceKey, PriceLookupError, get_pricing_service
+from app.services.scan_jobs import SCAN_JOB, hand_off_images
+from app.services.storage import get_storage_backend
+from app.services.vision_service import get_vision_service
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-@router.get("/cards", response_model=List[CardSchema])
-async def get_cards(db: Session = Depends(get_db)):
-    """Get all cards in the collection"""
-    cards = db.query(CardModel).order_by(CardModel.created_at.desc()).all()
-    return cards
+@router.get("/cards", response_model=CardPage)
+async def get_cards(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    sport: Optional[str] = None,
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    brand: Optional[str] = None,
+    set_name: Optional[str] = None,
+    player_name: Optional[str] = Query(None, description="Player name prefix"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of cards in the collection, newest first"""
+    # Rows are already plain dicts of the declared fields; returning the
+    # response directly skips re-validating them against response_model
+    page = await list_cards(
+        db,
+        limit=limit,
+        cursor=cursor,
+        fields=fields,
+        sport=sport,
+        year_min=year_min,
+        year_max=year_max,
+        brand=brand,
+        set_name=set_name,
+        player_name=player_name
+    )
+    return JSONResponse(page)
+
+
+@router.get("/cards/search", response_model=CardSearchResults)
+async def search_card_catalog(
+    q: str = Query(..., min_length=1, description="Search terms (matched as prefixes)"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Full-text search over player name, set, brand, card number and notes"""
+    return JSONResponse(await search_cards(db, q, limit=limit, offset=offset))
+
+
+@router.get("/cards/stats", response_model=CollectionStats)
+async def get_collection_stats(db: AsyncSession = Depends(get_db)):
+    """Collection size and value, overall and by sport, year and brand"""
+    return await collection_stats.get_stats(db)
+
+
+@router.get("/cards/export")
+async def export_cards(
+    format: str = Query("csv", description="csv, ndjson or parquet")
+):
+    """Download the whole collection, streamed in chunks"""
+    format = card_transfer.resolve_format(format)
+    return StreamingResponse(
+        card_transfer.export_cards(format),
+        media_type=card_transfer.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="cards.{format}"'}
+    )
 
 
-@router.post("/cards", response_model=CardSchema)
-async def create_card(card: CardCreate, db: Session = Depends(get_db)):
-    """Manually add a card to the collection"""
-    db_card = CardModel(**card.model_dump())
-    db.add(db_card)
-    db.commit()
-    db.refresh(db_card)
-    return db_card
-
+@router.post("/cards/import", response_model=CardImportResult)
+async def import_cards(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv, ndjson or parquet (default: from the file extension)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create cards in bulk from a CSV, NDJSON or Parquet file, reporting invalid rows"""
+    format = card_transfer.resolve_format(format, file.filename)
+    return await card_transfer.import_cards(db, file.file, format)
+
+
+@router.post("/catalog/import", response_model=CardImportResult)
+async def import_catalog(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv, ndjson or parquet (default: from the file extension)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Add set checklist entries (year, brand, set_name, card_number, player_name,
+    sport) to the reference catalog that scans are matched against
+    """
+    format = card_transfer.resolve_format(format, file.filename)
+    return await catalog.import_catalog(db, file.file, format)
+
+
+@router.get("/catalog/match", response_model=CatalogMatch)
+async def match_catalog(
+    player_name: Optional[str] = Query(None, description="Player name as read (fuzzy matched)"),
+    year: Optional[int] = None,
+    brand: Optional[str] = None,
+    card_number: Optional[str] = None,
+    set_name: Optional[str] = None
+):
+    """Identify a catalog card from partial or misread fields"""
+    index = await catalog.get_catalog()
+    found = index.match({
+        "player_name": player_name,
+        "year": year,
+        "brand": brand,
+        "card_number": card_number,
+        "set_name": set_name
+    })
+    if found is None:
+        raise HTTPException(status_code=404, detail="No single catalog card matches")
+    return {
+        "entry": found.record._asdict(),
+        "matched_on": found.matched_on,
+        "name_similarity": found.name_similarity
+    }
 
-@router.post("/cards/scan", response_model=CardScanResponse)
-async def scan_card(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Upload and scan a card image with automatic metadata extraction"""
-    # Validate content type early
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
 
-    # Create placeholder card first (to get ID for storage path)
-    db_card = CardModel(
-        player_name="Unknown Player",
-        notes=f"Scanned from file: {file.filename}"
-    )
-    db.add(db_card)
-    db.commit()
-    db.refresh(db_card)
+@router.post("/cards", response_model=CardSchema)
+async def create_card(card: CardCreate, db: AsyncSession = Depends(get_db)):
+    """Manually add a card to the collection"""
+    async def insert(session: AsyncSession) -> CardModel:
+        db_card = CardModel(**card.model_dump())
+        await collection_stats.card_added(session, db_card)
+        session.add(db_card)
+        await session.flush()
+        await session.refresh(db_card)
+        return db_card
+
+    return await write(db, insert)
+
+
+@router.post("/cards/scan", response_model=ScanJobAccepted, status_code=202)
+async def scan_card(
+    file: UploadFile = File(...),
+    back: Optional[UploadFile] = File(None, description="Photo of the card's back (optional)"),
+    extractor: Optional[str] = Query(None, description="cloud, local or auto (default: EXTRACTION_MODE)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Upload a card image and queue automatic metadata extraction
+
+    With a `back` image, both sides are processed in parallel and sent to the
+    vision model together, and the back is stored with the card. `extractor`
+    picks the vision API, local OCR, or OCR first with the API as fallback.
+    """
+    if extractor is not None:
+        resolve_mode(extractor)
+    # Validate content types early
+    for upload in (file, back):
+        if upload is not None and not (upload.content_type or "").startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+    # The image is stored under its content hash, so no card row is needed
+    # before processing; the card is written whole once metadata is extracted
+    image_service = ImageService()
+
+    async def queue_scan(session: AsyncSession) -> Tuple[Job, StoredImage, Optional[StoredImage]]:
+        image = await image_service.reference_image(session, stored)
+        payload = {
+            "image_url": image.image_url,
+            "image_srcset": image.image_srcset,
+            "content_hash": image.content_hash,
+            "filename": file.filename
+        }
+        if extractor is not None:
+            payload["extractor"] = extractor
+        back_image = None
+        if stored_back is not None:
+            back_image = await image_service.reference_image(session, stored_back)
+            payload["back"] = {
+                "image_url": back_image.image_url,
+                "image_srcset": back_image.image_srcset,
+                "content_hash": back_image.content_hash
+            }
+        return job_queue.create_job(session, SCAN_JOB, payload=payload), image, back_image
 
     try:
-        # Process and save image
-        image_service = ImageService()
-        image_url = await image_service.save_card_image(file, db_card.id)
-
-        # Update card with image URL
-        db_card.image_url = image_url
-        db.commit()
-
-        # Extract metadata using Vision API
-        metadata_extracted = False
-        extraction_confidence = None
-        extraction_error = None
-
-        vision_service = VisionService()
-        if settings.ENABLE_VISION_EXTRACTION and vision_service.is_available():
-            # Convert image_url to absolute file path
-            # image_url format: /uploads/{card_id}/{filename}
-            relative_path = image_url.lstrip('/uploads/')
-            image_path = Path(settings.UPLOAD_DIR) / relative_path
-
-            metadata, confidence, error = await vision_service.extract_card_metadata(
-                str(image_path)
-            )
-
-            if metadata:
-                # Update card with extracted metadata (only non-null values)
-                for key, value in metadata.items():
-                    if value is not None and hasattr(db_card, key):
-                        setattr(db_card, key, value)
-
-                db.commit()
-                metadata_extracted = True
-                extraction_confidence = confidence
-            else:
-                extraction_error = error
-                logger.warning(
-                    f"Vision API failed for card {db_card.id}: {error}"
-                )
+        # Process and save the image(s), then take their references and queue
+        # extraction in one commit; a failure rolls back with nothing to clean up
+        if back is None:
+            stored, stored_back = await image_service.save_card_image(file), None
         else:
-            if not settings.ENABLE_VISION_EXTRACTION:
-                logger.info("Vision extraction disabled via feature flag")
-            else:
-                logger.info("Vision service not available - skipping metadata extraction")
-
-        # Refresh to get updated values
-        db.refresh(db_card)
-
-        return {
-            "message": "Card scanned successfully",
-            "card_id": db_card.id,
-            "image_url": image_url,
-            "card": CardSchema.from_orm(db_card),
-            "metadata_extracted": metadata_extracted,
-            "extraction_confidence": extraction_confidence
-        }
-
+            stored, stored_back = await asyncio.gather(
+                image_service.save_card_image(file),
+                image_service.save_card_image(back)
+            )
+        job, image, back_image = await write(db, queue_scan)
     except HTTPException:
-        # Clean up card if image processing fails
-        db.delete(db_card)
-        db.commit()
         raise
     except Exception as e:
-        # Clean up card and raise generic error
         logger.exception(f"Error processing card scan: {str(e)}")
-        db.delete(db_card)
-        db.commit()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process image: {str(e)}"
         )
 
+    # The worker sends the renditions still in memory instead of reading them back
+    hand_off_images(job.id, stored.vision_image, stored_back.vision_image if stored_back else None)
+    job_queue.enqueue(job.id)
+    return {
+        "message": "Card image stored, metadata extraction queued",
+        "job_id": job.id,
+        "status": job.status,
+        "image_url": image.image_url,
+        "back_image_url": back_image.image_url if back_image else None
+    }
+
+
+@router.post("/cards/scan/batch")
+async def scan_cards_batch(
+    files: List[UploadFile] = File(...),
+    extractor: Optional[str] = Query(None, description="cloud, local or auto (default: EXTRACTION_MODE)")
+):
+    """
+    Scan many card images at once (multiple files and/or zip archives)
+
+    Streams one NDJSON line per image as its card is created, followed by a
+    summary line.
+    """
+    service = BatchScanService(extractor=resolve_mode(extractor) if extractor else None)
+    items = service.collect_items(files)
+    return StreamingResponse(service.stream(items), media_type="application/x-ndjson")
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Get the status of a background job, including the card once it finishes"""
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    result = json.loads(job.result) if job.result else {}
+    card = None
+    if job.status == JOB_SUCCEEDED and job.card_id:
+        card = await db.get(CardModel, job.card_id)
+
+    return JobStatus(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        card_id=job.card_id,
+        attempts=job.attempts,
+        error=job.error,
+        metadata_extracted=result.get("metadata_extracted"),
+        extraction_confidence=result.get("extraction_confidence"),
+        extraction_error=result.get("extraction_error"),
+        extraction_retry_job_id=result.get("extraction_retry_job_id"),
+        card=CardSchema.model_validate(card) if card else None,
+        result=result or None,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
 
-@router.get("/cards/{card_id}", response_model=CardSchema)
-async def get_card(card_id: int, db: Session = Depends(get_db)):
-    """Get a specific card by ID"""
-    card = db.query(CardModel).filter(CardModel.id == card_id).first()
+@router.get("/jobs/{job_id}/result", response_model=CardScanResponse)
+async def get_scan_result(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Get the result of a finished scan job"""
+    job = await db.get(Job, job_id)
+    if not job or job.kind != SCAN_JOB:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=409, detail=f"Scan job failed: {job.error}")
+    if job.status != JOB_SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Scan job is still {job.status}")
+
+    db_card = await db.get(CardModel, job.card_id) if job.card_id else None
+    if not db_card:
+        raise HTTPException(status_code=404, detail="Card not found")
+
+    result = json.loads(job.result) if job.result else {}
+    return {
+        "message": "Card scanned successfully",
+        "card_id": db_card.id,
+        "image_url": db_card.image_url,
+        "card": CardSchema.model_validate(db_card),
+        "metadata_extracted": result.get("metadata_extracted", False),
+        "extraction_confidence": result.get("extraction_confidence")
+    }
+
+
+@router.get("/cards/{card_id}", response_model=CardDetail)
+async def get_card(card_id: int, db: AsyncSession = Depends(get_db)):
+    """Get a specific card by ID, with its additional images"""
+    card = await get_card_row(db, card_id)
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
-    return card
+    images = await db.execute(
+        select(CardImage.side, CardImage.image_url, CardImage.image_srcset)
+        .where(CardImage.card_id == card_id)
+        .order_by(CardImage.side)
+    )
+    card["images"] = [image._asdict() for image in images]
+    return JSONResponse(card)
 
 
 @router.put("/cards/{card_id}", response_model=CardSchema)
-async def update_card(card_id: int, card: CardCreate, db: Session = Depends(get_db)):
+async def update_card(card_id: int, card: CardCreate, db: AsyncSession = Depends(get_db)):
     """Update a card"""
-    db_card = db.query(CardModel).filter(CardModel.id == card_id).first()
+    async def apply(session: AsyncSession) -> Optional[CardModel]:
+        db_card = await session.get(CardModel, card_id)
+        if db_card is None:
+            return None
+        before = CardFacts.of(db_card)
+        for key, value in card.model_dump().items():
+            setattr(db_card, key, value)
+        await collection_stats.card_updated(session, before, db_card)
+        await session.flush()
+        await session.refresh(db_card)
+        return db_card
+
+    db_card = await write(db, apply)
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found")
-
-    for key, value in card.model_dump().items():
-        setattr(db_card, key, value)
-
-    db.commit()
-    db.refresh(db_card)
     return db_card
 
 
 @router.delete("/cards/{card_id}")
-async def delete_card(card_id: int, db: Session = Depends(get_db)):
+async def delete_card(card_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a card"""
-    db_card = db.query(CardModel).filter(CardModel.id == card_id).first()
+    db_card = await db.get(CardModel, card_id)
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found")
 
-    # Delete associated image if exists
-    if db_card.image_url:
-        image_service = ImageService()
-        await image_service.delete_card_image(db_card.image_url)
-
-    db.delete(db_card)
-    db.commit()
+    image_service = ImageService()
+
+    async def remove(session: AsyncSession) -> List[str]:
+        db_card = await session.get(CardModel, card_id)
+        if db_card is None:
+            return []
+        # Release the images with the row, so their refcounts commit together
+        urls = []
+        if db_card.image_url:
+            urls += await image_service.release_image(session, db_card.image_url, db_card.image_srcset)
+        extra_images = await session.execute(
+            select(CardImage.image_url, CardImage.image_srcset).where(CardImage.card_id == card_id)
+        )
+        for image in extra_images.all():
+            urls += await image_service.release_image(session, image.image_url, image.image_srcset)
+        await collection_stats.card_removed(session, db_card)
+        await session.execute(delete(CardImage).where(CardImage.card_id == card_id))
+        await session.delete(db_card)
+        return urls
+
+    # Files go only once nothing in the database points at them
+    await image_service.delete_files(await write(db, remove))
     return {"message": "Card deleted successfully"}
 
 
-@router.get("/cards/{card_id}/price")
-async def get_card_price(card_id: int, db: Session = Depends(get_db)):
-    """Get price information for a card using AI agents"""
-    card = db.query(CardModel).filter(CardModel.id == card_id).first()
+@router.get("/cards/{card_id}/price", response_model=CardPrice)
+async def get_card_price(
+    card_id: int,
+    refresh: bool = Query(False, description="Fetch fresh prices even if a stored price has not expired"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get market price information for a card"""
+    card = await db.get(CardModel, card_id)
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
 
-    # TODO: Implement AI agent for price discovery
+    pricing = get_pricing_service()
+    if not pricing.is_available():
+        raise HTTPException(status_code=503, detail="No price sources configured")
+
+    # Return the connection to the pool before a possibly slow market lookup
+    key = PriceKey.from_card(card)
+    await db.close()
+
+    try:
+        price = await pricing.get_price(key, refresh=refresh)
+    except PriceLookupError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if price.average_price is None:
+        raise HTTPException(status_code=404, detail="No market data found for this card")
+
+    return CardPrice(
+        card_id=card_id,
+        average_price=price.average_price,
+        low_price=price.low_price,
+        high_price=price.high_price,
+        currency=price.currency,
+        sample_size=price.sample_size,
+        last_updated=price.fetched_at,
+        sources=price.sources or []
+    )
+
+
+@router.post("/prices/refresh", response_model=JobAccepted, status_code=202)
+async def refresh_prices(
+    force: bool = Query(False, description="Also refetch prices that have not expired"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue a job that reprices every card in the collection"""
+    if not get_pricing_service().is_available():
+        raise HTTPException(status_code=503, detail="No price sources configured")
+
+    # One refresh at a time; a second request joins the pending one
+    pending = (await db.execute(
+        select(Job)
+        .where(Job.kind == PRICE_REFRESH_JOB, Job.status.in_([JOB_QUEUED, JOB_RUNNING]))
+        .limit(1)
+    )).scalar_one_or_none()
+    if pending is not None:
+        return {"message": "Price refresh already in progress", "job_id": pending.id, "status": pending.status}
+
+    async def queue_refresh(session: AsyncSession) -> Job:
+        return job_queue.create_job(session, PRICE_REFRESH_JOB, payload={"force": force})
+
+    job = await write(db, queue_refresh)
+    job_queue.enqueue(job.id)
+    return {"message": "Price refresh queued", "job_id": job.id, "status": job.status}
+
+
+@router.get("/images/{file_path:path}")
+async def get_image(file_path: str):
+    """Redirect to a direct (e.g. presigned) URL for a stored image"""
+    # Signing is local; a missing object 404s at the storage service
+    url = await get_storage_backend().get_download_url(file_path)
+    # Let clients reuse the redirect for part of the URL's lifetime
+    return RedirectResponse(
+        url,
+        status_code=307,
+        headers={"Cache-Control": f"private, max-age={settings.S3_PRESIGN_EXPIRY // 2}"}
+    )
+
+
+@router.get("/vision/cache/stats")
+async def get_vision_cache_stats():
+    """Get hit/miss counters for the vision result cache"""
+    cache = get_vision_service().cache
+    if cache is None:
+        return {"enabled": False}
+    return await cache.stats()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Get queue depth and throughput for background work"""
     return {
-        "card_id": card_id,
-        "player_name": card.player_name,
-        "average_price": 0.0,
-        "sources": []
+        "image_executor": get_image_executor().stats(),
+        "db_writer": db_writer.stats(),
+        "pricing": get_pricing_service().stats(),
+        "vision": get_vision_service().stats(),
+        "extraction": get_extraction_service().stats(),
+        "catalog": {"entries": len(await catalog.get_catalog())},
+        "job_queue": {"queued": job_queue.depth()}
     }
@@ -0,0 +1,34 @@
+"""
+Rebuild collection statistics from the cards and card_prices tables
+
+Recomputes every card's price key and the collection_stats aggregates in one
+transaction. Use it to backfill after upgrading, after loading cards directly
+into the database, or if the incrementally maintained totals look wrong.
+
+Usage (from backend/):
+    python -m app.commands.rebuild_stats
+"""
+import argparse
+import asyncio
+import logging
+from app.db.database import close_db, init_db
+from app.services import collection_stats
+
+
+async def run() -> int:
+    await init_db()
+    try:
+        return await collection_stats.rebuild()
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    argparse.ArgumentParser(description=__doc__.splitlines()[1]).parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    cards = asyncio.run(run())
+    print(f"Rebuilt statistics for {cards} cards")
+
+
+if __name__ == '__main__':
+    main()
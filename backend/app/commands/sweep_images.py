@@ -0,0 +1,45 @@
+"""
+Delete stored image blob files that no blob row refers to
+
+Collects renditions written for scans that were rolled back, and files of
+deleted blobs that were skipped because they had just been written. The
+running app does the same every BLOB_SWEEP_INTERVAL_SECONDS; use this when
+that is disabled or to reclaim space right away.
+
+Usage (from backend/):
+    python -m app.commands.sweep_images [--grace-seconds N]
+"""
+import argparse
+import asyncio
+import logging
+from typing import Optional
+from app.db.database import close_db, init_db
+from app.services.image_executor import shutdown_image_executor
+from app.services.image_service import ImageService
+from app.services.storage import close_storage_backend
+
+
+async def run(grace_seconds: Optional[float]) -> int:
+    await init_db()
+    try:
+        return await ImageService().sweep_orphans(grace_seconds)
+    finally:
+        await close_storage_backend()
+        await shutdown_image_executor()
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--grace-seconds', type=float, default=None,
+        help='Keep files modified more recently than this (default: BLOB_ORPHAN_GRACE_SECONDS)'
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    deleted = asyncio.run(run(args.grace_seconds))
+    print(f"Deleted {deleted} orphaned image files")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+from typing import Dict
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Allowance for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject upload requests whose body exceeds a per-path limit
+
+    The Content-Length header is checked up front; the body is also counted
+    as it streams in, so an oversized upload is cut off as soon as it crosses
+    the limit instead of being spooled to disk in full first.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        """
+        Args:
+            app: Wrapped ASGI application
+            limits: Maximum body size in bytes, keyed by request path
+        """
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        too_large = HTTPException(
+            status_code=413,
+            detail=f"Request too large. Maximum size is {limit / (1024*1024):.1f}MB"
+        )
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(too_large, scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised as an HTTPException so body parsing passes it through
+                    raise too_large
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            if e is not too_large or response_started:
+                raise
+            await self._reject(too_large, scope, receive, send)
+
+    @staticmethod
+    async def _reject(error: HTTPException, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+        await response(scope, receive, send)
@@ -0,0 +1,226 @@
+"""
+Static serving of uploaded card images
+
+Processed images are stored under filenames that embed a hash of their
+content, so a URL always refers to the same bytes. Those files are served
+with a far-future immutable Cache-Control and the hash as a strong ETag;
+anything else (e.g. images uploaded before content hashing) gets an
+mtime/size ETag and must be revalidated. Conditional GETs are answered with
+304 and single byte ranges with 206.
+
+The body is handed to the server with the ASGI zero-copy send extension when
+the server offers it, to nginx via X-Accel-Redirect when UPLOADS_ACCEL_REDIRECT
+is set, and otherwise streamed in chunks.
+"""
+import os
+import re
+from email.utils import formatdate, parsedate
+from typing import Dict, Optional, Tuple
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Receive, Scope, Send
+from app.core.config import settings
+
+# {name}.{16 hex digit content hash}.{ext}, as written by ImageService
+CONTENT_HASH_PATTERN = re.compile(r"\.([0-9a-f]{16})\.[A-Za-z0-9]+$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def content_etag(path: str, stat_result: os.stat_result) -> Tuple[str, bool]:
+    """
+    Strong ETag for a stored file
+
+    Returns:
+        Tuple of (quoted ETag, True if the filename carries a content hash)
+    """
+    match = CONTENT_HASH_PATTERN.search(path)
+    if match:
+        return f'"{match.group(1)}"', True
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"', False
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header into inclusive (start, end)
+
+    Returns:
+        (start, end), or None if the header should be ignored (malformed or
+        multiple ranges; the full file is served)
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class ImageFileResponse(FileResponse):
+    """FileResponse that can send a byte range and use zero-copy sends"""
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: PathLike,
+        stat_result: os.stat_result,
+        headers: Dict[str, str],
+        method: Optional[str] = None,
+        byte_range: Optional[Tuple[int, int]] = None
+    ):
+        """
+        Args:
+            path: File to send
+            stat_result: os.stat() of the file
+            headers: Extra response headers (ETag, Cache-Control, ...)
+            method: Request method (HEAD sends headers only)
+            byte_range: Inclusive (start, end) to send with 206, or None for the whole file
+        """
+        headers = dict(headers)
+        headers["accept-ranges"] = "bytes"
+        self.offset, last = byte_range or (0, stat_result.st_size - 1)
+        self.count = last - self.offset + 1
+        if byte_range is not None:
+            headers["content-range"] = f"bytes {self.offset}-{last}/{stat_result.st_size}"
+            headers["content-length"] = str(self.count)
+        super().__init__(
+            path,
+            status_code=206 if byte_range is not None else 200,
+            headers=headers,
+            stat_result=stat_result,
+            method=method
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get("extensions") or {}
+        if settings.UPLOADS_ACCEL_REDIRECT and not self.send_header_only:
+            # nginx serves the body from an internal location with sendfile
+            relative = os.path.relpath(self.path, settings.UPLOAD_DIR)
+            self.headers["x-accel-redirect"] = (
+                settings.UPLOADS_ACCEL_REDIRECT.rstrip("/") + "/" + relative
+            )
+
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if self.send_header_only or settings.UPLOADS_ACCEL_REDIRECT or self.count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.offset)
+                remaining = self.count
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining = remaining - len(chunk) if chunk else 0
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    })
+
+        if self.background is not None:
+            await self.background()
+
+
+class ImageStaticFiles(StaticFiles):
+    """StaticFiles with immutable caching, strong ETags and range requests"""
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        if status_code != 200:
+            # e.g. a 404.html page in html mode
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        etag, immutable = content_etag(str(full_path), stat_result)
+        headers = {
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "cache-control": (
+                f"public, max-age={settings.UPLOADS_CACHE_MAX_AGE}, immutable"
+                if immutable else REVALIDATE_CACHE_CONTROL
+            ),
+        }
+
+        if self._not_modified(request_headers, headers, stat_result):
+            return NotModifiedResponse(Headers(headers=headers))
+
+        byte_range = None
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and scope["method"] == "GET" and (if_range is None or if_range == etag):
+            try:
+                byte_range = parse_range(range_header, stat_result.st_size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={"content-range": f"bytes */{stat_result.st_size}"}
+                )
+
+        return ImageFileResponse(
+            full_path,
+            stat_result=stat_result,
+            headers=headers,
+            method=scope["method"],
+            byte_range=byte_range
+        )
+
+    @staticmethod
+    def _not_modified(
+        request_headers: Headers,
+        response_headers: Dict[str, str],
+        stat_result: os.stat_result
+    ) -> bool:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, response_headers["etag"])
+
+        if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+        last_modified = parsedate(response_headers["last-modified"])
+        return (
+            if_modified_since is not None
+            and last_modified is not None
+            and if_modified_since >= last_modified
+        )
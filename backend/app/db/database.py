@@ -1,26 +1,108 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import AsyncIterator
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from app.core.config import settings
+from app.db.fts import init_fts
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
-)
+# Async drivers used when DATABASE_URL names only the dialect
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "postgres": "asyncpg",
+}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def async_database_url(url: str) -> str:
+    """
+    Map a DATABASE_URL onto its async driver
+
+    sqlite:///./cards.db becomes sqlite+aiosqlite:///./cards.db and
+    postgresql://... becomes postgresql+asyncpg://...; URLs that already name
+    a driver are used as is.
+    """
+    parsed = make_url(url)
+    if "+" in parsed.drivername:
+        return url
+    backend = parsed.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"Unsupported database: {backend}")
+    dialect = "postgresql" if backend == "postgres" else backend
+    return parsed.set(drivername=f"{dialect}+{driver}").render_as_string(hide_password=False)
+
+
+def _engine_options(url: str) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        # One file, no server: SQLAlchemy's default SQLite pooling applies
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+DATABASE_URL = async_database_url(settings.DATABASE_URL)
+
+engine = create_async_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+
+def sqlite_pragmas() -> dict:
+    """Per-connection SQLite settings for the performance profile"""
+    return {
+        # Readers see a snapshot and never block on the writer
+        "journal_mode": "WAL",
+        # Durable at checkpoints; safe against corruption in WAL mode
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
+
+
+if IS_SQLITE and settings.SQLITE_TUNING:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+# Objects stay usable after commit; an async session can't lazy-load expired attributes
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
 
 Base = declarative_base()
 
 
-def get_db():
+def upsert_insert(db: AsyncSession):
+    """INSERT construct supporting ON CONFLICT for the session's database"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql_insert
+    return sqlite_insert
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
     """Dependency for getting database sessions"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db():
-    """Create all database tables"""
-    Base.metadata.create_all(bind=engine)
+async def init_db():
+    """Create all database tables and the search index"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(init_fts)
+
+
+async def close_db():
+    """Close pooled connections (called at shutdown)"""
+    await engine.dispose()
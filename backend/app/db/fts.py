@@ -0,0 +1,83 @@
+"""
+SQLite FTS5 index over the card catalog
+
+``cards_fts`` is an external-content FTS5 table: it stores only the inverted
+index and reads column values from ``cards``. Triggers keep it in sync on
+every insert, update and delete.
+"""
+import logging
+from typing import Union
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "cards_fts"
+FTS_COLUMNS = ["player_name", "set_name", "brand", "card_number", "notes"]
+
+_columns = ", ".join(FTS_COLUMNS)
+_new_values = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+_old_values = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+
+FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_columns},
+        content='cards',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.id, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE OF {_columns} ON cards BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+]
+
+
+def fts_supported(bind: Union[Connection, Engine]) -> bool:
+    """FTS5 is only available on SQLite"""
+    return bind.dialect.name == "sqlite"
+
+
+def init_fts(conn: Connection) -> None:
+    """
+    Create the FTS table and triggers, backfilling existing cards on first run
+
+    Args:
+        conn: Connection inside a transaction
+    """
+    if not fts_supported(conn):
+        return
+
+    existed = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    ).first() is not None
+
+    for statement in FTS_DDL:
+        conn.execute(text(statement))
+
+    if not existed:
+        rebuild_fts(conn)
+
+
+def rebuild_fts(conn: Connection) -> None:
+    """Rebuild the FTS index from the cards table"""
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    logger.info("Rebuilt card search index")
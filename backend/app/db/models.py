@@ -1,7 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index, JSON, Float
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.sql import func
 from app.db.database import Base
 
+# SQLite stores CURRENT_TIMESTAMP without fractional seconds; bind datetimes in
+# the same format so comparisons against server-generated values (keyset
+# cursors) are exact
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite"
+)
+
 
 class Card(Base):
     __tablename__ = "cards"
@@ -16,8 +27,173 @@ class Card(Base):
     condition = Column(String(50), nullable=True)
     notes = Column(Text, nullable=True)
     image_url = Column(String(500), nullable=True)
+    image_srcset = Column(JSON, nullable=True)  # format -> pixel width -> URL
+    price_key = Column(String(32), nullable=True, index=True)  # PriceKey digest, links to card_prices
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Keyset pagination order for listing (newest first)
+        Index("ix_cards_created_at_id", "created_at", "id"),
+    )
+
+    def __repr__(self):
+        return f"<Card(id={self.id}, player_name='{self.player_name}', year={self.year})>"
+
+
+class CardImage(Base):
+    """Additional photo of a card; the front stays on cards.image_url"""
+    __tablename__ = "card_images"
+
+    id = Column(Integer, primary_key=True)
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), nullable=False)
+    side = Column(String(20), nullable=False)  # "back"
+    image_url = Column(String(500), nullable=False)
+    image_srcset = Column(JSON, nullable=True)  # format -> pixel width -> URL
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_card_images_card_side", "card_id", "side", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<CardImage(card_id={self.card_id}, side='{self.side}')>"
+
+
+class Job(Base):
+    """Background job persisted so queued work survives restarts"""
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    card_id = Column(Integer, ForeignKey("cards.id", ondelete="SET NULL"), nullable=True, index=True)
+    payload = Column(Text, nullable=True)  # JSON-encoded job input
+    result = Column(Text, nullable=True)  # JSON-encoded job output
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Process holding a running job, and when its lease lapses unless renewed
+    lease_owner = Column(String(32), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     def __repr__(self):
-        return f"<Card(id={self.id}, player_name='{self.player_name}', year={self.year})>"
+        return f"<Job(id='{self.id}', kind='{self.kind}', status='{self.status}')>"
+
+
+class VisionCacheEntry(Base):
+    """Cached vision extraction result keyed by perceptual image hash"""
+    __tablename__ = "vision_cache"
+
+    id = Column(Integer, primary_key=True)
+    model = Column(String(100), nullable=False)
+    prompt_hash = Column(String(16), nullable=False)
+    image_hash = Column(String(16), nullable=False)  # 64-bit dHash as hex
+    # 16-bit bands of image_hash; any hash within 3 bits shares at least one band
+    band0 = Column(String(4), nullable=False)
+    band1 = Column(String(4), nullable=False)
+    band2 = Column(String(4), nullable=False)
+    band3 = Column(String(4), nullable=False)
+    extracted_metadata = Column(Text, nullable=False)  # JSON-encoded metadata dict
+    confidence = Column(String(20), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    last_accessed_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_vision_cache_key", "model", "prompt_hash", "image_hash"),
+        Index("ix_vision_cache_band0", "model", "prompt_hash", "band0"),
+        Index("ix_vision_cache_band1", "model", "prompt_hash", "band1"),
+        Index("ix_vision_cache_band2", "model", "prompt_hash", "band2"),
+        Index("ix_vision_cache_band3", "model", "prompt_hash", "band3"),
+    )
+
+    def __repr__(self):
+        return f"<VisionCacheEntry(id={self.id}, image_hash='{self.image_hash}')>"
+
+
+class ImageBlob(Base):
+    """Processed image stored once per distinct upload, shared by reference"""
+    __tablename__ = "image_blobs"
+
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False, unique=True)  # BLAKE2b of the original upload
+    relative_path = Column(String(500), nullable=False)  # Full-size JPEG in storage
+    image_url = Column(String(500), nullable=False, unique=True)
+    image_srcset = Column(JSON, nullable=True)
+    refcount = Column(Integer, nullable=False, default=1)  # Cards using this blob
+    extracted_metadata = Column(JSON, nullable=True)  # Vision result, reused by duplicates
+    extraction_confidence = Column(String(20), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ImageBlob(id={self.id}, content_hash='{self.content_hash}', refcount={self.refcount})>"
+
+
+class MarketPrice(Base):
+    """Aggregated market price for one normalized card identity, cached with a TTL"""
+    __tablename__ = "card_prices"
+
+    id = Column(Integer, primary_key=True)
+    price_key = Column(String(32), nullable=False, unique=True)  # Hash of the normalized fields below
+    player_name = Column(String(255), nullable=False)
+    year = Column(Integer, nullable=True)
+    brand = Column(String(100), nullable=False, default="")
+    card_number = Column(String(50), nullable=False, default="")
+    set_name = Column(String(255), nullable=False, default="")
+    average_price = Column(Float, nullable=True)  # Null when no source had data
+    low_price = Column(Float, nullable=True)
+    high_price = Column(Float, nullable=True)
+    currency = Column(String(3), nullable=False, default="USD")
+    sample_size = Column(Integer, nullable=False, default=0)  # Sales/listings behind the average
+    sources = Column(JSON, nullable=True)  # Names of sources that returned data
+    fetched_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<MarketPrice(price_key='{self.price_key}', average_price={self.average_price})>"
+
+
+class CollectionStat(Base):
+    """Running totals for one bucket of the collection (see services.collection_stats)"""
+    __tablename__ = "collection_stats"
+
+    id = Column(Integer, primary_key=True)
+    dimension = Column(String(20), nullable=False)  # "total", "sport", "year" or "brand"
+    bucket = Column(String(255), nullable=False, default="")  # Dimension value; "" when unset
+    card_count = Column(Integer, nullable=False, default=0)
+    priced_count = Column(Integer, nullable=False, default=0)  # Cards with a market price
+    total_value = Column(Float, nullable=False, default=0.0)  # Sum of average prices
+
+    __table_args__ = (
+        Index("ix_collection_stats_bucket", "dimension", "bucket", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<CollectionStat(dimension='{self.dimension}', bucket='{self.bucket}', card_count={self.card_count})>"
+
+
+class CatalogCard(Base):
+    """Reference checklist entry: a card as issued (see services.catalog)"""
+    __tablename__ = "catalog_cards"
+
+    id = Column(Integer, primary_key=True)
+    entry_key = Column(String(32), nullable=False, unique=True)  # Hash of normalized year/brand/set/number
+    player_name = Column(String(255), nullable=False)
+    year = Column(Integer, nullable=False)
+    brand = Column(String(100), nullable=False)
+    set_name = Column(String(255), nullable=True)
+    card_number = Column(String(50), nullable=False)
+    sport = Column(String(50), nullable=True)
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<CatalogCard(year={self.year}, brand='{self.brand}', card_number='{self.card_number}')>"
+
+
+class CatalogVersion(Base):
+    """Single row counting catalog imports, so processes can tell their index is stale"""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)  # Bumped by every write to catalog_cards
@@ -0,0 +1,168 @@
+"""
+Single-writer queue for SQLite
+
+SQLite allows one writer at a time. When every request commits on its own
+connection, concurrent writers contend for the lock, wait out busy_timeout
+and can still fail with "database is locked". Instead, write operations are
+handed to one task that runs them back to back on a single connection and
+commits each batch once. With WAL journaling, readers keep using their own
+connections and never wait behind the writer.
+
+On other databases (or with SQLITE_SINGLE_WRITER off) the writer is not
+started and `write` runs the operation on the caller's session.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Receives the writer's session; flushes but never commits
+WriteOp = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class DatabaseWriter:
+    """Runs queued write operations on one task, committing them in batches"""
+
+    def __init__(self, max_batch: Optional[int] = None):
+        """
+        Args:
+            max_batch: Most operations committed together (defaults to settings)
+        """
+        self.max_batch = max_batch or settings.DB_WRITE_BATCH_SIZE
+        self._queue: "asyncio.Queue[Tuple[WriteOp, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.batches = 0
+        self.operations = 0
+        self.retried_batches = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Start the writer task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="db-writer")
+
+    async def stop(self) -> None:
+        """Finish queued writes, then stop the writer task"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def submit(self, op: WriteOp) -> Any:
+        """
+        Queue a write operation and wait until it is committed
+
+        Args:
+            op: Coroutine function receiving the writer's session
+
+        Returns:
+            The operation's return value (ORM objects come back detached,
+            with their loaded attributes intact)
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "running": self.is_running,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "operations": self.operations,
+            "avg_batch_size": round(self.operations / self.batches, 2) if self.batches else 0.0,
+            "retried_batches": self.retried_batches
+        }
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                logger.exception(f"Database writer batch failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit_batch(self, batch: List[Tuple[WriteOp, asyncio.Future]]) -> None:
+        # Callers that gave up (e.g. disconnected clients) don't need their write
+        batch = [(op, future) for op, future in batch if not future.cancelled()]
+        if not batch:
+            return
+        self.batches += 1
+        self.operations += len(batch)
+
+        async with SessionLocal() as db:
+            try:
+                results = [await op(db) for op, _ in batch]
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                if len(batch) == 1:
+                    raise
+                results = None
+
+        if results is not None:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            return
+
+        # One operation failed; commit the rest individually so only it fails
+        self.retried_batches += 1
+        for op, future in batch:
+            async with SessionLocal() as db:
+                try:
+                    result = await op(db)
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+
+
+# Process-wide writer, started in the application lifespan for SQLite
+db_writer = DatabaseWriter()
+
+
+async def write(db: AsyncSession, op: WriteOp) -> Any:
+    """
+    Run a write operation through the single writer if it is running,
+    otherwise on the given session, and commit it
+
+    Args:
+        db: The caller's session (used when there is no writer)
+        op: Coroutine function receiving the session to write with
+
+    Returns:
+        The operation's return value
+    """
+    if db_writer.is_running:
+        return await db_writer.submit(op)
+    try:
+        result = await op(db)
+        await db.commit()
+    except Exception:
+        # Leave the session usable, as the writer does
+        await db.rollback()
+        raise
+    return result
@@ -2,11 +2,26 @@ from contextlib import asynccontextmanager
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from app.api import routes
 from app.core.config import settings
-from app.db.database import init_db
+from app.core.middleware import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD
+from app.core.responses import JSONResponse
+from app.core.static import ImageStaticFiles
+from app.db.database import IS_SQLITE, close_db, init_db
+from app.db.writer import db_writer
+from app.services import collection_stats
+from app.services.catalog import init_catalog
+from app.services.image_executor import init_image_executor, shutdown_image_executor
+from app.services.image_service import start_orphan_sweeper, stop_orphan_sweeper
+from app.services.extraction_service import close_extraction_service, init_extraction_service
+from app.services.job_queue import job_queue
+from app.services.pricing import (
+    PRICE_REFRESH_JOB, close_pricing_service, init_pricing_service, process_price_refresh_job
+)
+from app.services.scan_jobs import SCAN_JOB, process_scan_job, release_scan_images
+from app.services.storage import close_storage_backend
+from app.services.vision_service import init_vision_service, close_vision_service
 
 # Configure logging
 logging.basicConfig(
@@ -17,17 +32,39 @@ logging.basicConfig(
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Initialize database
-    init_db()
+    # Startup: Initialize database, shared clients and background workers
+    await init_db()
+    await collection_stats.init()
+    await init_catalog()
+    if IS_SQLITE and settings.SQLITE_SINGLE_WRITER:
+        db_writer.start()
+    init_vision_service()
+    init_extraction_service()
+    init_pricing_service()
+    init_image_executor()
+    job_queue.register(SCAN_JOB, process_scan_job, on_failure=release_scan_images)
+    job_queue.register(PRICE_REFRESH_JOB, process_price_refresh_job)
+    await job_queue.start(settings.SCAN_WORKERS)
+    start_orphan_sweeper()
     yield
-    # Shutdown: cleanup if needed
+    # Shutdown: stop workers (unfinished jobs resume on next start)
+    await stop_orphan_sweeper()
+    await job_queue.stop()
+    await db_writer.stop()
+    await close_extraction_service()
+    await close_vision_service()
+    await close_pricing_service()
+    await close_storage_backend()
+    await shutdown_image_executor()
+    await close_db()
 
 
 app = FastAPI(
     title="Card Collection Tracker API",
     description="API for tracking sports card collections",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=JSONResponse
 )
 
 # CORS middleware for frontend
@@ -39,10 +76,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Ensure upload directory exists and mount static files
+# Cut off oversized uploads while they stream in
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/api/cards/scan": 2 * settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,  # front + back
+        "/api/cards/scan/batch": settings.BATCH_SCAN_MAX_BYTES,
+        "/api/cards/import": settings.IMPORT_MAX_BYTES + MULTIPART_OVERHEAD,
+        "/api/catalog/import": settings.IMPORT_MAX_BYTES + MULTIPART_OVERHEAD,
+    }
+)
+
+# Ensure upload directory exists and mount static files (content-hashed
+# filenames are served as immutable, with ETags and range support)
 upload_dir = Path(settings.UPLOAD_DIR)
 upload_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(upload_dir)), name="uploads")
+app.mount("/uploads", ImageStaticFiles(directory=str(upload_dir)), name="uploads")
 
 # Include API routes
 app.include_router(routes.router, prefix="/api")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 
@@ -21,6 +21,8 @@ class CardCreate(CardBase):
 class Card(CardBase):
     id: int
     image_url: Optional[str] = None
+    # Derivative URLs by format then pixel width, e.g. {"webp": {"96": url, ...}}
+    image_srcset: Optional[Dict[str, Dict[str, str]]] = None
     created_at: datetime
     updated_at: datetime
 
@@ -28,6 +30,51 @@ class Card(CardBase):
         from_attributes = True
 
 
+class CardImage(BaseModel):
+    """Additional photo of a card, e.g. its back"""
+    side: str
+    image_url: str
+    image_srcset: Optional[Dict[str, Dict[str, str]]] = None
+
+    class Config:
+        from_attributes = True
+
+
+class CardDetail(Card):
+    """A card with its additional photos"""
+    images: List[CardImage] = []
+
+
+class CardPage(BaseModel):
+    """One page of a keyset-paginated card listing"""
+    items: List[Dict[str, Any]]  # Full cards, or only the requested fields
+    next_cursor: Optional[str] = None  # Pass as `cursor` to fetch the next page
+
+
+class CardSearchResults(BaseModel):
+    """Ranked full-text search results"""
+    items: List[Card]
+    next_offset: Optional[int] = None  # Pass as `offset` to fetch the next page
+
+
+class ImportFieldError(BaseModel):
+    field: Optional[str] = None  # None if the row itself could not be parsed
+    message: str
+
+
+class ImportRowError(BaseModel):
+    row: int  # Data row number, counting from 1 (CSV header excluded)
+    errors: List[ImportFieldError]
+
+
+class CardImportResult(BaseModel):
+    """Outcome of a bulk import; valid rows are created even if others fail"""
+    total: int
+    created: int
+    failed: int
+    errors: List[ImportRowError]  # At most IMPORT_MAX_ERRORS, in row order
+
+
 class CardScanResponse(BaseModel):
     """Response schema for card scanning endpoint"""
     message: str
@@ -46,5 +93,26 @@ class CardPrice(BaseModel):
     average_price: float
     low_price: Optional[float] = None
     high_price: Optional[float] = None
+    currency: str = "USD"
+    sample_size: int = 0  # Sales/listings behind the average, across all sources
     last_updated: datetime
     sources: list[str] = []
+
+
+class StatsBucket(BaseModel):
+    """Totals for one sport, year or brand"""
+    value: Optional[str] = None  # None groups cards with the field unset
+    card_count: int
+    priced_count: int
+    total_value: float
+
+
+class CollectionStats(BaseModel):
+    """Collection totals, maintained incrementally as cards and prices change"""
+    total_cards: int
+    priced_cards: int  # Cards with a market price (see GET /cards/{id}/price)
+    total_value: float
+    currency: str
+    by_sport: List[StatsBucket]
+    by_year: List[StatsBucket]
+    by_brand: List[StatsBucket]
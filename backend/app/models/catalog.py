@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class CatalogEntryCreate(BaseModel):
+    """One row of a set checklist"""
+    player_name: str
+    year: int
+    brand: str
+    card_number: str
+    set_name: Optional[str] = None
+    sport: Optional[str] = None
+
+
+class CatalogEntry(CatalogEntryCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+class CatalogMatch(BaseModel):
+    """Catalog entry identified from (possibly partial or misread) card fields"""
+    entry: CatalogEntry
+    matched_on: str  # "card_number" (number + year + brand) or "player_name"
+    name_similarity: Optional[float] = None  # Trigram similarity of the given player name (0-1)
@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+from app.models.card import Card
+
+
+class JobAccepted(BaseModel):
+    """Response for work that was accepted and queued as a background job"""
+    message: str
+    job_id: str
+    status: str
+
+
+class ScanJobAccepted(JobAccepted):
+    """Response for a scan that was accepted and queued for extraction"""
+    image_url: str
+    back_image_url: Optional[str] = None  # Set for front/back scans
+
+
+class JobStatus(BaseModel):
+    """Current state of a background job"""
+    id: str
+    kind: str
+    status: str
+    card_id: Optional[int] = None
+    attempts: int
+    error: Optional[str] = None
+    metadata_extracted: Optional[bool] = None
+    extraction_confidence: Optional[str] = None
+    extraction_error: Optional[str] = None
+    extraction_retry_job_id: Optional[str] = None  # Scan job retrying extraction once the vision API is back
+    card: Optional[Card] = None
+    result: Optional[Dict[str, Any]] = None  # Raw job output (e.g. price refresh counts)
+    created_at: datetime
+    updated_at: datetime
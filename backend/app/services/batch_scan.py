@@ -0,0 +1,332 @@
+"""
+Batch scanning of many card images in one request
+
+Images are decoded and resized on the image executor, stored concurrently
+(identical images only once), and sent to the vision API with bounded
+concurrency. Finished cards are written together with their image references
+in bulk inserts and reported back as NDJSON lines as each insert commits.
+Cards whose extraction failed while the vision API was down get a scan job
+that retries it later, as single scans do.
+"""
+import asyncio
+import json
+import logging
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Card as CardModel
+from app.db.writer import write
+from app.services import collection_stats
+from app.services.blob_store import hash_upload
+from app.services.catalog import UNKNOWN_PLAYER
+from app.services.extraction_service import ExtractionService, get_extraction_service
+from app.services.image_executor import ImageExecutor, get_image_executor
+from app.services.image_processor import ImageProcessor
+from app.services.image_service import ImageService, StoredImage
+from app.services.job_queue import job_queue
+from app.services.storage import StorageBackend, get_storage_backend
+from app.services.scan_jobs import extract_metadata, queue_retry
+
+logger = logging.getLogger(__name__)
+
+ZIP_CONTENT_TYPES = {'application/zip', 'application/x-zip-compressed'}
+ZIP_IMAGE_TYPES = {
+    '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+    '.webp': 'image/webp', '.heic': 'image/heic', '.heif': 'image/heif'
+}
+
+
+@dataclass
+class BatchItem:
+    """One image in a batch; bytes are read lazily to bound memory"""
+    index: int
+    filename: str
+    content_type: str
+    read: Callable[[], Awaitable[bytes]]
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchItemResult:
+    index: int
+    filename: str
+    status: str = "created"
+    card_id: Optional[int] = None
+    image_url: Optional[str] = None
+    image_srcset: Optional[Dict[str, Dict[str, str]]] = None
+    relative_path: Optional[str] = None
+    content_hash: Optional[str] = None
+    stored: Optional[StoredImage] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    metadata_extracted: bool = False
+    extraction_confidence: Optional[str] = None
+    extraction_error: Optional[str] = None
+    retry_after: Optional[float] = None  # Set when extraction should be retried later
+    extraction_retry_job_id: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_line(self) -> str:
+        return json.dumps({
+            "index": self.index,
+            "filename": self.filename,
+            "status": self.status,
+            "card_id": self.card_id,
+            "image_url": self.image_url,
+            "metadata_extracted": self.metadata_extracted,
+            "extraction_confidence": self.extraction_confidence,
+            "extraction_error": self.extraction_error,
+            "extraction_retry_job_id": self.extraction_retry_job_id,
+            "error": self.error
+        }) + "\n"
+
+
+class BatchScanService:
+    """Processes a batch of uploaded card images end to end"""
+
+    def __init__(
+        self,
+        storage_backend: StorageBackend = None,
+        extraction_service: ExtractionService = None,
+        image_processor: ImageProcessor = None,
+        executor: ImageExecutor = None,
+        extractor: Optional[str] = None
+    ):
+        """
+        Initialize batch scan service
+
+        Args:
+            storage_backend: Storage backend to use (defaults to configured backend)
+            extraction_service: Metadata extraction to use (defaults to shared instance)
+            image_processor: Image processor to use (defaults to new instance)
+            executor: Executor for decode/resize (defaults to shared instance)
+            extractor: Extraction mode for this batch (defaults to EXTRACTION_MODE)
+        """
+        self.storage = storage_backend or get_storage_backend()
+        self.extraction = extraction_service or get_extraction_service()
+        self.extractor = extractor
+        self.processor = image_processor or ImageProcessor()
+        self.executor = executor or get_image_executor()
+        self.images = ImageService(self.storage, self.processor, self.executor)
+
+    def collect_items(self, files: List[UploadFile]) -> List[BatchItem]:
+        """
+        Expand uploaded files (images or zip archives) into batch items
+
+        Raises:
+            HTTPException: If the batch is empty or too large
+        """
+        items: List[BatchItem] = []
+        for upload in files:
+            filename = upload.filename or "upload"
+            if upload.content_type in ZIP_CONTENT_TYPES or filename.lower().endswith(".zip"):
+                items.extend(self._zip_items(upload, start=len(items)))
+            else:
+                items.append(BatchItem(
+                    index=len(items),
+                    filename=filename,
+                    content_type=upload.content_type or "",
+                    read=upload.read
+                ))
+
+        if not items:
+            raise HTTPException(status_code=400, detail="No images found in batch")
+        if len(items) > settings.BATCH_SCAN_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many images. Maximum per batch is {settings.BATCH_SCAN_MAX_ITEMS}"
+            )
+        return items
+
+    def _zip_items(self, upload: UploadFile, start: int) -> List[BatchItem]:
+        try:
+            archive = zipfile.ZipFile(upload.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"Invalid zip archive: {upload.filename}")
+
+        items = []
+        for info in archive.infolist():
+            name = Path(info.filename).name
+            content_type = ZIP_IMAGE_TYPES.get(Path(name).suffix.lower())
+            if info.is_dir() or not content_type or name.startswith("."):
+                continue
+            items.append(BatchItem(
+                index=start + len(items),
+                filename=name,
+                content_type=content_type,
+                read=lambda info=info: asyncio.to_thread(archive.read, info),
+                # Reject oversized entries before decompressing them
+                error=(
+                    f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / (1024*1024):.1f}MB"
+                    if info.file_size > settings.MAX_UPLOAD_SIZE else None
+                )
+            ))
+        return items
+
+    async def stream(self, items: List[BatchItem]) -> AsyncIterator[str]:
+        """
+        Process all items and yield one NDJSON line per item, then a summary
+
+        Items are processed concurrently; completed cards are buffered and
+        written with one bulk insert per BATCH_SCAN_INSERT_SIZE items.
+        """
+        semaphore = asyncio.Semaphore(settings.BATCH_SCAN_CONCURRENCY)
+        tasks = [
+            asyncio.create_task(self._process_item(item, semaphore))
+            for item in items
+        ]
+
+        created = 0
+        failed = 0
+        pending: List[BatchItemResult] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result.status == "error":
+                    failed += 1
+                    yield result.to_line()
+                    continue
+
+                pending.append(result)
+                if len(pending) >= settings.BATCH_SCAN_INSERT_SIZE:
+                    for line, ok in await self._flush(pending):
+                        created += ok
+                        failed += not ok
+                        yield line
+                    pending = []
+
+            if pending:
+                for line, ok in await self._flush(pending):
+                    created += ok
+                    failed += not ok
+                    yield line
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield json.dumps({
+            "summary": {"total": len(items), "created": created, "failed": failed}
+        }) + "\n"
+
+    async def _process_item(
+        self,
+        item: BatchItem,
+        semaphore: asyncio.Semaphore
+    ) -> BatchItemResult:
+        result = BatchItemResult(index=item.index, filename=item.filename)
+        if item.error:
+            result.status, result.error = "error", item.error
+            return result
+
+        async with semaphore:
+            try:
+                file_data = await item.read()
+                self.processor.validate_file(
+                    len(file_data),
+                    item.content_type,
+                    settings.MAX_UPLOAD_SIZE
+                )
+
+                # Identical uploads share one stored blob and skip processing
+                upload_hash = await asyncio.to_thread(hash_upload, file_data)
+                stored = await self.images.save_image(file_data, upload_hash)
+                del file_data
+                result.stored = stored
+                result.relative_path = stored.relative_path
+                result.image_url = stored.image_url
+                result.image_srcset = stored.image_srcset
+                result.content_hash = upload_hash
+            except HTTPException as e:
+                result.status, result.error = "error", e.detail
+                return result
+            except Exception as e:
+                logger.exception(f"Batch item {item.index} failed: {str(e)}")
+                result.status, result.error = "error", f"Failed to process image: {str(e)}"
+                return result
+
+            # Only needed for extraction; don't hold it until the batch is flushed
+            vision_image, result.stored.vision_image = result.stored.vision_image, None
+            if settings.ENABLE_VISION_EXTRACTION and self.extraction.is_available(self.extractor):
+                metadata, confidence, error = await extract_metadata(
+                    self.extraction,
+                    self.images,
+                    result.relative_path,
+                    result.content_hash,
+                    image=vision_image,
+                    mode=self.extractor
+                )
+                if metadata:
+                    result.metadata = metadata
+                    result.metadata_extracted = True
+                    result.extraction_confidence = confidence
+                else:
+                    result.extraction_error = error
+                    result.retry_after = self.extraction.retry_after(self.extractor)
+
+        return result
+
+    async def _flush(self, results: List[BatchItemResult]) -> List[tuple]:
+        """
+        Insert cards for results in one transaction; returns (line, created) pairs
+
+        Blob references are taken in the same transaction, so a failed insert
+        rolls back with nothing to clean up.
+        """
+        async def insert(db: AsyncSession) -> Tuple[List[int], List[Tuple[BatchItemResult, str, float]]]:
+            cards = []
+            images = []
+            for result in results:
+                image = await self.images.reference_image(db, result.stored)
+                card = CardModel(
+                    player_name=UNKNOWN_PLAYER,
+                    notes=f"Scanned from file: {result.filename}",
+                    image_url=image.image_url,
+                    image_srcset=image.image_srcset
+                )
+                for key, value in result.metadata.items():
+                    if value is not None and hasattr(CardModel, key):
+                        setattr(card, key, value)
+                await collection_stats.card_added(db, card)
+                cards.append(card)
+                images.append(image)
+            db.add_all(cards)
+            await db.flush()
+
+            retries = []
+            for result, card, image in zip(results, cards, images):
+                if result.retry_after is not None:
+                    payload = {
+                        "image_url": image.image_url,
+                        "image_srcset": image.image_srcset,
+                        "content_hash": image.content_hash,
+                        "filename": result.filename
+                    }
+                    if self.extractor is not None:
+                        payload["extractor"] = self.extractor
+                    job, delay = queue_retry(db, card.id, payload, result.retry_after)
+                    retries.append((result, job.id, delay))
+            return [card.id for card in cards], retries
+
+        try:
+            async with SessionLocal() as db:
+                card_ids, retries = await write(db, insert)
+        except Exception as e:
+            logger.exception(f"Bulk insert of {len(results)} batch cards failed: {str(e)}")
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            lines = []
+            for result in results:
+                result.status, result.error = "error", f"Failed to save card: {detail}"
+                result.image_url = None
+                lines.append((result.to_line(), False))
+            return lines
+
+        for result, card_id in zip(results, card_ids):
+            result.card_id = card_id
+        for result, job_id, delay in retries:
+            job_queue.enqueue(job_id, delay)
+            result.extraction_retry_job_id = job_id
+        return [(result.to_line(), True) for result in results]
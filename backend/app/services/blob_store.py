@@ -0,0 +1,277 @@
+"""
+Content-addressed, reference-counted store of processed card images
+
+Uploads are keyed by a BLAKE2b hash of their full original bytes. The first
+upload of a photo is processed and its renditions written once; every later
+upload of the same bytes takes another reference to that blob instead, so it
+skips decoding, resizing, storage writes and (once the first extraction has
+finished) the vision call. A blob's files are deleted when the last card
+referencing it is deleted.
+
+Refcounts live in the image_blobs table. A reference is taken inside the
+transaction that stores the card (or scan job) holding it, so a failed scan
+rolls back with nothing to clean up, and dropped inside the transaction that
+deletes its holder; files are removed only after that commits.
+
+Renditions of a new blob are written before its row exists, and a blob
+deleted after commit shares its paths with any re-upload of the same bytes.
+ImageService therefore writes and deletes a blob's files under lock(), skips
+deleting while a row for the hash exists or the files are fresher than
+BLOB_ORPHAN_GRACE_SECONDS (an upload whose reference has not committed yet),
+and leaves whatever that skips, or a rolled back scan wrote, to
+ImageService.sweep_orphans, which runs every BLOB_SWEEP_INTERVAL_SECONDS
+(or via python -m app.commands.sweep_images).
+"""
+import asyncio
+import hashlib
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterable, List, Optional, Set, Tuple, Union
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import SessionLocal, upsert_insert
+from app.db.models import ImageBlob
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_upload(source: Union[bytes, BinaryIO]) -> str:
+    """
+    BLAKE2b hash of an upload's full content
+
+    Args:
+        source: Raw bytes, or a file object (read from its current position
+            to the end, then rewound to where it started)
+
+    Returns:
+        Hash as a 32 char hex string
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        start = source.tell()
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(start)
+    return digest.hexdigest()
+
+
+# Storage directory holding every blob's renditions
+BLOB_ROOT = "blobs"
+
+
+def blob_key(content_hash: str) -> str:
+    """Storage directory for a blob's renditions (sharded two levels by hash prefix)"""
+    return f"{BLOB_ROOT}/{content_hash[:2]}/{content_hash[2:4]}"
+
+
+def blob_hash(relative_path: str) -> Optional[str]:
+    """Content hash of the blob a stored file belongs to, or None if it is not a blob file"""
+    directory, _, filename = relative_path.rpartition("/")
+    content_hash = filename[:32]
+    if len(content_hash) == 32 and directory == blob_key(content_hash):
+        return content_hash
+    return None
+
+
+_RETURNED_COLUMNS = (
+    ImageBlob.content_hash,
+    ImageBlob.relative_path,
+    ImageBlob.image_url,
+    ImageBlob.image_srcset,
+)
+
+
+def _as_dict(blob: ImageBlob) -> Dict[str, Any]:
+    return {
+        "content_hash": blob.content_hash,
+        "relative_path": blob.relative_path,
+        "image_url": blob.image_url,
+        "image_srcset": blob.image_srcset,
+    }
+
+
+class BlobStore:
+    """Reference counting and lookup for stored image blobs"""
+
+    def __init__(self):
+        # Entries disappear once no task holds or waits on the lock
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @asynccontextmanager
+    async def lock(self, content_hash: str) -> AsyncIterator[None]:
+        """
+        Serialize writing and deleting one blob's files within this process
+
+        Args:
+            content_hash: Blob key
+        """
+        lock = self._locks.get(content_hash)
+        if lock is None:
+            lock = self._locks[content_hash] = asyncio.Lock()
+        async with lock:
+            yield
+
+    async def find(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a stored blob without taking a reference
+
+        Returns:
+            Blob fields (content_hash, relative_path, image_url, image_srcset),
+            or None if no blob with this hash exists
+        """
+        async with SessionLocal() as db:
+            blob = (await db.execute(
+                select(ImageBlob).where(ImageBlob.content_hash == content_hash)
+            )).scalar_one_or_none()
+            return _as_dict(blob) if blob else None
+
+    async def existing(self, content_hashes: Iterable[str]) -> Set[str]:
+        """
+        Which of the given hashes have a blob row
+
+        Args:
+            content_hashes: Blob keys to check
+
+        Returns:
+            The subset that exists
+        """
+        content_hashes = list(content_hashes)
+        if not content_hashes:
+            return set()
+        async with SessionLocal() as db:
+            return set((await db.execute(
+                select(ImageBlob.content_hash).where(ImageBlob.content_hash.in_(content_hashes))
+            )).scalars())
+
+    async def reference(
+        self,
+        db: AsyncSession,
+        content_hash: str,
+        relative_path: str,
+        image_url: str,
+        image_srcset: Optional[Dict[str, Dict[str, str]]],
+        duplicate: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Take a reference to a blob as part of the caller's transaction
+
+        A new blob is inserted with one reference; if a concurrent upload of
+        the same content committed first, its row gains a reference instead.
+        Nothing is committed here, so the reference rolls back with the card
+        that holds it.
+
+        Args:
+            db: Session of the transaction that stores the referencing card or job
+            content_hash: Blob key
+            relative_path: Storage path of the full-size image
+            image_url: URL of the full-size image
+            image_srcset: Derivative URLs (format -> width -> URL)
+            duplicate: True if the blob was found by find() rather than just stored
+
+        Returns:
+            Fields of the referenced blob row, which the card should use
+
+        Raises:
+            HTTPException: If a reused blob was deleted before the reference was taken
+        """
+        if duplicate:
+            # The files are only reused, so the row must still exist
+            row = (await db.execute(
+                update(ImageBlob)
+                .where(ImageBlob.content_hash == content_hash)
+                .values(refcount=ImageBlob.refcount + 1)
+                .returning(*_RETURNED_COLUMNS)
+            )).first()
+            if row is None:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Image was deleted while uploading, please try again"
+                )
+            return row._asdict()
+
+        insert = upsert_insert(db)
+        row = (await db.execute(
+            insert(ImageBlob)
+            .values(
+                content_hash=content_hash,
+                relative_path=relative_path,
+                image_url=image_url,
+                image_srcset=image_srcset,
+                refcount=1
+            )
+            .on_conflict_do_update(
+                index_elements=[ImageBlob.content_hash],
+                set_={"refcount": ImageBlob.refcount + 1}
+            )
+            .returning(*_RETURNED_COLUMNS)
+        )).first()
+        return row._asdict()
+
+    async def release(self, db: AsyncSession, image_url: str) -> Tuple[bool, List[str]]:
+        """
+        Drop one reference to the blob behind an image URL as part of the caller's transaction
+
+        Nothing is committed here; delete the returned files only once the
+        caller's transaction (which removes whatever held the reference) has
+        committed.
+
+        Args:
+            db: Session of the transaction that deletes the card or job holding the reference
+            image_url: URL of the blob's full-size image
+
+        Returns:
+            Tuple of (True if the URL belongs to a blob, URLs of files to delete
+            because this was the last reference)
+        """
+        blob = (await db.execute(
+            select(ImageBlob).where(ImageBlob.image_url == image_url)
+        )).scalar_one_or_none()
+        if blob is None:
+            return False, []
+        urls = {blob.image_url}
+        for by_width in (blob.image_srcset or {}).values():
+            urls.update(by_width.values())
+
+        await db.execute(
+            update(ImageBlob)
+            .where(ImageBlob.id == blob.id)
+            .values(refcount=ImageBlob.refcount - 1)
+        )
+        deleted = await db.execute(
+            delete(ImageBlob).where(ImageBlob.id == blob.id, ImageBlob.refcount <= 0)
+        )
+        return True, sorted(urls) if deleted.rowcount else []
+
+    async def get_metadata(self, content_hash: str) -> Optional[Tuple[Dict, Optional[str]]]:
+        """Vision result recorded for a blob, as (metadata, confidence)"""
+        async with SessionLocal() as db:
+            row = (await db.execute(
+                select(ImageBlob.extracted_metadata, ImageBlob.extraction_confidence)
+                .where(ImageBlob.content_hash == content_hash)
+            )).first()
+            if row is None or row.extracted_metadata is None:
+                return None
+            return row.extracted_metadata, row.extraction_confidence
+
+    async def set_metadata(self, content_hash: str, metadata: Dict, confidence: Optional[str]) -> None:
+        """Record the vision result for a blob so duplicates can reuse it"""
+        async with SessionLocal() as db:
+            try:
+                await db.execute(
+                    update(ImageBlob)
+                    .where(ImageBlob.content_hash == content_hash)
+                    .values(extracted_metadata=metadata, extraction_confidence=confidence)
+                )
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.warning(f"Failed to record metadata for blob {content_hash}: {str(e)}")
+
+
+blob_store = BlobStore()
@@ -0,0 +1,138 @@
+"""
+Keyset-paginated card listing
+
+Pages are ordered newest first by (created_at, id) and continue from an
+opaque cursor holding the last row's sort key, so each page is an index range
+scan no matter how deep the client has paged.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import Card as CardModel
+from app.models.card import Card as CardSchema
+
+CARD_FIELDS = list(CardSchema.model_fields)
+# Selecting columns instead of entities skips ORM identity-map bookkeeping;
+# rows are returned as plain dicts that need no further validation
+CARD_COLUMNS = [getattr(CardModel, name) for name in CARD_FIELDS]
+
+
+def encode_cursor(created_at: datetime, card_id: int) -> str:
+    """Encode a row's sort key as an opaque URL-safe cursor"""
+    raw = json.dumps([created_at.isoformat(), card_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        HTTPException: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, card_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(card_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    Parse a comma-separated `fields` parameter
+
+    Raises:
+        HTTPException: If an unknown field is requested
+    """
+    if not fields:
+        return CARD_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in CARD_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(CARD_FIELDS)}"
+        )
+    return requested or CARD_FIELDS
+
+
+async def get_card_row(db: AsyncSession, card_id: int) -> Optional[Dict[str, Any]]:
+    """Fetch one card as a plain dict, or None if it does not exist"""
+    row = (await db.execute(select(*CARD_COLUMNS).where(CardModel.id == card_id))).first()
+    return row._asdict() if row else None
+
+
+async def list_cards(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    sport: Optional[str] = None,
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    brand: Optional[str] = None,
+    set_name: Optional[str] = None,
+    player_name: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Fetch one page of cards
+
+    Args:
+        db: Database session
+        limit: Maximum number of cards to return
+        cursor: Cursor from the previous page's next_cursor
+        fields: Comma-separated columns to return (defaults to all)
+        sport, brand, set_name: Exact-match filters
+        year_min, year_max: Inclusive year range
+        player_name: Player name prefix
+
+    Returns:
+        Dict with `items` (plain dicts, ready to serialize) and `next_cursor`
+        (None on the last page)
+    """
+    selected = parse_fields(fields)
+    # Sort key columns are always fetched so the next cursor can be built
+    columns = list(dict.fromkeys(selected + ["created_at", "id"]))
+    query = select(*[getattr(CardModel, name) for name in columns])
+
+    if sport is not None:
+        query = query.where(CardModel.sport == sport)
+    if brand is not None:
+        query = query.where(CardModel.brand == brand)
+    if set_name is not None:
+        query = query.where(CardModel.set_name == set_name)
+    if year_min is not None:
+        query = query.where(CardModel.year >= year_min)
+    if year_max is not None:
+        query = query.where(CardModel.year <= year_max)
+    if player_name:
+        query = query.where(CardModel.player_name.startswith(player_name, autoescape=True))
+
+    if cursor:
+        created_at, card_id = decode_cursor(cursor)
+        # Bind with the column's type so the timestamp is rendered in its storage format
+        query = query.where(
+            tuple_(CardModel.created_at, CardModel.id)
+            < tuple_(literal(created_at, CardModel.created_at.type), card_id)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    result = await db.execute(query.order_by(
+        CardModel.created_at.desc(), CardModel.id.desc()
+    ).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return {
+        "items": [{name: getattr(row, name) for name in selected} for row in rows],
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,95 @@
+"""
+Full-text search over the card catalog
+
+On SQLite, queries run against the ``cards_fts`` FTS5 index and are ranked
+with bm25, weighting player name matches highest. Each search term matches
+as a prefix, so partial names ("grif ken") still find their card. Other
+databases fall back to a case-insensitive substring filter.
+"""
+import re
+from typing import Any, Dict, List, Optional
+from sqlalchemy import and_, column, func, literal_column, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.fts import FTS_COLUMNS, FTS_TABLE, fts_supported
+from app.db.models import Card as CardModel
+from app.services.card_listing import CARD_COLUMNS
+
+# bm25 column weights, in FTS_COLUMNS order
+BM25_WEIGHTS = {
+    "player_name": 10.0,
+    "set_name": 3.0,
+    "brand": 2.0,
+    "card_number": 5.0,
+    "notes": 1.0,
+}
+
+_fts = table(FTS_TABLE, column("rowid"))
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(q: str) -> List[str]:
+    """Split a user query into searchable terms, dropping FTS syntax characters"""
+    return _TERM.findall(q)
+
+
+def escape_like(term: str) -> str:
+    """Escape LIKE wildcards (% and _) and the escape character itself"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_match_query(terms: List[str]) -> str:
+    """Build an FTS5 MATCH expression requiring every term as a prefix"""
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+
+async def search_cards(
+    db: AsyncSession,
+    q: str,
+    limit: int,
+    offset: int = 0
+) -> Dict[str, Any]:
+    """
+    Search cards by player name, set, brand, card number and notes
+
+    Args:
+        db: Database session
+        q: Free-text query
+        limit: Maximum number of results
+        offset: Number of ranked results to skip
+
+    Returns:
+        Dict with ranked `items` (plain dicts) and `next_offset` (None when exhausted)
+    """
+    terms = search_terms(q)
+    if not terms:
+        return {"items": [], "next_offset": None}
+
+    if fts_supported(db.get_bind()):
+        fts_ref = literal_column(FTS_TABLE)
+        rank = func.bm25(fts_ref, *[BM25_WEIGHTS[c] for c in FTS_COLUMNS])
+        query = (
+            select(*CARD_COLUMNS)
+            .join(_fts, _fts.c.rowid == CardModel.id)
+            .where(fts_ref.match(build_match_query(terms)))
+            .order_by(rank, CardModel.id.desc())
+        )
+    else:
+        searchable = [getattr(CardModel, c) for c in FTS_COLUMNS]
+        query = (
+            select(*CARD_COLUMNS)
+            .where(and_(*[
+                or_(*[col.ilike(f"%{escape_like(term)}%", escape="\\") for col in searchable])
+                for term in terms
+            ]))
+            .order_by(CardModel.created_at.desc(), CardModel.id.desc())
+        )
+
+    # Fetch one extra row to know whether another page exists
+    result = await db.execute(query.offset(offset).limit(limit + 1))
+    cards = [row._asdict() for row in result]
+    next_offset: Optional[int] = None
+    if len(cards) > limit:
+        cards = cards[:limit]
+        next_offset = offset + limit
+
+    return {"items": cards, "next_offset": next_offset}
@@ -0,0 +1,377 @@
+"""
+Bulk export and import of cards
+
+Exports stream the collection as CSV, NDJSON or Parquet. Rows are read in
+chunks of EXPORT_CHUNK_SIZE through a server-side cursor (yield_per) and
+each chunk is encoded and sent before the next is fetched, so memory stays
+constant however large the collection is.
+
+Imports read an uploaded file of the same formats incrementally, validate
+each row with CardCreate and insert valid rows IMPORT_BATCH_SIZE at a time
+with one executemany (COPY on PostgreSQL) per batch. Statistics are updated once per batch in the
+same transaction. Invalid rows are skipped and reported by row number.
+The reference catalog's checklist import goes through the same import_rows().
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import threading
+from datetime import datetime
+from itertools import islice
+from typing import (
+    Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Type
+)
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Card as CardModel
+from app.db.writer import write
+from app.models.card import CardCreate
+from app.services import collection_stats
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency, only needed for Parquet
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Columns written by exports; imports read the CardCreate fields and ignore the rest
+IMPORT_FIELDS = list(CardCreate.model_fields)
+EXPORT_FIELDS = ["id"] + IMPORT_FIELDS + ["image_url", "created_at", "updated_at"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+}
+
+
+def resolve_format(format: Optional[str], filename: Optional[str] = None) -> str:
+    """
+    Pick the file format from an explicit value or the filename's extension
+
+    Raises:
+        HTTPException: If the format is unknown, or Parquet without pyarrow
+    """
+    if not format and filename:
+        format = FORMAT_EXTENSIONS.get("." + filename.rsplit(".", 1)[-1].lower())
+    if format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format; use one of {', '.join(MEDIA_TYPES)}"
+        )
+    if format == "parquet" and pa is None:
+        raise HTTPException(status_code=501, detail="Parquet requires pyarrow (pip install pyarrow)")
+    return format
+
+
+# Export
+
+async def export_cards(format: str) -> AsyncIterator[bytes]:
+    """
+    Encoded export of every card, oldest first, one chunk at a time
+
+    Uses its own session, since the response body is sent after the
+    request's dependencies have finished.
+    """
+    encode = {"csv": _CsvEncoder, "ndjson": _NdjsonEncoder, "parquet": _ParquetEncoder}[format]()
+    columns = [getattr(CardModel, name) for name in EXPORT_FIELDS]
+    rows = 0
+
+    async with SessionLocal() as db:
+        result = await db.stream(
+            select(*columns)
+            .order_by(CardModel.id)
+            .execution_options(yield_per=settings.EXPORT_CHUNK_SIZE)
+        )
+        header = encode.start()
+        if header:
+            yield header
+        async for chunk in result.partitions():
+            rows += len(chunk)
+            yield await asyncio.to_thread(encode.chunk, chunk)
+    footer = encode.finish()
+    if footer:
+        yield footer
+    logger.info(f"Exported {rows} cards as {format}")
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class _CsvEncoder:
+    def start(self) -> bytes:
+        return self._encode([EXPORT_FIELDS])
+
+    def chunk(self, rows: List[Tuple]) -> bytes:
+        return self._encode(rows)
+
+    def finish(self) -> bytes:
+        return b""
+
+    @staticmethod
+    def _encode(rows: List[Tuple]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+
+
+class _NdjsonEncoder:
+    def start(self) -> bytes:
+        return b""
+
+    def chunk(self, rows: List[Tuple]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(EXPORT_FIELDS, map(_plain, row)))) + "\n"
+            for row in rows
+        ).encode()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last take()"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+class _ParquetEncoder:
+    """Writes each chunk as one row group and sends the bytes as they are produced"""
+
+    def __init__(self):
+        self.schema = pa.schema([
+            ("id", pa.int64()),
+            ("player_name", pa.string()),
+            ("year", pa.int64()),
+            *((name, pa.string()) for name in IMPORT_FIELDS if name not in ("player_name", "year")),
+            ("image_url", pa.string()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+            ("updated_at", pa.timestamp("us", tz="UTC")),
+        ])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode="w"), self.schema)
+
+    def start(self) -> bytes:
+        return self.sink.take()
+
+    def chunk(self, rows: List[Tuple]) -> bytes:
+        columns = list(zip(*rows))
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        return self.sink.take()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.take()
+
+
+# Import
+
+def _csv_rows(upload: BinaryIO, fields: List[str]) -> Iterator[Any]:
+    text = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    for row in csv.DictReader(text):
+        # Empty cells mean "not set", not an empty string (or an invalid year)
+        yield {key: value if value != "" else None for key, value in row.items() if key}
+
+
+def _ndjson_rows(upload: BinaryIO, fields: List[str]) -> Iterator[Any]:
+    for line in upload:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"Invalid JSON: {e}")
+
+
+def _parquet_rows(upload: BinaryIO, fields: List[str]) -> Iterator[Any]:
+    parquet = pq.ParquetFile(upload)
+    columns = [name for name in fields if name in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=settings.IMPORT_BATCH_SIZE, columns=columns):
+        yield from batch.to_pylist()
+
+
+ROW_READERS = {"csv": _csv_rows, "ndjson": _ndjson_rows, "parquet": _parquet_rows}
+
+
+def _validate_batch(
+    rows: Iterator[Any],
+    first_row: int,
+    model: Type[BaseModel] = CardCreate,
+    stop: Optional[threading.Event] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """
+    Read and validate up to IMPORT_BATCH_SIZE rows (runs in a thread)
+
+    Args:
+        stop: Set by the importer when it gives up, so the thread stops
+            reading the upload without finishing the batch
+
+    Returns:
+        (valid column dicts, per-row errors, rows read)
+    """
+    valid, errors = [], []
+    count = 0
+    for count, row in enumerate(islice(rows, settings.IMPORT_BATCH_SIZE), start=1):
+        if stop is not None and stop.is_set():
+            break
+        number = first_row + count - 1
+        if isinstance(row, Exception):
+            errors.append({"row": number, "errors": [{"field": None, "message": str(row)}]})
+            continue
+        try:
+            valid.append(model.model_validate(row).model_dump())
+        except ValidationError as e:
+            errors.append({
+                "row": number,
+                "errors": [
+                    {"field": ".".join(str(part) for part in error["loc"]) or None, "message": error["msg"]}
+                    for error in e.errors()
+                ]
+            })
+    return valid, errors, count
+
+
+async def import_cards(db: AsyncSession, upload: BinaryIO, format: str) -> Dict[str, Any]:
+    """
+    Create cards from an uploaded CSV, NDJSON or Parquet file
+
+    Each batch of valid rows is committed on its own, so a large import
+    makes steady progress and a bad row never rejects its neighbours.
+
+    Args:
+        db: Request session (used directly when there is no single writer)
+        upload: The uploaded file, positioned at the start
+        format: "csv", "ndjson" or "parquet"
+
+    Returns:
+        Counts of rows read, cards created and rows rejected, plus the first
+        IMPORT_MAX_ERRORS row errors (row numbers count data rows from 1)
+
+    Raises:
+        HTTPException: If the file cannot be parsed at all
+    """
+    return await import_rows(db, upload, format, CardCreate, _insert_batch, "cards")
+
+
+async def import_rows(
+    db: AsyncSession,
+    upload: BinaryIO,
+    format: str,
+    model: Type[BaseModel],
+    insert_batch: Callable[[List[Dict[str, Any]]], Callable[[AsyncSession], Awaitable[int]]],
+    label: str
+) -> Dict[str, Any]:
+    """
+    Validate an uploaded file's rows against a model and write them in batches
+
+    Args:
+        db: Request session (used directly when there is no single writer)
+        upload: The uploaded file, positioned at the start
+        format: "csv", "ndjson" or "parquet"
+        model: Schema each row must satisfy; its fields are the columns read
+        insert_batch: Builds the write() operation for a batch of valid rows,
+            which returns the number of rows written
+        label: What the rows are, for the log
+
+    Returns:
+        Summary as described in import_cards
+
+    Raises:
+        HTTPException: If the file cannot be parsed at all
+    """
+    summary: Dict[str, Any] = {"total": 0, "created": 0, "failed": 0, "errors": []}
+    rows = ROW_READERS[format](upload, list(model.model_fields))
+    # Cancelling a to_thread future does not stop its thread, so the reader checks this flag
+    stop = threading.Event()
+
+    def read_batch(first_row: int) -> asyncio.Future:
+        return asyncio.ensure_future(asyncio.to_thread(_validate_batch, rows, first_row, model, stop))
+
+    read_next = read_batch(1)
+    try:
+        while True:
+            valid, errors, count = await read_next
+            if not count:
+                break
+            summary["total"] += count
+            summary["failed"] += len(errors)
+            room = settings.IMPORT_MAX_ERRORS - len(summary["errors"])
+            summary["errors"].extend(errors[:max(room, 0)])
+
+            # Parse and validate the next batch while this one is written
+            read_next = read_batch(summary["total"] + 1)
+            if valid:
+                summary["created"] += await write(db, insert_batch(valid))
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {format} file: {e}")
+    except Exception as e:
+        if pa is not None and isinstance(e, pa.ArrowException):
+            raise HTTPException(status_code=400, detail=f"Could not read parquet file: {e}")
+        raise
+    finally:
+        # Wait for the reader to stop, so nothing reads the upload once it is closed
+        stop.set()
+        await asyncio.wait([read_next])
+
+    logger.info(
+        f"Imported {summary['created']} of {summary['total']} {label} ({summary['failed']} rejected)"
+    )
+    return summary
+
+
+def _insert_batch(rows: List[Dict[str, Any]]):
+    async def insert(session: AsyncSession) -> int:
+        await collection_stats.cards_added(session, rows)
+        if session.get_bind().dialect.name == "postgresql":
+            await _copy_rows(session, rows)
+        else:
+            # Core executemany: no ORM objects, no RETURNING
+            await session.execute(CardModel.__table__.insert(), rows)
+        return len(rows)
+    return insert
+
+
+async def _copy_rows(session: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Load rows with COPY on the session's own connection (inside its transaction)"""
+    columns = list(rows[0])
+    connection = await (await session.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(
+        CardModel.__tablename__,
+        records=[tuple(row[column] for column in columns) for row in rows],
+        columns=columns
+    )
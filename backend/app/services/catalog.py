@@ -0,0 +1,384 @@
+"""
+Reference catalog of known cards, imported from set checklists
+
+Checklist rows are stored in catalog_cards and held in memory as a
+CatalogIndex with two lookups:
+
+- card number + year + brand -> entries, one dict lookup
+- player name -> similar names, through a trigram inverted index, so OCR
+  and vision misreadings ("KEN GRIFEY JR") still find the right player
+
+Extraction results are snapped to the entry they identify (see
+CatalogIndex.snap): the canonical spelling of every field replaces what was
+read, and a partial result (e.g. only a name and a year) is completed from
+the checklist without another model call.
+
+Each process keeps its own index. It is rebuilt after an import and, at most
+every CATALOG_REFRESH_INTERVAL seconds, whenever the table has changed.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import SessionLocal, upsert_insert
+from app.db.models import CatalogCard, CatalogVersion
+from app.models.catalog import CatalogEntryCreate
+from app.services import card_transfer
+
+logger = logging.getLogger(__name__)
+
+# Placeholder name of cards created before extraction; never a real match
+UNKNOWN_PLAYER = "Unknown Player"
+
+# Fields a snapped result takes from its catalog entry
+CATALOG_FIELDS = ("player_name", "year", "brand", "card_number", "set_name", "sport")
+
+# Rows per upsert statement while importing (keeps bind parameters under driver limits)
+UPSERT_CHUNK_SIZE = 1000
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """Casefold and reduce punctuation/whitespace runs to single spaces"""
+    return _NON_ALNUM.sub(" ", (value or "").casefold()).strip()
+
+
+def normalize_number(value: Optional[str]) -> str:
+    """Card number without punctuation or spaces ("#1", "No. 1" and "1" alike)"""
+    number = normalize_name(value).replace(" ", "")
+    return number[2:] if number.startswith("no") and number[2:].isdigit() else number
+
+
+def entry_key(year: int, brand: str, set_name: Optional[str], card_number: str) -> str:
+    """Stable 32 hex char identity of a checklist entry (re-imports update it)"""
+    raw = "|".join((str(year), normalize_name(brand), normalize_name(set_name), normalize_number(card_number)))
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Character trigrams of a normalized name, padded so word starts count more"""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Dice coefficient of two names' trigram sets (0-1)"""
+    grams_a, grams_b = trigrams(normalize_name(a)), trigrams(normalize_name(b))
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+class NameIndex:
+    """Names looked up exactly or fuzzily by normalized form (trigram inverted index)"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._canonical: List[str] = []
+        self._sizes: List[int] = []  # Trigram count of each name
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def add(self, name: str) -> int:
+        """Index a name (the first spelling of a normalized form is kept); returns its id"""
+        normalized = normalize_name(name)
+        name_id = self._ids.get(normalized)
+        if name_id is not None:
+            return name_id
+        name_id = self._ids[normalized] = len(self._canonical)
+        grams = trigrams(normalized)
+        self._canonical.append(name)
+        self._sizes.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(name_id)
+        return name_id
+
+    def get(self, text: str) -> Optional[str]:
+        """Canonical name whose normalized form equals the text's"""
+        name_id = self._ids.get(normalize_name(text))
+        return None if name_id is None else self._canonical[name_id]
+
+    def search(self, text: str, limit: int = 5, min_similarity: float = 0.5) -> List[Tuple[int, str, float]]:
+        """
+        Most similar names by trigram Dice coefficient
+
+        Shared trigrams are counted from the query's posting lists, so only
+        names with at least one trigram in common are touched.
+
+        Returns:
+            (name id, canonical name, similarity) tuples, most similar first
+        """
+        grams = trigrams(normalize_name(text))
+        if not grams:
+            return []
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for name_id, count in shared.items():
+            similarity = 2 * count / (len(grams) + self._sizes[name_id])
+            if similarity >= min_similarity:
+                scored.append((similarity, name_id))
+        scored.sort(key=lambda item: -item[0])
+        return [(name_id, self._canonical[name_id], similarity) for similarity, name_id in scored[:limit]]
+
+    def closest(self, text: str, min_similarity: float) -> Optional[str]:
+        """Canonical name most similar to the text, if any reaches min_similarity"""
+        found = self.search(text, limit=1, min_similarity=min_similarity)
+        return found[0][1] if found else None
+
+
+class CatalogRecord(NamedTuple):
+    """A checklist entry as held in memory"""
+    id: int
+    player_name: str
+    year: int
+    brand: str
+    card_number: str
+    set_name: Optional[str]
+    sport: Optional[str]
+
+
+class Match(NamedTuple):
+    record: CatalogRecord
+    matched_on: str  # "card_number" or "player_name"
+    name_similarity: Optional[float]
+
+
+class CatalogIndex:
+    """In-memory lookups over every catalog entry"""
+
+    def __init__(self, records: Iterable[CatalogRecord] = (), version: Any = None):
+        """
+        Build the index
+
+        Args:
+            records: Every catalog entry
+            version: Table state the records were read at (for staleness checks)
+        """
+        self.version = version
+        self.names = NameIndex()
+        self._by_key: Dict[Tuple[str, int, str], List[CatalogRecord]] = {}
+        self._by_name: Dict[int, List[CatalogRecord]] = {}
+        self._count = 0
+        for record in records:
+            self._count += 1
+            key = (normalize_number(record.card_number), record.year, normalize_name(record.brand))
+            self._by_key.setdefault(key, []).append(record)
+            self._by_name.setdefault(self.names.add(record.player_name), []).append(record)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def lookup(self, card_number: Optional[str], year: Optional[int], brand: Optional[str]) -> List[CatalogRecord]:
+        """Entries with this card number, year and brand (one per set that has it)"""
+        return self._by_key.get((normalize_number(card_number), year, normalize_name(brand)), [])
+
+    def match(self, fields: Dict[str, Any]) -> Optional[Match]:
+        """
+        Identify the catalog entry that card fields describe
+
+        Tries card number + year + brand first (checking the player name when
+        one was read), then fuzzy player-name matches narrowed down by
+        whichever of year, brand and number are present. Only a single
+        consistent entry is a match.
+
+        Args:
+            fields: Extracted card fields (any of them may be missing)
+
+        Returns:
+            The matched entry, or None if the fields are ambiguous or unknown
+        """
+        player = fields.get("player_name")
+        if player == UNKNOWN_PLAYER:
+            player = None
+        year = _as_year(fields.get("year"))
+        number = fields.get("card_number")
+        brand = fields.get("brand")
+        set_name = normalize_name(fields.get("set_name"))
+        min_similarity = settings.CATALOG_MIN_NAME_SIMILARITY
+
+        if number and year and brand:
+            candidates = self.lookup(number, year, brand)
+            if len(candidates) > 1 and set_name:
+                candidates = [r for r in candidates if normalize_name(r.set_name) == set_name] or candidates
+            if player:
+                scored = sorted(
+                    ((name_similarity(player, r.player_name), r) for r in candidates),
+                    key=lambda item: -item[0]
+                )
+                if scored and scored[0][0] >= min_similarity and (
+                    len(scored) == 1 or scored[1][0] < scored[0][0]
+                ):
+                    return Match(scored[0][1], "card_number", round(scored[0][0], 3))
+                # A name that disagrees may mean a misread number; try the name
+            elif len(candidates) == 1:
+                return Match(candidates[0], "card_number", None)
+
+        if not player or not (year or number):
+            return None
+        for name_id, _, similarity in self.names.search(
+            player, limit=settings.CATALOG_NAME_CANDIDATES, min_similarity=min_similarity
+        ):
+            records = [
+                r for r in self._by_name[name_id]
+                if (not year or r.year == year)
+                and (not number or normalize_number(r.card_number) == normalize_number(number))
+                and (not brand or normalize_name(r.brand) == normalize_name(brand))
+                and (not set_name or normalize_name(r.set_name) == set_name)
+            ]
+            if len(records) == 1:
+                return Match(records[0], "player_name", round(similarity, 3))
+            if records:
+                return None  # Several cards of this player fit; don't guess
+        return None
+
+    def snap(
+        self,
+        metadata: Dict[str, Any],
+        confidence: Optional[str]
+    ) -> Tuple[Dict[str, Any], Optional[str], Optional[Match]]:
+        """
+        Replace extracted fields with the canonical values of the matching entry
+
+        Returns:
+            (metadata, confidence, match); metadata is a new dict with
+            confidence "high" when an entry matched, otherwise the inputs
+            unchanged and None
+        """
+        found = self.match(metadata)
+        if found is None:
+            return metadata, confidence, None
+        snapped = dict(metadata)
+        for field in CATALOG_FIELDS:
+            value = getattr(found.record, field)
+            if value is not None:
+                snapped[field] = value
+        return snapped, "high", found
+
+
+def _as_year(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Process-wide index, loaded at startup and swapped whole when rebuilt
+_index = CatalogIndex()
+_checked_at = 0.0
+_lock = asyncio.Lock()
+
+
+async def _table_version(db: AsyncSession) -> int:
+    # A counter rather than the rows' timestamps, which can't tell apart
+    # updates made within the same second
+    version = await db.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1))
+    return version or 0
+
+
+async def _bump_version(db: AsyncSession) -> None:
+    insert = upsert_insert(db)
+    await db.execute(
+        insert(CatalogVersion)
+        .values(id=1, version=1)
+        .on_conflict_do_update(
+            index_elements=[CatalogVersion.id],
+            set_={"version": CatalogVersion.version + 1}
+        )
+    )
+
+
+async def load_catalog() -> CatalogIndex:
+    """Read every catalog entry and swap in a freshly built index"""
+    global _index, _checked_at
+    async with _lock:
+        async with SessionLocal() as db:
+            version = await _table_version(db)
+            rows = (await db.execute(select(
+                CatalogCard.id, CatalogCard.player_name, CatalogCard.year, CatalogCard.brand,
+                CatalogCard.card_number, CatalogCard.set_name, CatalogCard.sport
+            ))).all()
+        index = await asyncio.to_thread(CatalogIndex, (CatalogRecord(*row) for row in rows), version)
+        _index, _checked_at = index, time.monotonic()
+    logger.info(f"Loaded reference catalog: {len(index)} entries, {len(index.names)} players")
+    return index
+
+
+async def init_catalog() -> None:
+    """Load the catalog index (called at startup)"""
+    await load_catalog()
+
+
+async def get_catalog() -> CatalogIndex:
+    """
+    The current index, rebuilt first if another process changed the table
+
+    The table is checked at most every CATALOG_REFRESH_INTERVAL seconds.
+    """
+    global _checked_at
+    if time.monotonic() - _checked_at < settings.CATALOG_REFRESH_INTERVAL or _lock.locked():
+        return _index
+    _checked_at = time.monotonic()
+    async with SessionLocal() as db:
+        version = await _table_version(db)
+    if version != _index.version:
+        return await load_catalog()
+    return _index
+
+
+async def import_catalog(db: AsyncSession, upload, format: str) -> Dict[str, Any]:
+    """
+    Add or update checklist entries from a CSV, NDJSON or Parquet file
+
+    Rows need player_name, year, brand and card_number (set_name and sport
+    are optional). An entry with the same year, brand, set and number is
+    updated, so a corrected checklist can be re-imported.
+
+    Returns:
+        Import summary as for card_transfer.import_cards
+    """
+    summary = await card_transfer.import_rows(
+        db, upload, format, CatalogEntryCreate, _upsert_batch, "catalog entries"
+    )
+    if summary["created"]:
+        await load_catalog()
+    return summary
+
+
+def _upsert_batch(rows: List[Dict[str, Any]]):
+    async def upsert(session: AsyncSession) -> int:
+        # Last row wins for duplicates within a batch (one statement can't touch a row twice)
+        unique = {
+            entry_key(row["year"], row["brand"], row["set_name"], row["card_number"]): row
+            for row in rows
+        }
+        values = [{"entry_key": key, **row} for key, row in unique.items()]
+        insert = upsert_insert(session)
+        for start in range(0, len(values), UPSERT_CHUNK_SIZE):
+            statement = insert(CatalogCard).values(values[start:start + UPSERT_CHUNK_SIZE])
+            await session.execute(statement.on_conflict_do_update(
+                index_elements=[CatalogCard.entry_key],
+                set_={
+                    "player_name": statement.excluded.player_name,
+                    "brand": statement.excluded.brand,
+                    "set_name": statement.excluded.set_name,
+                    "card_number": statement.excluded.card_number,
+                    "sport": statement.excluded.sport,
+                    "updated_at": func.now(),
+                }
+            ))
+        await _bump_version(session)
+        return len(values)
+    return upsert
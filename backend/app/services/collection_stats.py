@@ -0,0 +1,345 @@
+"""
+Incrementally maintained collection statistics
+
+``collection_stats`` holds one row per (dimension, bucket): the whole
+collection ("total"), and each sport, year and brand. Every card write
+applies its +1/-1 and value delta to the rows it touches in the same
+transaction, and a price change applies (new - old) times the number of
+cards sharing the price key. Reading the statistics is therefore a scan of a
+table whose size depends on the number of distinct sports, years and brands,
+not on the number of cards.
+
+rebuild_stats() recomputes everything from cards and card_prices; run it
+with ``python -m app.commands.rebuild_stats`` after importing data behind
+the API's back or if the totals ever drift.
+"""
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import String, case, cast, delete, func, literal, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import engine, upsert_insert
+from app.db.models import Card as CardModel, CollectionStat, MarketPrice
+from app.services.pricing.base import PriceKey
+
+logger = logging.getLogger(__name__)
+
+TOTAL = "total"
+DIMENSIONS = ("sport", "year", "brand")
+
+# Cards whose price_key is recomputed per statement while rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+
+class CardFacts(NamedTuple):
+    """The fields of a card that statistics depend on"""
+    sport: Optional[str]
+    year: Optional[int]
+    brand: Optional[str]
+    price_key: Optional[str]
+
+    @classmethod
+    def of(cls, card: Any) -> "CardFacts":
+        return cls(card.sport, card.year, card.brand, card.price_key)
+
+
+def _buckets(facts: Any) -> List[Tuple[str, str]]:
+    """(dimension, bucket) rows a card (or group of cards) counts towards"""
+    return [(TOTAL, "")] + [
+        (dimension, "" if getattr(facts, dimension) is None else str(getattr(facts, dimension)))
+        for dimension in DIMENSIONS
+    ]
+
+
+async def _apply(
+    db: AsyncSession,
+    buckets: Iterable[Tuple[str, str]],
+    cards: int,
+    priced: int,
+    value: float
+) -> None:
+    """Add the same deltas to each bucket's row"""
+    if cards or priced or value:
+        await _apply_deltas(db, {bucket: (cards, priced, value) for bucket in buckets})
+
+
+async def _apply_deltas(
+    db: AsyncSession,
+    deltas: Dict[Tuple[str, str], Tuple[int, int, float]]
+) -> None:
+    """Add (cards, priced, value) deltas to bucket rows, creating missing rows (one statement)"""
+    if not deltas:
+        return
+    insert = upsert_insert(db)
+    statement = insert(CollectionStat).values([
+        {
+            "dimension": dimension,
+            "bucket": bucket,
+            "card_count": cards,
+            "priced_count": priced,
+            "total_value": value,
+        }
+        for (dimension, bucket), (cards, priced, value) in deltas.items()
+    ])
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[CollectionStat.dimension, CollectionStat.bucket],
+        set_={
+            "card_count": CollectionStat.card_count + statement.excluded.card_count,
+            "priced_count": CollectionStat.priced_count + statement.excluded.priced_count,
+            "total_value": CollectionStat.total_value + statement.excluded.total_value,
+        }
+    ))
+
+
+async def _price_of(db: AsyncSession, price_key: Optional[str]) -> Optional[float]:
+    if price_key is None:
+        return None
+    return (await db.execute(
+        select(MarketPrice.average_price).where(MarketPrice.price_key == price_key)
+    )).scalar_one_or_none()
+
+
+async def _apply_card(db: AsyncSession, facts: CardFacts, sign: int) -> None:
+    price = await _price_of(db, facts.price_key)
+    await _apply(
+        db,
+        _buckets(facts),
+        cards=sign,
+        priced=sign if price is not None else 0,
+        value=sign * (price or 0.0)
+    )
+
+
+async def card_added(db: AsyncSession, card: CardModel) -> None:
+    """
+    Count a new card (call in the transaction that inserts it)
+
+    Also sets the card's price_key, linking it to its market price.
+    """
+    card.price_key = PriceKey.from_card(card).digest
+    await _apply_card(db, CardFacts.of(card), +1)
+
+
+async def cards_added(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """
+    Count a batch of new cards given as column dicts (for bulk inserts)
+
+    Sets each row's price_key, then looks up their prices in one query and
+    applies the summed deltas with one upsert.
+    """
+    groups: Counter = Counter()
+    digests: Dict[Tuple, str] = {}
+    for row in rows:
+        identity = tuple(row.get(field) for field in PriceKey._fields)
+        price_key = digests.get(identity)
+        if price_key is None:
+            price_key = digests[identity] = PriceKey.from_card(_Row(row)).digest
+        row["price_key"] = price_key
+        groups[CardFacts(row.get("sport"), row.get("year"), row.get("brand"), price_key)] += 1
+
+    prices: Dict[str, Optional[float]] = dict((await db.execute(
+        select(MarketPrice.price_key, MarketPrice.average_price)
+        .where(MarketPrice.price_key.in_(set(digests.values())))
+    )).all()) if digests else {}
+
+    deltas: Dict[Tuple[str, str], Tuple[int, int, float]] = {}
+    for facts, count in groups.items():
+        price = prices.get(facts.price_key)
+        for bucket in _buckets(facts):
+            cards, priced, value = deltas.get(bucket, (0, 0, 0.0))
+            deltas[bucket] = (
+                cards + count,
+                priced + (count if price is not None else 0),
+                value + count * (price or 0.0)
+            )
+    await _apply_deltas(db, deltas)
+
+
+class _Row:
+    """Attribute access to a column dict, for PriceKey.from_card and _buckets"""
+
+    def __init__(self, row: Dict[str, Any]):
+        self._row = row
+
+    def __getattr__(self, name: str) -> Any:
+        return self._row.get(name)
+
+
+async def card_removed(db: AsyncSession, card: CardModel) -> None:
+    """Uncount a card (call in the transaction that deletes it)"""
+    await _apply_card(db, CardFacts.of(card), -1)
+
+
+async def card_updated(db: AsyncSession, before: CardFacts, card: CardModel) -> None:
+    """
+    Move a card between buckets after an edit
+
+    Args:
+        db: Session of the transaction that updates the card
+        before: CardFacts.of(card) taken before the edit
+        card: The edited card (its price_key is recomputed)
+    """
+    card.price_key = PriceKey.from_card(card).digest
+    after = CardFacts.of(card)
+    if after != before:
+        await _apply_card(db, before, -1)
+        await _apply_card(db, after, +1)
+
+
+async def price_changed(
+    db: AsyncSession,
+    price_key: str,
+    old_price: Optional[float],
+    new_price: Optional[float]
+) -> None:
+    """
+    Apply a market price change to every card sharing the price key
+
+    Args:
+        db: Session of the transaction that stores the new price
+        price_key: PriceKey digest
+        old_price: Previous average price (None if unpriced)
+        new_price: New average price (None if no data)
+    """
+    if old_price == new_price:
+        return
+    groups = await db.execute(
+        select(CardModel.sport, CardModel.year, CardModel.brand, func.count().label("cards"))
+        .where(CardModel.price_key == price_key)
+        .group_by(CardModel.sport, CardModel.year, CardModel.brand)
+    )
+    priced_delta = (new_price is not None) - (old_price is not None)
+    value_delta = (new_price or 0.0) - (old_price or 0.0)
+    for group in groups:
+        await _apply(
+            db,
+            _buckets(group),
+            cards=0,
+            priced=priced_delta * group.cards,
+            value=value_delta * group.cards
+        )
+
+
+async def get_stats(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Current statistics, read from the aggregate table
+
+    Returns:
+        Totals plus per-sport, per-year and per-brand buckets, largest first
+    """
+    rows = (await db.execute(select(CollectionStat).where(CollectionStat.card_count > 0))).scalars()
+
+    stats: Dict[str, Any] = {
+        "total_cards": 0,
+        "priced_cards": 0,
+        "total_value": 0.0,
+        "currency": settings.PRICE_CURRENCY,
+        **{f"by_{dimension}": [] for dimension in DIMENSIONS},
+    }
+    for row in rows:
+        if row.dimension == TOTAL:
+            stats["total_cards"] = row.card_count
+            stats["priced_cards"] = row.priced_count
+            stats["total_value"] = round(row.total_value, 2)
+        elif row.dimension in DIMENSIONS:
+            stats[f"by_{row.dimension}"].append({
+                "value": row.bucket or None,
+                "card_count": row.card_count,
+                "priced_count": row.priced_count,
+                "total_value": round(row.total_value, 2),
+            })
+    for dimension in DIMENSIONS:
+        stats[f"by_{dimension}"].sort(key=lambda bucket: (-bucket["card_count"], bucket["value"] or ""))
+    return stats
+
+
+def rebuild_stats(conn: Connection) -> int:
+    """
+    Recompute every card's price_key and all statistics from scratch
+
+    Args:
+        conn: Connection inside a transaction
+
+    Returns:
+        Number of cards counted
+    """
+    # price_key normalization lives in Python, so backfill it in batches
+    last_id = 0
+    while True:
+        cards = conn.execute(
+            select(
+                CardModel.id, CardModel.player_name, CardModel.year, CardModel.brand,
+                CardModel.card_number, CardModel.set_name, CardModel.price_key
+            )
+            .where(CardModel.id > last_id)
+            .order_by(CardModel.id)
+            .limit(REBUILD_BATCH_SIZE)
+        ).all()
+        if not cards:
+            break
+        for card in cards:
+            price_key = PriceKey.from_card(card).digest
+            if card.price_key != price_key:
+                conn.execute(
+                    update(CardModel).where(CardModel.id == card.id).values(price_key=price_key)
+                )
+        last_id = cards[-1].id
+
+    conn.execute(delete(CollectionStat))
+
+    price = MarketPrice.average_price
+    priced = func.sum(case((price.is_not(None), 1), else_=0))
+    value = func.coalesce(func.sum(price), 0.0)
+
+    total_cards = 0
+    for dimension in (TOTAL,) + DIMENSIONS:
+        if dimension == TOTAL:
+            bucket = literal("")
+        else:
+            bucket = func.coalesce(cast(getattr(CardModel, dimension), String), "")
+        rows = conn.execute(
+            select(bucket, func.count(), priced, value)
+            .select_from(CardModel)
+            .outerjoin(MarketPrice, MarketPrice.price_key == CardModel.price_key)
+            .group_by(bucket)
+        ).all()
+        if rows:
+            conn.execute(CollectionStat.__table__.insert(), [
+                {
+                    "dimension": dimension,
+                    "bucket": row[0],
+                    "card_count": row[1],
+                    "priced_count": row[2] or 0,
+                    "total_value": row[3] or 0.0,
+                }
+                for row in rows
+            ])
+        if dimension == TOTAL:
+            total_cards = rows[0][1] if rows else 0
+
+    logger.info(f"Rebuilt collection statistics for {total_cards} cards")
+    return total_cards
+
+
+def init_stats(conn: Connection) -> None:
+    """Backfill statistics on first run, when cards exist but no totals do"""
+    has_totals = conn.execute(
+        select(CollectionStat.id).where(CollectionStat.dimension == TOTAL).limit(1)
+    ).first() is not None
+    has_cards = conn.execute(select(CardModel.id).limit(1)).first() is not None
+    if has_cards and not has_totals:
+        rebuild_stats(conn)
+
+
+async def rebuild() -> int:
+    """Run rebuild_stats in its own transaction"""
+    async with engine.begin() as conn:
+        return await conn.run_sync(rebuild_stats)
+
+
+async def init() -> None:
+    """Run init_stats in its own transaction (called at startup)"""
+    async with engine.begin() as conn:
+        await conn.run_sync(init_stats)
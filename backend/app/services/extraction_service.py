@@ -0,0 +1,200 @@
+"""
+Chooses between the cloud (OpenAI) and local (OCR) metadata extractors
+
+Modes, set by EXTRACTION_MODE or per scan:
+
+- ``cloud``: the vision API; the local extractor is used if the API is not
+  configured or the call fails.
+- ``local``: the local extractor only; nothing leaves the machine.
+- ``auto``: the local extractor as a fast first pass. Its result is kept
+  when its confidence reaches EXTRACTION_LOCAL_MIN_CONFIDENCE; otherwise the
+  vision API is called, and the local result is kept if that call fails.
+
+Every result is snapped to the reference catalog (services.catalog) when it
+identifies a known card, which makes it high confidence; a partial local
+read that the catalog resolves therefore never reaches the vision API.
+
+While the vision API's circuit breaker is open, cloud calls fail at once and
+retry_after() tells callers when to try again (scan_jobs requeues the card).
+"""
+import logging
+from typing import Any, Dict, Optional, Tuple
+from fastapi import HTTPException
+from app.core.config import settings
+from app.services.catalog import get_catalog
+from app.services.extractor import Extraction, ImageInput, MetadataExtractor, confidence_rank
+from app.services.ocr_extractor import OcrExtractor
+from app.services.vision_service import get_vision_service
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_MODES = ("cloud", "local", "auto")
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    """
+    Validate an extraction mode, defaulting to EXTRACTION_MODE
+
+    Raises:
+        HTTPException: If the mode is unknown
+    """
+    mode = mode or settings.EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported extractor; use one of {', '.join(EXTRACTION_MODES)}"
+        )
+    return mode
+
+
+class ExtractionService:
+    """Runs the cloud and/or local extractor for a scan according to its mode"""
+
+    def __init__(
+        self,
+        cloud: MetadataExtractor,
+        local: MetadataExtractor,
+        min_local_confidence: Optional[str] = None
+    ):
+        """
+        Initialize extraction service
+
+        Args:
+            cloud: Remote extractor (the shared VisionService)
+            local: Offline extractor (OcrExtractor)
+            min_local_confidence: Lowest local confidence that skips the cloud
+                call in auto mode (defaults to settings)
+        """
+        self.cloud = cloud
+        self.local = local
+        self.min_local_confidence = min_local_confidence or settings.EXTRACTION_LOCAL_MIN_CONFIDENCE
+
+        # Metrics
+        self.local_accepted = 0
+        self.cloud_calls = 0
+        self.fallbacks = 0
+        self.catalog_matches = 0
+
+    def is_available(self, mode: Optional[str] = None) -> bool:
+        """Check if any extractor usable in this mode can run"""
+        if resolve_mode(mode) == "local":
+            return self.local.is_available()
+        return self.cloud.is_available() or self.local.is_available()
+
+    def retry_after(self, mode: Optional[str] = None) -> Optional[float]:
+        """
+        Seconds until a failed extraction is worth retrying with the cloud extractor
+
+        Returns:
+            None if the mode doesn't use the cloud or the vision API is healthy
+        """
+        if resolve_mode(mode) == "local":
+            return None
+        return self.cloud.retry_after()
+
+    async def extract(
+        self,
+        image: ImageInput,
+        back_image: Optional[ImageInput] = None,
+        mode: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str], Optional[str]]:
+        """
+        Extract card metadata with the extractor(s) the mode calls for
+
+        Args:
+            image: Path or bytes of the card's front
+            back_image: Path or bytes of the card's back, if it was scanned
+            mode: "cloud", "local" or "auto" (defaults to EXTRACTION_MODE)
+
+        Returns:
+            Tuple of (metadata, confidence, error, name of the extractor that
+            produced the result or None)
+        """
+        mode = resolve_mode(mode)
+        local_result = None
+
+        if mode in ("local", "auto") and self.local.is_available():
+            local_result = await self._snap(await self.local.extract_card_metadata(image, back_image))
+            metadata, confidence, _ = local_result
+            if mode == "local" or (
+                metadata and confidence_rank(confidence) >= confidence_rank(self.min_local_confidence)
+            ):
+                self.local_accepted += metadata is not None
+                return (*local_result, self.local.name)
+        if mode == "local":
+            return None, None, "Local OCR extraction not available", None
+
+        if self.cloud.is_available():
+            self.cloud_calls += 1
+            metadata, confidence, error = await self._snap(
+                await self.cloud.extract_card_metadata(image, back_image)
+            )
+            if metadata:
+                return metadata, confidence, None, self.cloud.name
+        else:
+            error = "Vision service not configured"
+
+        # Cloud unavailable or failed: fall back to a local result
+        if local_result is None and self.local.is_available():
+            local_result = await self._snap(await self.local.extract_card_metadata(image, back_image))
+        if local_result is not None and local_result[0]:
+            self.fallbacks += 1
+            logger.info(f"Using local extraction result ({error})")
+            return (*local_result, self.local.name)
+        return None, None, error, None
+
+    async def _snap(self, result: Extraction) -> Extraction:
+        """Replace a result's fields with the catalog entry it identifies, if any"""
+        metadata, confidence, error = result
+        if not metadata:
+            return result
+        catalog = await get_catalog()
+        metadata, confidence, match = catalog.snap(metadata, confidence)
+        if match is not None:
+            self.catalog_matches += 1
+            logger.info(
+                f"Matched catalog entry {match.record.id} on {match.matched_on}: "
+                f"{match.record.player_name} {match.record.year} {match.record.brand} #{match.record.card_number}"
+            )
+        return metadata, confidence, error
+
+    def stats(self) -> Dict[str, Any]:
+        """Which extractors are available and how often each was used"""
+        return {
+            "mode": settings.EXTRACTION_MODE,
+            "cloud_available": self.cloud.is_available(),
+            "local_available": self.local.is_available(),
+            "local_accepted": self.local_accepted,
+            "cloud_calls": self.cloud_calls,
+            "fallbacks": self.fallbacks,
+            "catalog_matches": self.catalog_matches,
+        }
+
+
+# Process-wide instance, created in the application lifespan
+_extraction_service: Optional[ExtractionService] = None
+
+
+def init_extraction_service() -> ExtractionService:
+    """Create the shared ExtractionService (called once at startup, after the vision service)"""
+    global _extraction_service
+    if _extraction_service is None:
+        cloud, local = get_vision_service(), OcrExtractor()
+        if local.is_available():
+            # Near-duplicate vision cache hits are served only once OCR confirms the card number
+            cloud.verify_near_hit = local.confirms
+        _extraction_service = ExtractionService(cloud=cloud, local=local)
+    return _extraction_service
+
+
+def get_extraction_service() -> ExtractionService:
+    """Get the shared ExtractionService, creating it on first use"""
+    return _extraction_service or init_extraction_service()
+
+
+async def close_extraction_service() -> None:
+    """Release the local extractor (the vision service is closed on its own)"""
+    global _extraction_service
+    if _extraction_service is not None:
+        await _extraction_service.local.close()
+        _extraction_service = None
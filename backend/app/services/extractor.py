@@ -0,0 +1,64 @@
+"""
+Common interface for card metadata extractors
+
+VisionService (OpenAI) and OcrExtractor (local Tesseract) both implement
+MetadataExtractor; ExtractionService picks between them per scan.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple, Union
+
+# (metadata dict or None, confidence or None, error message or None)
+Extraction = Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]
+
+# Image to extract from: absolute file path or encoded image bytes
+ImageInput = Union[str, bytes]
+
+CONFIDENCE_LEVELS = ("low", "medium", "high")
+
+
+def confidence_rank(confidence: Optional[str]) -> int:
+    """Order confidence levels ("low" < "medium" < "high"); unknown or None ranks lowest"""
+    return CONFIDENCE_LEVELS.index(confidence) if confidence in CONFIDENCE_LEVELS else -1
+
+
+class MetadataExtractor(ABC):
+    """Abstract source of card metadata extracted from images"""
+
+    name: str
+
+    @abstractmethod
+    def is_available(self) -> bool:
+        """Check if the extractor can run (credentials, binaries, ...)"""
+        pass
+
+    @abstractmethod
+    async def extract_card_metadata(
+        self,
+        image_path: ImageInput,
+        back_image: Optional[ImageInput] = None
+    ) -> Extraction:
+        """
+        Extract card metadata from a card image
+
+        Args:
+            image_path: Absolute path to the card's front, or its bytes
+            back_image: Path or bytes of the card's back, if it was scanned
+
+        Returns:
+            Tuple of (metadata_dict, confidence_level, error_message); on
+            failure metadata and confidence are None and the error is set
+        """
+        pass
+
+    def retry_after(self) -> Optional[float]:
+        """
+        Seconds until the extractor expects to accept requests again
+
+        Returns:
+            None while it is healthy (the default); override for remote extractors
+        """
+        return None
+
+    async def close(self) -> None:
+        """Release connections; override if the extractor holds any"""
+        pass
@@ -0,0 +1,152 @@
+"""
+Executor for CPU-bound image work (decode, resize, encode)
+
+Pillow work runs on a process pool by default so a burst of uploads uses
+every core without holding the event loop (or the GIL) that serves other
+requests. A thread pool can be configured instead where processes are
+unavailable; Pillow releases the GIL for most of its codec work.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_PROCESS = "process"
+EXECUTOR_THREAD = "thread"
+
+
+class ImageExecutor:
+    """Runs image functions off the event loop and tracks queue depth"""
+
+    def __init__(self, kind: Optional[str] = None, max_workers: Optional[int] = None):
+        """
+        Initialize image executor
+
+        Args:
+            kind: "process" or "thread" (defaults to settings)
+            max_workers: Pool size (defaults to settings, then CPU count)
+        """
+        self.kind = kind or settings.IMAGE_EXECUTOR
+        if self.kind not in (EXECUTOR_PROCESS, EXECUTOR_THREAD):
+            raise ValueError(f"Unknown image executor type: {self.kind}")
+        self.max_workers = max_workers or settings.IMAGE_EXECUTOR_WORKERS or os.cpu_count() or 1
+        self._pool: Optional[Executor] = None
+
+        # Metrics
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self._total_wait = 0.0
+
+    @property
+    def shares_memory(self) -> bool:
+        """True if submitted callables can receive open file objects"""
+        return self.kind == EXECUTOR_THREAD
+
+    def start(self) -> None:
+        """Create the worker pool"""
+        if self._pool is not None:
+            return
+        if self.kind == EXECUTOR_PROCESS:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # Forking a process that already runs threads is unsafe
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="image-worker"
+            )
+        logger.info(f"Started image {self.kind} pool with {self.max_workers} workers")
+
+    async def shutdown(self) -> None:
+        """Shut down the worker pool, cancelling queued work (waits off the event loop)"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run fn(*args) on the pool and await its result
+
+        For the process pool, fn must be a module-level function and its
+        arguments and result must be picklable.
+        """
+        if self._pool is None:
+            self.start()
+        pool = self._pool
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image); replace the pool once,
+            # even if several calls fail with it
+            self.failed += 1
+            if self._pool is pool:
+                logger.error("Image process pool broke; restarting it")
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.start()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        else:
+            self.completed += 1
+            return result
+        finally:
+            self.in_flight -= 1
+            self._total_wait += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters"""
+        finished = self.completed + self.failed
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "running": min(self.in_flight, self.max_workers),
+            "queued": max(0, self.in_flight - self.max_workers),
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_latency_ms": round(self._total_wait / finished * 1000, 1) if finished else 0.0
+        }
+
+
+# Process-wide instance, created in the application lifespan
+_image_executor: Optional[ImageExecutor] = None
+
+
+def init_image_executor() -> ImageExecutor:
+    """Create and start the shared ImageExecutor (called once at startup)"""
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ImageExecutor()
+        _image_executor.start()
+    return _image_executor
+
+
+def get_image_executor() -> ImageExecutor:
+    """Get the shared ImageExecutor, creating it on first use"""
+    return _image_executor or init_image_executor()
+
+
+async def shutdown_image_executor() -> None:
+    """Shut down the shared ImageExecutor (called at shutdown)"""
+    global _image_executor
+    if _image_executor is not None:
+        executor, _image_executor = _image_executor, None
+        await executor.shutdown()
@@ -1,11 +1,78 @@
 from PIL import Image
 from io import BytesIO
-from typing import Tuple
-import hashlib
-from datetime import datetime
-import re
+from typing import BinaryIO, List, NamedTuple, Optional, Sequence, Tuple, Union
 from fastapi import HTTPException
 
+FORMAT_EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp', 'avif': 'avif'}
+FORMAT_MIME_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp', 'avif': 'image/avif'}
+
+# How the vision model resizes what it is sent: "low" detail looks at a single
+# 512px image; "high" (and "auto") fits the image in 2048px, then scales it so
+# the short side is at most 768px. Pixels beyond that are uploaded for nothing.
+VISION_LOW_DETAIL_SIZE = 512
+VISION_HIGH_DETAIL_SIZE = 2048
+VISION_HIGH_DETAIL_SHORT_SIDE = 768
+
+
+class Rendition(NamedTuple):
+    """One encoded size/format of a processed image"""
+    name: str  # 'full', 'medium', 'thumb'
+    width: int
+    height: int
+    format: str  # 'jpeg', 'webp', 'avif'
+    data: bytes
+
+
+def vision_size(width: int, height: int, detail: str) -> Tuple[int, int]:
+    """
+    Size the vision model downscales a width x height image to at a detail level
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        detail: VISION_DETAIL_LEVEL ("low", "high" or "auto")
+
+    Returns:
+        (width, height) never larger than the input
+    """
+    if detail == 'low':
+        scale = min(1.0, VISION_LOW_DETAIL_SIZE / max(width, height))
+    else:
+        scale = min(1.0, VISION_HIGH_DETAIL_SIZE / max(width, height))
+        scale *= min(1.0, VISION_HIGH_DETAIL_SHORT_SIDE / (min(width, height) * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def vision_rendition(renditions: Sequence[Rendition], detail: str) -> Optional[Rendition]:
+    """
+    Smallest JPEG rendition that still has every pixel the vision model uses
+
+    Args:
+        renditions: Output of ImageProcessor.process_derivatives
+        detail: VISION_DETAIL_LEVEL
+
+    Returns:
+        The rendition to send (the full-size JPEG if no derivative is large
+        enough), or None if there is no JPEG rendition
+    """
+    jpegs = [r for r in renditions if r.format == 'jpeg']
+    full = next((r for r in jpegs if r.name == 'full'), None)
+    if full is None:
+        return None
+    # One pixel of slack for rounding differences between resizes
+    needed = max(vision_size(full.width, full.height, detail)) - 1
+    large_enough = [r for r in jpegs if max(r.width, r.height) >= needed]
+    return min(large_enough, key=lambda r: r.width * r.height, default=full)
+
+
+def supported_derivative_formats(formats: Sequence[str]) -> List[str]:
+    """Filter output formats down to those this Pillow build can encode"""
+    extensions = Image.registered_extensions()
+    return [
+        f for f in formats
+        if extensions.get(f".{FORMAT_EXTENSIONS[f]}") in Image.SAVE
+    ]
+
 
 class ImageProcessor:
     """Service for processing and validating uploaded images"""
@@ -20,25 +87,37 @@ class ImageProcessor:
     # Processing settings
     MAX_DIMENSION = 1024
     JPEG_QUALITY = 85
+    JPEG_OPTIMIZE = False  # Extra Huffman pass costs CPU for a ~2-5% size saving
     PNG_OPTIMIZE = True
+    RESIZE_REDUCING_GAP = 3.0
+    WEBP_QUALITY = 80
+    AVIF_QUALITY = 60
+
+    # Derivatives written at upload time (max dimension in pixels), in addition
+    # to the MAX_DIMENSION 'full' size. AVIF is skipped when Pillow can't encode it.
+    DERIVATIVE_SIZES = {'thumb': 128, 'medium': 512}
+    DERIVATIVE_FORMATS = ('webp', 'jpeg', 'avif')
 
     def validate_file(
         self,
-        file_data: bytes,
+        file_size: int,
         content_type: str,
         max_size: int = 10 * 1024 * 1024
     ) -> None:
         """
-        Validate uploaded file
+        Validate upload size and MIME type before any decoding
         Raises HTTPException if validation fails
 
+        Image integrity is checked while decoding in process_derivatives, so a
+        file is only ever decoded once.
+
         Args:
-            file_data: Raw file bytes
+            file_size: Size of the upload in bytes
             content_type: MIME type of the file
             max_size: Maximum allowed file size in bytes
         """
         # Check file size
-        if len(file_data) > max_size:
+        if file_size > max_size:
             raise HTTPException(
                 status_code=413,
                 detail=f"File too large. Maximum size is {max_size / (1024*1024):.1f}MB"
@@ -51,32 +130,50 @@ class ImageProcessor:
                 detail=f"Invalid file type. Allowed types: {', '.join(self.ALLOWED_MIME_TYPES)}"
             )
 
-        # Validate image can be opened
-        try:
-            img = Image.open(BytesIO(file_data))
-            img.verify()  # Verify it's actually an image
-        except Exception as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid or corrupted image file: {str(e)}"
-            )
-
-    def process_image(
+    def decode_image(
         self,
-        file_data: bytes
-    ) -> Tuple[BytesIO, str]:
+        source: Union[bytes, str, BinaryIO]
+    ) -> Image.Image:
         """
-        Process image: resize, optimize, convert format if needed
-        Returns (processed_file_io, format)
+        Decode an upload once into an RGB image no larger than MAX_DIMENSION
+
+        JPEGs are decoded at reduced scale (DCT scaling via draft()), so a
+        12MP photo is never materialized at full resolution.
 
         Args:
-            file_data: Raw image bytes
+            source: Raw image bytes, a file path, or a readable file object
+                (e.g. a spooled upload)
 
         Returns:
-            Tuple of (processed image BytesIO, output format)
+            Decoded, resized RGB image
+
+        Raises:
+            HTTPException: If the image is not a supported format or is corrupted
         """
-        # Open image
-        img = Image.open(BytesIO(file_data))
+        if isinstance(source, (bytes, bytearray)):
+            source = BytesIO(source)
+
+        try:
+            # Open reads only the header
+            img = Image.open(source)
+            if img.format not in self.ALLOWED_FORMATS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported image format: {img.format}"
+                )
+
+            # Let the JPEG decoder downscale while decoding (no-op for other formats)
+            img.draft('RGB', (self.MAX_DIMENSION, self.MAX_DIMENSION))
+
+            # Decode once; truncated or corrupted data fails here
+            img.load()
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid or corrupted image file: {str(e)}"
+            )
 
         # Convert RGBA to RGB if necessary (for JPEG)
         if img.mode in ('RGBA', 'LA', 'P'):
@@ -89,54 +186,123 @@ class ImageProcessor:
         elif img.mode != 'RGB':
             img = img.convert('RGB')
 
-        # Resize if needed while maintaining aspect ratio
-        if img.width > self.MAX_DIMENSION or img.height > self.MAX_DIMENSION:
-            img.thumbnail(
-                (self.MAX_DIMENSION, self.MAX_DIMENSION),
-                Image.Resampling.LANCZOS
-            )
+        # Resize if needed while maintaining aspect ratio; reducing_gap does a
+        # cheap integer reduce() before the final LANCZOS pass
+        self._fit(img, self.MAX_DIMENSION)
+        return img
 
-        # Save to BytesIO with optimization
-        output = BytesIO()
+    def encode_image(self, img: Image.Image, output_format: str) -> BytesIO:
+        """
+        Encode an RGB image as JPEG, WebP or AVIF
 
-        # Determine output format (always use JPEG for consistency and compression)
-        output_format = 'JPEG'
-        img.save(
-            output,
-            format=output_format,
-            quality=self.JPEG_QUALITY,
-            optimize=True
-        )
+        Args:
+            img: Image to encode
+            output_format: 'jpeg', 'webp' or 'avif'
 
+        Returns:
+            Encoded image BytesIO, positioned at the start
+        """
+        output = BytesIO()
+        if output_format == 'jpeg':
+            img.save(output, format='JPEG', quality=self.JPEG_QUALITY, optimize=self.JPEG_OPTIMIZE)
+        elif output_format == 'webp':
+            img.save(output, format='WEBP', quality=self.WEBP_QUALITY, method=4)
+        elif output_format == 'avif':
+            img.save(output, format='AVIF', quality=self.AVIF_QUALITY)
+        else:
+            raise ValueError(f"Unsupported output format: {output_format}")
         output.seek(0)
-        return output, output_format.lower()
+        return output
 
-    def generate_filename(
+    def process_derivatives(
         self,
-        original_filename: str,
-        file_data: bytes,
-        card_id: int
-    ) -> str:
+        source: Union[bytes, str, BinaryIO]
+    ) -> List[Rendition]:
+        """
+        Decode once and produce every derivative size in every output format
+
+        Smaller sizes are downscaled from the next larger one rather than
+        from the original, so each resize step stays cheap.
+
+        Args:
+            source: Raw image bytes, a file path, or a readable file object
+
+        Returns:
+            Renditions for 'full' (MAX_DIMENSION) and each DERIVATIVE_SIZES entry
+        """
+        img = self.decode_image(source)
+        formats = supported_derivative_formats(self.DERIVATIVE_FORMATS)
+
+        renditions = []
+        sizes = [('full', self.MAX_DIMENSION)] + sorted(
+            self.DERIVATIVE_SIZES.items(), key=lambda item: -item[1]
+        )
+        for name, max_dimension in sizes:
+            if name != 'full':
+                img = img.copy()
+                self._fit(img, max_dimension)
+            for output_format in formats:
+                renditions.append(Rendition(
+                    name=name,
+                    width=img.width,
+                    height=img.height,
+                    format=output_format,
+                    data=self.encode_image(img, output_format).getvalue()
+                ))
+        return renditions
+
+    def prepare_for_vision(self, data: bytes, detail: str) -> bytes:
         """
-        Generate safe, unique filename
-        Format: {timestamp}_{hash}_{sanitized_original}.jpg
+        Shrink an encoded image to the size the vision model uses at `detail`
+
+        Images that are already small enough JPEGs (the usual case for
+        renditions picked by vision_rendition) are returned as they are,
+        without decoding.
 
         Args:
-            original_filename: Original uploaded filename
-            file_data: Raw file bytes
-            card_id: ID of the card
+            data: Encoded image bytes
+            detail: VISION_DETAIL_LEVEL
 
         Returns:
-            Safe, unique filename
+            JPEG bytes
         """
-        # Get timestamp
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        img = Image.open(BytesIO(data))
+        target = vision_size(img.width, img.height, detail)
+        if img.format == 'JPEG' and max(img.size) <= max(target) + 1:
+            return data
+
+        img.draft('RGB', target)
+        img = img.convert('RGB')
+        img.thumbnail(target, Image.Resampling.LANCZOS, reducing_gap=self.RESIZE_REDUCING_GAP)
+        return self.encode_image(img, 'jpeg').getvalue()
+
+    def _fit(self, img: Image.Image, max_dimension: int) -> None:
+        """Shrink img in place to fit a max_dimension square"""
+        if img.width > max_dimension or img.height > max_dimension:
+            img.thumbnail(
+                (max_dimension, max_dimension),
+                Image.Resampling.LANCZOS,
+                reducing_gap=self.RESIZE_REDUCING_GAP
+            )
+
+
+def process_upload(
+    source: Union[bytes, str, BinaryIO]
+) -> Tuple[Optional[List[Rendition]], Optional[Tuple[int, str]]]:
+    """
+    Process an already validated upload into all derivatives, suitable for a process pool
 
-        # Get hash of first 1KB for uniqueness
-        file_hash = hashlib.md5(file_data[:1024]).hexdigest()[:8]
+    HTTPException can't be pickled back from a worker process, so processing
+    errors are returned as (status_code, detail) instead of raised.
 
-        # Sanitize original filename (keep only alphanumeric and basic chars)
-        safe_name = re.sub(r'[^a-zA-Z0-9_.-]', '_', original_filename)
-        name_without_ext = safe_name.rsplit('.', 1)[0][:50]  # Limit length
+    Args:
+        source: Raw image bytes or a file path, or a file object when run in the same process
 
-        return f"{timestamp}_{file_hash}_{name_without_ext}.jpg"
+    Returns:
+        Tuple of (renditions or None, (status_code, detail) or None)
+    """
+    try:
+        renditions = ImageProcessor().process_derivatives(source)
+    except HTTPException as e:
+        return None, (e.status_code, e.detail)
+    return renditions, None
@@ -1,7 +1,68 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import partial
+from io import BytesIO
+from typing import BinaryIO, Callable, Dict, List, Optional, Set, Union
 from fastapi import UploadFile, HTTPException
-from .image_processor import ImageProcessor
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from .blob_store import BLOB_ROOT, blob_hash, blob_key, blob_store, hash_upload
+from .image_executor import ImageExecutor, get_image_executor
+from .image_processor import (
+    FORMAT_EXTENSIONS, ImageProcessor, Rendition, process_upload, vision_rendition
+)
 from .storage import get_storage_backend, StorageBackend
 
+logger = logging.getLogger(__name__)
+
+# Blobs whose rows are looked up per query by sweep_orphans
+SWEEP_BATCH_SIZE = 500
+
+# Uploads up to this size go to worker processes as bytes (Starlette keeps
+# them in memory anyway); larger ones, spooled to disk, as a temp file copy
+INLINE_UPLOAD_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def copy_to_temp_file(source: BinaryIO) -> str:
+    """
+    Copy a file object to a named temp file in chunks
+
+    Args:
+        source: File to copy from its start
+
+    Returns:
+        Path of the copy; the caller deletes it
+    """
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="upload-", delete=False) as copy:
+        shutil.copyfileobj(source, copy, COPY_CHUNK_SIZE)
+    return copy.name
+
+
+def file_digest(data: bytes) -> str:
+    """16 hex digit BLAKE2b digest used in immutable image filenames"""
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+@dataclass
+class StoredImage:
+    """Locations of a saved card image and its derivatives"""
+    image_url: str  # Full-size JPEG
+    relative_path: str  # Storage path of the full-size JPEG
+    image_srcset: Dict[str, Dict[str, str]]  # format -> pixel width -> URL
+    content_hash: Optional[str] = None  # Blob key (hash of the original upload)
+    duplicate: bool = False  # True if an identical upload was already stored
+    # Vision-sized JPEG kept in memory when the upload was just processed (not
+    # set for duplicates), so extraction needn't read the image back
+    vision_image: Optional[bytes] = None
+
 
 class ImageService:
     """High-level service for managing card images"""
@@ -9,7 +70,8 @@ class ImageService:
     def __init__(
         self,
         storage_backend: StorageBackend = None,
-        image_processor: ImageProcessor = None
+        image_processor: ImageProcessor = None,
+        executor: ImageExecutor = None
     ):
         """
         Initialize image service
@@ -17,73 +79,314 @@ class ImageService:
         Args:
             storage_backend: Storage backend to use (defaults to configured backend)
             image_processor: Image processor to use (defaults to new instance)
+            executor: Executor for CPU-bound image work (defaults to shared instance)
         """
         self.storage = storage_backend or get_storage_backend()
         self.processor = image_processor or ImageProcessor()
+        self.executor = executor or get_image_executor()
 
-    async def save_card_image(
-        self,
-        upload_file: UploadFile,
-        card_id: int
-    ) -> str:
+    async def save_card_image(self, upload_file: UploadFile) -> StoredImage:
         """
-        Process and save uploaded card image
+        Process and save uploaded card image with all its derivatives
+
+        Images are content-addressed: re-uploading the same bytes reuses the
+        stored blob without decoding or writing anything.
 
         Args:
             upload_file: Uploaded file from FastAPI
-            card_id: ID of the card this image belongs to
 
         Returns:
-            Image URL for database storage
+            Stored image URLs for database storage
 
         Raises:
             HTTPException: If validation or processing fails
         """
-        # Read file data
-        file_data = await upload_file.read()
+        # Starlette has already spooled the upload to a temp file (in memory
+        # when small, on disk when large); work from that instead of read()
+        upload = upload_file.file
+        file_size = upload_file.size
+        if file_size is None:
+            file_size = upload.seek(0, os.SEEK_END)
 
-        # Validate file
+        # Validate size and type before decoding anything
         self.processor.validate_file(
-            file_data,
-            upload_file.content_type
+            file_size,
+            upload_file.content_type,
+            settings.MAX_UPLOAD_SIZE
         )
 
-        # Process image (resize, optimize)
-        processed_io, format_ext = self.processor.process_image(file_data)
+        upload.seek(0)
+        upload_hash = await asyncio.to_thread(hash_upload, upload)
+
+        # Threads can read the spool directly. Worker processes can't share it
+        # (a disk spool is an unnamed file), so large uploads reach them as a
+        # named copy rather than being read into this process's memory
+        if self.executor.shares_memory:
+            return await self.save_image(upload, upload_hash)
+        if file_size <= INLINE_UPLOAD_SIZE:
+            return await self.save_image(upload.read, upload_hash)
+        return await self.save_image(partial(copy_to_temp_file, upload), upload_hash)
+
+    async def save_image(
+        self,
+        source: Union[bytes, BinaryIO, Callable[[], Union[bytes, str]]],
+        upload_hash: str
+    ) -> StoredImage:
+        """
+        Store an upload's renditions under its content hash, or reuse a stored blob
+
+        No reference is taken here: the caller records the image with
+        blob_store.reference() in the same transaction as the card or job
+        that uses it. Renditions of a new blob are written before that
+        transaction, under filenames derived from their content, so a rolled
+        back scan leaves unreferenced files that the next upload of the same
+        image overwrites, or sweep_orphans removes.
+
+        Args:
+            source: Raw image bytes, a file object (thread executor only), or a
+                callable, only invoked if processing is needed, returning the
+                bytes or the path of a temp file that is deleted afterwards
+            upload_hash: hash_upload() of the original bytes
+
+        Returns:
+            Stored image URLs; `duplicate` is set if an existing blob was
+            reused, otherwise `vision_image` holds the rendition to send to
+            the vision model
+
+        Raises:
+            HTTPException: If processing fails
+        """
+        blob = await blob_store.find(upload_hash)
+        if blob:
+            return StoredImage(**blob, duplicate=True)
+
+        # Process image (single decode, resize, encode every derivative) on the executor
+        if callable(source):
+            source = await asyncio.to_thread(source)
+        try:
+            renditions, error = await self.executor.run(process_upload, source)
+        finally:
+            if isinstance(source, str):
+                await asyncio.to_thread(os.unlink, source)
+        del source
+        if error:
+            raise HTTPException(status_code=error[0], detail=error[1])
+
+        # Fresh mtimes keep a concurrent delete_files off these paths until referenced
+        async with blob_store.lock(upload_hash):
+            stored = await self.store_renditions(renditions, upload_hash, blob_key(upload_hash))
+        stored.content_hash = upload_hash
+        vision = vision_rendition(renditions, settings.VISION_DETAIL_LEVEL)
+        stored.vision_image = vision.data if vision else None
+        return stored
+
+    async def reference_image(self, db: AsyncSession, stored: StoredImage) -> StoredImage:
+        """
+        Take a blob reference for a saved image in the caller's transaction
+
+        Args:
+            db: Session of the transaction that stores the card or job using the image
+            stored: Result of save_card_image / save_image
 
-        # Generate safe filename
-        filename = self.processor.generate_filename(
-            upload_file.filename,
-            file_data,
-            card_id
+        Returns:
+            The image as recorded in the blob store (a concurrent upload of the
+            same content may have registered it first)
+        """
+        blob = await blob_store.reference(
+            db,
+            stored.content_hash,
+            stored.relative_path,
+            stored.image_url,
+            stored.image_srcset,
+            duplicate=stored.duplicate
         )
+        return StoredImage(**blob, duplicate=stored.duplicate)
+
+    async def store_renditions(
+        self,
+        renditions: List[Rendition],
+        stem: str,
+        key: Union[int, str]
+    ) -> StoredImage:
+        """
+        Save processed renditions concurrently
+
+        Each rendition is saved as {stem}.{hash}.{ext} (full-size JPEG) or
+        {stem}_{name}.{hash}.{ext}, where hash is a digest of the encoded
+        bytes, so URLs are immutable and can be cached indefinitely.
 
-        # Save to storage
-        relative_path = await self.storage.save(
-            processed_io,
-            filename,
-            card_id
+        Args:
+            renditions: Output of ImageProcessor.process_derivatives
+            stem: Base filename, without extension
+            key: Storage directory key (card ID or blob key)
+
+        Returns:
+            Stored image URLs
+        """
+        def rendition_filename(rendition: Rendition) -> str:
+            digest = file_digest(rendition.data)
+            extension = FORMAT_EXTENSIONS[rendition.format]
+            if rendition.name == 'full' and rendition.format == 'jpeg':
+                return f"{stem}.{digest}.{extension}"
+            return f"{stem}_{rendition.name}.{digest}.{extension}"
+
+        relative_paths = await asyncio.gather(*(
+            self.storage.save(BytesIO(r.data), rendition_filename(r), key)
+            for r in renditions
+        ))
+
+        srcset: Dict[str, Dict[str, str]] = {}
+        full_path = None
+        for rendition, relative_path in zip(renditions, relative_paths):
+            srcset.setdefault(rendition.format, {})[str(rendition.width)] = (
+                self.storage.get_url(relative_path)
+            )
+            if rendition.name == 'full' and rendition.format == 'jpeg':
+                full_path = relative_path
+
+        return StoredImage(
+            image_url=self.storage.get_url(full_path),
+            relative_path=full_path,
+            image_srcset=srcset
         )
 
-        # Return URL for database storage
-        return self.storage.get_url(relative_path)
+    async def release_image(
+        self,
+        db: AsyncSession,
+        image_url: str,
+        image_srcset: Optional[Dict[str, Dict[str, str]]] = None
+    ) -> List[str]:
+        """
+        Release a card's image in the caller's transaction
+
+        Args:
+            db: Session of the transaction that deletes the card (or job) holding the image
+            image_url: URL of the image
+            image_srcset: Derivative URLs (format -> width -> URL), if any
+
+        Returns:
+            URLs of the files to delete once that transaction has committed
+            (none while other cards still share the image), main image last
+        """
+        is_blob, unreferenced = await blob_store.release(db, image_url)
+        if is_blob:
+            if not unreferenced:
+                return []
+            urls = set(unreferenced)
+        else:
+            # Stored before content addressing; owned by this card alone
+            urls = self._srcset_urls(image_url, image_srcset)
+
+        urls.discard(image_url)
+        # Derivatives first, so the directory is removed with the last file
+        return sorted(urls) + [image_url]
+
+    async def delete_files(self, urls: List[str]) -> None:
+        """
+        Delete released image files, in order
+
+        A blob's files are kept if the blob was stored again since it was
+        released (its row exists, or the files were rewritten within
+        BLOB_ORPHAN_GRACE_SECONDS by an upload that has not committed yet);
+        sweep_orphans collects them if that upload is rolled back.
 
-    async def delete_card_image(self, image_url: str) -> bool:
+        Args:
+            urls: Output of release_image, after its transaction committed
         """
-        Delete a card image by its URL
+        blob_paths: Dict[str, List[str]] = {}
+        for url in urls:
+            relative_path = self.storage.get_path(url)
+            if relative_path is None:
+                continue
+            content_hash = blob_hash(relative_path)
+            if content_hash is None:
+                await self.storage.delete(relative_path)
+            else:
+                blob_paths.setdefault(content_hash, []).append(relative_path)
+
+        for content_hash, relative_paths in blob_paths.items():
+            await self._delete_blob_files(content_hash, relative_paths)
+
+    async def sweep_orphans(self, grace_seconds: Optional[float] = None) -> int:
+        """
+        Delete blob files that no blob row refers to
+
+        Collects renditions written for scans that rolled back and files
+        delete_files left behind. Files modified within the grace period are
+        kept, as they may belong to an upload whose reference has not
+        committed yet.
 
         Args:
-            image_url: URL of the image to delete
+            grace_seconds: Minimum age of deleted files (defaults to
+                BLOB_ORPHAN_GRACE_SECONDS)
 
         Returns:
-            True if deleted successfully, False otherwise
+            Number of files deleted
         """
-        # Extract relative path from URL
-        # URL format: /uploads/{card_id}/{filename}
-        if image_url.startswith('/uploads/'):
-            relative_path = image_url[9:]  # Remove '/uploads/' prefix
-            return await self.storage.delete(relative_path)
-        return False
+        if grace_seconds is None:
+            grace_seconds = settings.BLOB_ORPHAN_GRACE_SECONDS
+        deleted = 0
+        batch: Dict[str, List[str]] = {}
+        async for relative_path in self.storage.iter_files(BLOB_ROOT):
+            content_hash = blob_hash(relative_path)
+            if content_hash is None:
+                continue
+            if content_hash not in batch and len(batch) >= SWEEP_BATCH_SIZE:
+                deleted += await self._sweep_batch(batch, grace_seconds)
+                batch = {}
+            batch.setdefault(content_hash, []).append(relative_path)
+        return deleted + await self._sweep_batch(batch, grace_seconds)
+
+    async def _sweep_batch(self, batch: Dict[str, List[str]], grace_seconds: float) -> int:
+        referenced = await blob_store.existing(batch)
+        deleted = 0
+        for content_hash, relative_paths in batch.items():
+            if content_hash not in referenced:
+                deleted += await self._delete_blob_files(content_hash, relative_paths, grace_seconds)
+        return deleted
+
+    async def _delete_blob_files(
+        self,
+        content_hash: str,
+        relative_paths: List[str],
+        grace_seconds: Optional[float] = None
+    ) -> int:
+        """Delete one unreferenced blob's files, unless it has been stored again"""
+        if grace_seconds is None:
+            grace_seconds = settings.BLOB_ORPHAN_GRACE_SECONDS
+        async with blob_store.lock(content_hash):
+            if await blob_store.find(content_hash):
+                return 0
+            cutoff = time.time() - grace_seconds
+            modified = await asyncio.gather(*(self.storage.modified_at(p) for p in relative_paths))
+            if any(mtime is not None and mtime > cutoff for mtime in modified):
+                logger.info(f"Keeping recently written files of blob {content_hash} for the orphan sweep")
+                return 0
+            deleted = 0
+            for relative_path in relative_paths:
+                deleted += await self.storage.delete(relative_path)
+            return deleted
+
+    @staticmethod
+    def _srcset_urls(
+        image_url: str,
+        image_srcset: Optional[Dict[str, Dict[str, str]]]
+    ) -> Set[str]:
+        urls = {url for by_width in (image_srcset or {}).values() for url in by_width.values()}
+        urls.add(image_url)
+        return urls
+
+    async def load_for_vision(self, relative_path: str) -> Union[str, bytes]:
+        """
+        Image to pass to VisionService.extract_card_metadata
+
+        Args:
+            relative_path: Storage path of the image
+
+        Returns:
+            Local file path, or the image bytes for remote storage
+        """
+        return self.storage.local_path(relative_path) or await self.storage.read(relative_path)
 
     async def image_exists(self, image_url: str) -> bool:
         """
@@ -95,7 +398,40 @@ class ImageService:
         Returns:
             True if image exists, False otherwise
         """
-        if image_url.startswith('/uploads/'):
-            relative_path = image_url[9:]
-            return await self.storage.exists(relative_path)
-        return False
+        relative_path = self.storage.get_path(image_url)
+        if relative_path is None:
+            return False
+        return await self.storage.exists(relative_path)
+
+
+_sweeper: Optional[asyncio.Task] = None
+
+
+async def _sweep_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.BLOB_SWEEP_INTERVAL_SECONDS)
+        try:
+            deleted = await ImageService().sweep_orphans()
+            if deleted:
+                logger.info(f"Deleted {deleted} orphaned blob files")
+        except Exception as e:
+            logger.warning(f"Orphaned blob sweep failed: {str(e)}")
+
+
+def start_orphan_sweeper() -> None:
+    """Start sweeping orphaned blob files every BLOB_SWEEP_INTERVAL_SECONDS (called at startup)"""
+    global _sweeper
+    if settings.BLOB_SWEEP_INTERVAL_SECONDS > 0 and _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep_periodically(), name="blob-sweeper")
+
+
+async def stop_orphan_sweeper() -> None:
+    """Cancel the periodic sweep (called at shutdown)"""
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
@@ -0,0 +1,350 @@
+"""
+Background job queue with a pool of async workers
+
+Jobs are persisted in the ``jobs`` table so their status can be polled and
+unfinished work is picked up again after a restart. The in-memory queue only
+carries job IDs; every state change is written back to the database.
+
+Several processes (e.g. uvicorn workers) may share one database. A job is
+claimed with a lease that its worker renews while it runs; only jobs that are
+queued, or running under a lease nobody renewed (their process died), are
+recovered by another process, and a job is only completed by the process
+holding its lease.
+
+All job writes go through the single writer (see app.db.writer).
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Job
+from app.db.writer import write
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Work to do once a job's outcome has committed (e.g. enqueue a job it
+# created, or delete files nothing references any more)
+AfterCommit = Callable[[], Awaitable[None]]
+
+# Writes a job's outcome in the transaction that marks it succeeded; receives
+# that session and the job (whose card_id it may set) and returns the result,
+# plus what to do once it has committed
+JobCompletion = Callable[[AsyncSession, Job], Awaitable[Tuple[Optional[Dict[str, Any]], Optional[AfterCommit]]]]
+
+# Receives (job, db) and returns a JSON-serializable result, or a JobCompletion
+# when the result must commit together with the job's success. The session is
+# closed when the handler starts; using it checks out a connection again, so
+# close it before slow work that doesn't need the database.
+JobHandler = Callable[[Job, AsyncSession], Awaitable[Union[Optional[Dict[str, Any]], JobCompletion]]]
+
+# Runs in the transaction that marks a job failed, to release what the job
+# held; may return what to do once that has committed
+JobFailureHandler = Callable[[AsyncSession, Job], Awaitable[Optional[AfterCommit]]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _claimable(now: datetime):
+    """Jobs a worker may claim: queued, or running under an expired lease"""
+    return or_(
+        Job.status == JOB_QUEUED,
+        and_(Job.status == JOB_RUNNING, Job.lease_expires_at < now)
+    )
+
+
+class JobQueue:
+    """Dispatches persisted jobs to registered handlers on a worker pool"""
+
+    def __init__(self):
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._handlers: Dict[str, JobHandler] = {}
+        self._failure_handlers: Dict[str, JobFailureHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._reaper: Optional[asyncio.Task] = None
+        # Lease holder identity of this process's queue
+        self.owner = uuid.uuid4().hex
+
+    def register(
+        self,
+        kind: str,
+        handler: JobHandler,
+        on_failure: Optional[JobFailureHandler] = None
+    ) -> None:
+        """
+        Register the coroutine that processes jobs of a given kind
+
+        Args:
+            kind: Job kind, stored on each job row
+            handler: Coroutine receiving (job, db); see JobHandler
+            on_failure: Coroutine receiving (session, job) when a job fails;
+                see JobFailureHandler
+        """
+        self._handlers[kind] = handler
+        if on_failure is not None:
+            self._failure_handlers[kind] = on_failure
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self, num_workers: int) -> None:
+        """
+        Start worker tasks and enqueue jobs that are queued or whose lease expired
+
+        Args:
+            num_workers: Number of concurrent workers
+        """
+        if self._workers:
+            return
+
+        recovered = await self._enqueue_claimable()
+        if recovered:
+            logger.info(f"Recovered {recovered} unfinished jobs")
+
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(num_workers)
+        ]
+        self._reaper = asyncio.create_task(self._reap(), name="job-reaper")
+
+    async def stop(self) -> None:
+        """Cancel worker tasks and hand this process's running jobs back to the queue"""
+        tasks = self._workers + ([self._reaper] if self._reaper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._reaper = None
+
+        # Release leases so a restart (or another process) resumes them at once
+        async def release(session: AsyncSession) -> None:
+            await session.execute(
+                update(Job)
+                .where(Job.status == JOB_RUNNING, Job.lease_owner == self.owner)
+                .values(status=JOB_QUEUED, lease_owner=None, lease_expires_at=None)
+            )
+
+        try:
+            async with SessionLocal() as db:
+                await write(db, release)
+        except Exception as e:
+            logger.warning(f"Could not release job leases (they will expire): {str(e)}")
+
+    def create_job(
+        self,
+        db: AsyncSession,
+        kind: str,
+        card_id: Optional[int] = None,
+        payload: Optional[Dict[str, Any]] = None
+    ) -> Job:
+        """
+        Add a queued job to the session (caller commits, then enqueues)
+
+        Returns:
+            The new Job row
+        """
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status=JOB_QUEUED,
+            card_id=card_id,
+            payload=json.dumps(payload) if payload is not None else None
+        )
+        db.add(job)
+        return job
+
+    def enqueue(self, job_id: str, delay: float = 0.0) -> None:
+        """
+        Hand a committed job to the worker pool
+
+        Args:
+            job_id: The queued job
+            delay: Seconds to wait before handing it over; a delayed job is
+                still recovered (and run at once) if the process restarts first
+        """
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job_id)
+        else:
+            self._queue.put_nowait(job_id)
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    async def _enqueue_claimable(self, running_only: bool = False) -> int:
+        """Enqueue jobs that can be claimed now; returns how many"""
+        condition = _claimable(_now())
+        if running_only:
+            condition = and_(condition, Job.status == JOB_RUNNING)
+        async with SessionLocal() as db:
+            job_ids = list((await db.execute(
+                select(Job.id).where(condition).order_by(Job.created_at)
+            )).scalars())
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        return len(job_ids)
+
+    async def _reap(self) -> None:
+        """Periodically take over running jobs whose process stopped renewing their lease"""
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS)
+            try:
+                reaped = await self._enqueue_claimable(running_only=True)
+                if reaped:
+                    logger.warning(f"Taking over {reaped} jobs with expired leases")
+            except Exception as e:
+                logger.warning(f"Job lease check failed: {str(e)}")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.exception(f"Unhandled error running job {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        async with SessionLocal() as db:
+            # Claim the job atomically so it runs once even if enqueued twice
+            # (or by several processes)
+            async def claim(session: AsyncSession) -> int:
+                now = _now()
+                claimed = await session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, _claimable(now))
+                    .values(
+                        status=JOB_RUNNING,
+                        attempts=Job.attempts + 1,
+                        lease_owner=self.owner,
+                        lease_expires_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+                    )
+                )
+                return claimed.rowcount
+
+            if not await write(db, claim):
+                return
+            job = await db.get(Job, job_id, populate_existing=True)
+            # Don't hold a connection while the handler works
+            await db.close()
+
+            handler = self._handlers.get(job.kind)
+            if handler is None:
+                await self._finish(db, job, JOB_FAILED, error=f"No handler registered for job kind '{job.kind}'")
+                return
+
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                outcome = await handler(job, db)
+                heartbeat.cancel()
+                if callable(outcome):
+                    await self._finish(db, job, JOB_SUCCEEDED, complete=outcome)
+                else:
+                    await self._finish(db, job, JOB_SUCCEEDED, result=outcome)
+            except Exception as e:
+                logger.exception(f"Job {job_id} failed: {str(e)}")
+                await self._finish(db, job, JOB_FAILED, error=str(e))
+            finally:
+                heartbeat.cancel()
+
+    async def _finish(
+        self,
+        db: AsyncSession,
+        job: Job,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        complete: Optional[JobCompletion] = None
+    ) -> None:
+        """
+        Record a job's outcome if this process still holds its lease
+
+        A completion (or, for a failure, the kind's failure handler) runs in
+        the same write; if a completion raises, nothing is written and the
+        caller records the failure instead.
+        """
+        card_id = job.card_id
+        on_failure = self._failure_handlers.get(job.kind) if status == JOB_FAILED else None
+
+        async def record(session: AsyncSession) -> Tuple[bool, Optional[AfterCommit]]:
+            # A failed writer batch runs this again; undo what the completion set
+            job.card_id = card_id
+            # Updated first: the row lock keeps another process from reclaiming
+            # the job until this transaction ends
+            owned = await session.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.lease_owner == self.owner)
+                .values(status=status, error=error, lease_owner=None, lease_expires_at=None)
+            )
+            if not owned.rowcount:
+                # Nothing written yet
+                return False, None
+            if on_failure is not None:
+                return True, await on_failure(session, job)
+            after_commit = None
+            if status == JOB_SUCCEEDED:
+                outcome = result
+                if complete is not None:
+                    outcome, after_commit = await complete(session, job)
+                await session.execute(
+                    update(Job)
+                    .where(Job.id == job.id)
+                    .values(
+                        result=json.dumps(outcome) if outcome is not None else None,
+                        card_id=job.card_id
+                    )
+                )
+            return True, after_commit
+
+        try:
+            owned, after_commit = await write(db, record)
+        except Exception:
+            job.card_id = card_id
+            raise
+        if not owned:
+            logger.warning(f"Lost the lease on job {job.id}; leaving it to its new owner")
+        elif after_commit is not None:
+            try:
+                await after_commit()
+            except Exception as e:
+                logger.warning(f"Follow-up to job {job.id} failed: {str(e)}")
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """Renew a running job's lease until cancelled"""
+        async def renew(session: AsyncSession) -> int:
+            renewed = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == self.owner)
+                .values(lease_expires_at=_now() + timedelta(seconds=settings.JOB_LEASE_SECONDS))
+            )
+            return renewed.rowcount
+
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                async with SessionLocal() as db:
+                    renewed = await write(db, renew)
+                if not renewed:
+                    logger.warning(f"Lease on job {job_id} was taken over")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not renew lease on job {job_id}: {str(e)}")
+
+
+# Process-wide queue, started and stopped in the application lifespan
+job_queue = JobQueue()
@@ -0,0 +1,317 @@
+"""
+Local, offline card metadata extraction with Tesseract OCR
+
+The card's text is read with Tesseract and parsed with heuristics: the year
+from the copyright line, the card number from "No." / "#" markers, the brand
+and sport from keyword lists, and the player by matching text against the
+names already in the collection (plus OCR_PLAYER_NAMES_FILE) and in the
+reference catalog. Everything runs on the CPU of this machine; no network
+is involved.
+
+Requires the tesseract binary and pytesseract (pip install pytesseract).
+"""
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Card as CardModel
+from app.services.catalog import UNKNOWN_PLAYER, NameIndex, get_catalog, normalize_name, normalize_number
+from app.services.extractor import Extraction, ImageInput, MetadataExtractor
+
+try:
+    import pytesseract
+except ImportError:  # Optional dependency, only needed for local extraction
+    pytesseract = None
+
+logger = logging.getLogger(__name__)
+
+KNOWN_BRANDS = (
+    "Upper Deck", "O-Pee-Chee", "Stadium Club", "Topps", "Panini", "Bowman",
+    "Fleer", "Donruss", "Score", "Leaf", "Pinnacle", "SkyBox", "Hoops",
+    "Pacific", "Playoff", "Pro Set", "Futera", "Goudey",
+)
+SPORT_KEYWORDS = {
+    "baseball": "Baseball", "mlb": "Baseball",
+    "basketball": "Basketball", "nba": "Basketball", "wnba": "Basketball",
+    "football": "Football", "nfl": "Football",
+    "hockey": "Hockey", "nhl": "Hockey",
+    "soccer": "Soccer", "mls": "Soccer", "fifa": "Soccer",
+}
+# Words that appear on name-like lines but are not names
+NON_NAME_WORDS = {
+    "pitcher", "catcher", "infield", "outfield", "shortstop", "first", "second",
+    "third", "base", "guard", "forward", "center", "quarterback", "running",
+    "back", "receiver", "wide", "defense", "goalie", "rookie", "card", "series",
+    "all", "star", "team", "league", "major", "national", "american", "inc",
+    *SPORT_KEYWORDS,
+}
+
+_YEAR = re.compile(r"\b(19\d{2}|20\d{2})\b")
+_COPYRIGHT = re.compile(r"©|\(c\)|copyright", re.IGNORECASE)
+_CARD_NUMBER = (
+    re.compile(r"\b(?:no|number|card)\.?\s*#?\s*([a-z]{0,4}-?\d{1,4}[a-z]?)\b", re.IGNORECASE),
+    re.compile(r"#\s*([a-z]{0,4}-?\d{1,4}[a-z]?)\b", re.IGNORECASE),
+)
+_NAME_LINE = re.compile(r"^[A-Za-z][A-Za-z.'\-]*(?: [A-Za-z][A-Za-z.'\-]*){1,3}$")
+
+
+def parse_card_text(lines: Sequence[str], players: Sequence[NameIndex]) -> Tuple[Dict[str, Any], str]:
+    """
+    Pull card fields out of OCR'd text lines
+
+    Args:
+        lines: Recognized text, one entry per line in reading order
+        players: Indexes of known player names to match against, in order of preference
+
+    Returns:
+        Tuple of (fields dict with None for anything not found, confidence)
+    """
+    text = "\n".join(lines)
+    fields: Dict[str, Any] = {
+        "player_name": None, "year": None, "brand": None, "card_number": None,
+        "set_name": None, "sport": None, "condition": None,
+    }
+
+    # Year: the copyright line if there is one (stat lines list past seasons),
+    # otherwise only when a single plausible year is printed
+    latest = datetime.utcnow().year + 1
+    copyright_years = [
+        int(year) for line in lines if _COPYRIGHT.search(line)
+        for year in _YEAR.findall(line) if 1900 <= int(year) <= latest
+    ]
+    years = {int(year) for year in _YEAR.findall(text) if 1900 <= int(year) <= latest}
+    if copyright_years:
+        fields["year"] = max(copyright_years)
+    elif len(years) == 1:
+        fields["year"] = years.pop()
+
+    for pattern in _CARD_NUMBER:
+        match = pattern.search(text)
+        if match:
+            fields["card_number"] = match.group(1).upper()
+            break
+
+    # Brand: the first one printed (a card may also mention a licensor)
+    folded = text.casefold()
+    positions = []
+    for brand in KNOWN_BRANDS:
+        match = re.search(rf"\b{re.escape(brand.casefold())}\b", folded)
+        if match:
+            positions.append((match.start(), brand))
+    if positions:
+        fields["brand"] = min(positions)[1]
+
+    words = set(normalize_name(text).split())
+    sports = {SPORT_KEYWORDS[word] for word in words if word in SPORT_KEYWORDS}
+    if len(sports) == 1:
+        fields["sport"] = sports.pop()
+
+    fields["player_name"], player_matched = _find_player(lines, players)
+
+    found = sum(fields[name] is not None for name in ("player_name", "year", "brand", "card_number"))
+    if player_matched and fields["year"] and (fields["card_number"] or fields["brand"]):
+        confidence = "high"
+    elif found >= 2:
+        confidence = "medium"
+    else:
+        confidence = "low"
+    return fields, confidence
+
+
+def _find_player(lines: Sequence[str], players: Sequence[NameIndex]) -> Tuple[Optional[str], bool]:
+    """(player name, True if it matched a known name) from OCR lines"""
+    # Exact matches of any 2-4 word run, then close matches of whole lines
+    for line in lines:
+        tokens = normalize_name(line).split()
+        for size in (4, 3, 2):
+            for start in range(len(tokens) - size + 1):
+                for index in players:
+                    name = index.get(" ".join(tokens[start:start + size]))
+                    if name:
+                        return name, True
+    for line in lines:
+        if len(normalize_name(line)) >= 5:
+            for index in players:
+                name = index.closest(line, settings.OCR_NAME_MATCH_CUTOFF)
+                if name:
+                    return name, True
+
+    # Otherwise guess: the first line that looks like a name
+    for line in lines:
+        candidate = line.strip()
+        if not _NAME_LINE.match(candidate):
+            continue
+        tokens = normalize_name(candidate).split()
+        if any(token in NON_NAME_WORDS for token in tokens):
+            continue
+        if any(brand.casefold() in candidate.casefold() for brand in KNOWN_BRANDS):
+            continue
+        return candidate.title() if candidate.isupper() else candidate, False
+    return None, False
+
+
+class OcrExtractor(MetadataExtractor):
+    """Extracts card metadata locally with Tesseract OCR and text heuristics"""
+
+    name = "local"
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        """
+        Initialize the OCR extractor
+
+        Args:
+            max_concurrency: Images recognized at once (defaults to settings);
+                each runs a tesseract process
+        """
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.OCR_MAX_CONCURRENCY)
+        self._players: Optional[NameIndex] = None
+        self._players_loaded_at = 0.0
+        self._players_lock = asyncio.Lock()
+
+        self._available = False
+        if pytesseract is None:
+            logger.info("pytesseract not installed - local extraction disabled")
+            return
+        if settings.OCR_TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = settings.OCR_TESSERACT_CMD
+        try:
+            version = pytesseract.get_tesseract_version()
+        except Exception as e:
+            logger.warning(f"Tesseract not found - local extraction disabled: {e}")
+            return
+        self._available = True
+        logger.info(f"Local OCR extraction using Tesseract {version}")
+
+    def is_available(self) -> bool:
+        """Check if Tesseract can be run"""
+        return self._available
+
+    async def extract_card_metadata(
+        self,
+        image_path: ImageInput,
+        back_image: Optional[ImageInput] = None
+    ) -> Extraction:
+        """
+        Extract card metadata from the text printed on the card
+
+        With a back image, the text of both sides is parsed together (the
+        back usually carries the number and copyright year).
+        """
+        if not self.is_available():
+            return None, None, "Local OCR extraction not available"
+
+        images = [image_path] if back_image is None else [image_path, back_image]
+        try:
+            players = [await self._known_players(), (await get_catalog()).names]
+            async with self._semaphore:
+                lines = []
+                for image in images:
+                    lines.extend(await asyncio.to_thread(self._read_lines, image))
+        except Exception as e:
+            logger.exception(f"OCR failed: {str(e)}")
+            return None, None, f"OCR failed: {str(e)}"
+
+        if not lines:
+            return None, None, "No text recognized on card"
+
+        metadata, confidence = parse_card_text(lines, players)
+        if not any(value is not None for value in metadata.values()):
+            return None, None, "No card details recognized in text"
+        logger.info(
+            f"OCR extracted metadata with {confidence} confidence: "
+            f"{metadata.get('player_name') or 'Unknown'}"
+        )
+        return metadata, confidence, None
+
+    async def confirms(
+        self,
+        image_path: ImageInput,
+        back_image: Optional[ImageInput],
+        metadata: Dict[str, Any]
+    ) -> bool:
+        """
+        Check that a card's printed number (and year, if legible) match metadata
+
+        Used to vet near-duplicate vision cache hits: cards of one set look
+        alike, but their numbers differ.
+
+        Returns:
+            True only if the number read from the card equals metadata's
+            card_number and no different year was read
+        """
+        if not self.is_available() or not metadata.get("card_number"):
+            return False
+        images = [image_path] if back_image is None else [image_path, back_image]
+        try:
+            async with self._semaphore:
+                lines = []
+                for image in images:
+                    lines.extend(await asyncio.to_thread(self._read_lines, image))
+        except Exception as e:
+            logger.warning(f"OCR check of cached result failed: {str(e)}")
+            return False
+
+        fields, _ = parse_card_text(lines, ())
+        if not fields["card_number"]:
+            return False
+        if normalize_number(fields["card_number"]) != normalize_number(str(metadata["card_number"])):
+            return False
+        return not (fields["year"] and metadata.get("year") and fields["year"] != metadata["year"])
+
+    def _read_lines(self, image: ImageInput) -> List[str]:
+        """Recognize an image's text lines (runs in a thread)"""
+        img = Image.open(BytesIO(image) if isinstance(image, bytes) else image)
+        img = ImageOps.autocontrast(ImageOps.grayscale(img))
+        # Tesseract wants text glyphs roughly 20-30px tall; small renditions are enlarged
+        if max(img.size) < settings.OCR_MIN_DIMENSION:
+            scale = settings.OCR_MIN_DIMENSION / max(img.size)
+            img = img.resize(
+                (round(img.width * scale), round(img.height * scale)),
+                Image.Resampling.LANCZOS
+            )
+
+        # Sparse text mode: cards have scattered text, not paragraphs
+        data = pytesseract.image_to_data(
+            img,
+            config="--psm 11",
+            timeout=settings.OCR_TIMEOUT,
+            output_type=pytesseract.Output.DICT
+        )
+        lines: Dict[Tuple[int, int, int], List[str]] = {}
+        for index, word in enumerate(data["text"]):
+            if word.strip() and float(data["conf"][index]) >= settings.OCR_MIN_WORD_CONFIDENCE:
+                key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+                lines.setdefault(key, []).append(word.strip())
+        return [" ".join(words) for words in lines.values()]
+
+    async def _known_players(self) -> NameIndex:
+        """Player names from the collection and OCR_PLAYER_NAMES_FILE, reloaded every OCR_NAMES_TTL"""
+        if self._players is not None and time.monotonic() - self._players_loaded_at < settings.OCR_NAMES_TTL:
+            return self._players
+        async with self._players_lock:
+            if self._players is None or time.monotonic() - self._players_loaded_at >= settings.OCR_NAMES_TTL:
+                async with SessionLocal() as db:
+                    names = list((await db.execute(select(CardModel.player_name).distinct())).scalars())
+                if settings.OCR_PLAYER_NAMES_FILE:
+                    names.extend(await asyncio.to_thread(_read_names_file, settings.OCR_PLAYER_NAMES_FILE))
+                self._players = NameIndex(
+                    name for name in names if name.strip() and name != UNKNOWN_PLAYER
+                )
+                self._players_loaded_at = time.monotonic()
+        return self._players
+
+
+def _read_names_file(path: str) -> List[str]:
+    try:
+        with open(path, encoding="utf-8") as names_file:
+            return [line.strip() for line in names_file if line.strip()]
+    except OSError as e:
+        logger.warning(f"Could not read OCR_PLAYER_NAMES_FILE {path}: {e}")
+        return []
@@ -0,0 +1,19 @@
+from .base import PriceKey, PriceQuote, PriceSource
+from .sources import HttpPriceSource, SoldListingsPriceSource, SummaryPriceSource
+from .service import (
+    PRICE_REFRESH_JOB,
+    PriceLookupError,
+    PricingService,
+    close_pricing_service,
+    get_pricing_service,
+    init_pricing_service,
+    process_price_refresh_job,
+)
+
+__all__ = [
+    'PriceKey', 'PriceQuote', 'PriceSource',
+    'HttpPriceSource', 'SoldListingsPriceSource', 'SummaryPriceSource',
+    'PRICE_REFRESH_JOB', 'PriceLookupError', 'PricingService',
+    'close_pricing_service', 'get_pricing_service', 'init_pricing_service',
+    'process_price_refresh_job',
+]
@@ -0,0 +1,80 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, NamedTuple, Optional
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def _normalize_text(value: Optional[str]) -> str:
+    """Casefold and reduce punctuation/whitespace runs to single spaces"""
+    return _NON_ALNUM.sub(" ", (value or "").casefold()).strip()
+
+
+class PriceKey(NamedTuple):
+    """Normalized identity of a card for pricing; cards sharing a key share a price"""
+    player_name: str
+    year: Optional[int]
+    brand: str
+    card_number: str
+    set_name: str
+
+    @classmethod
+    def from_card(cls, card: Any) -> "PriceKey":
+        """
+        Build the key for any object with card attributes (ORM row or schema)
+
+        "Ken Griffey Jr." and "ken griffey jr" normalize alike, as do card
+        numbers "#1" and "1".
+        """
+        return cls(
+            player_name=_normalize_text(card.player_name),
+            year=card.year,
+            brand=_normalize_text(card.brand),
+            card_number=_normalize_text(card.card_number).replace(" ", ""),
+            set_name=_normalize_text(card.set_name)
+        )
+
+    @property
+    def digest(self) -> str:
+        """Stable 32 hex char key for the card_prices table"""
+        raw = "|".join("" if part is None else str(part) for part in self)
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class PriceQuote:
+    """Prices one source reported for a card"""
+    source: str
+    average_price: float
+    low_price: Optional[float] = None
+    high_price: Optional[float] = None
+    sample_size: int = 1  # Sales or listings behind the average
+    currency: str = "USD"
+
+
+class PriceSource(ABC):
+    """Abstract market data source"""
+
+    name: str
+
+    @abstractmethod
+    async def fetch(self, key: PriceKey) -> Optional[PriceQuote]:
+        """
+        Look up recent prices for a card
+
+        Args:
+            key: Normalized card identity
+
+        Returns:
+            Quote, or None if the source has no data for this card
+
+        Raises:
+            Exception: On transport or protocol errors (counted as a failed lookup)
+        """
+        pass
+
+    async def close(self) -> None:
+        """Release connections; override if the source holds any"""
+        pass
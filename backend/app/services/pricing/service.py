@@ -0,0 +1,332 @@
+"""
+Market price lookups cached in the card_prices table
+
+Prices are stored per normalized card identity (PriceKey), so every card of
+the same player/year/brand/number/set shares one row and one lookup. A row
+is served until its TTL expires; lookups of the same key that overlap share
+one fetch, and each fetch queries all configured sources concurrently.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import SessionLocal, upsert_insert
+from app.db.models import Card as CardModel, Job, MarketPrice
+from app.db.writer import write
+from app.services import collection_stats
+from .base import PriceKey, PriceQuote, PriceSource
+from .sources import SOURCE_TYPES
+
+logger = logging.getLogger(__name__)
+
+PRICE_REFRESH_JOB = "price_refresh"
+
+
+class PriceLookupError(Exception):
+    """Every source failed and no cached price was available"""
+
+
+def build_sources(
+    entries: List[str],
+    client: httpx.AsyncClient,
+    currency: str = "USD"
+) -> List[PriceSource]:
+    """
+    Create adapters from PRICE_SOURCES entries
+
+    Args:
+        entries: "kind=url" strings, e.g. "summary=http://127.0.0.1:9000/price"
+        client: Shared HTTP client for the adapters
+        currency: Currency prices are wanted in
+
+    Raises:
+        ValueError: If an entry is malformed or names an unknown kind
+    """
+    sources = []
+    for entry in entries:
+        kind, sep, url = entry.partition("=")
+        source_type = SOURCE_TYPES.get(kind.strip())
+        if not sep or source_type is None:
+            raise ValueError(
+                f"Invalid price source '{entry}'; expected kind=url with kind in {sorted(SOURCE_TYPES)}"
+            )
+        sources.append(source_type(url.strip(), client, currency=currency))
+    return sources
+
+
+def aggregate_quotes(quotes: List[PriceQuote]) -> Dict[str, Any]:
+    """Combine quotes from several sources, weighting each average by its sample size"""
+    total = sum(quote.sample_size for quote in quotes)
+    return {
+        "average_price": round(
+            sum(quote.average_price * quote.sample_size for quote in quotes) / total, 2
+        ),
+        "low_price": min(
+            quote.low_price if quote.low_price is not None else quote.average_price
+            for quote in quotes
+        ),
+        "high_price": max(
+            quote.high_price if quote.high_price is not None else quote.average_price
+            for quote in quotes
+        ),
+        "sample_size": total,
+        "sources": sorted(quote.source for quote in quotes),
+    }
+
+
+def _is_fresh(price: MarketPrice, now: datetime) -> bool:
+    expires_at = price.expires_at
+    if expires_at.tzinfo is None:
+        # SQLite returns naive datetimes; they were stored as UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at > now
+
+
+class PricingService:
+    """Looks up, caches and refreshes market prices for cards"""
+
+    def __init__(
+        self,
+        sources: Optional[List[PriceSource]] = None,
+        ttl_seconds: Optional[int] = None,
+        currency: Optional[str] = None
+    ):
+        """
+        Initialize pricing service
+
+        Args:
+            sources: Market data sources (defaults to PRICE_SOURCES, sharing
+                one pooled HTTP client owned by this service)
+            ttl_seconds: How long a stored price is served (defaults to settings)
+            currency: Quotes in other currencies are ignored (defaults to settings)
+        """
+        self.ttl = timedelta(seconds=ttl_seconds or settings.PRICE_TTL)
+        self.currency = currency or settings.PRICE_CURRENCY
+        self._client: Optional[httpx.AsyncClient] = None
+        if sources is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.PRICE_FETCH_TIMEOUT,
+                limits=httpx.Limits(max_connections=settings.PRICE_MAX_CONNECTIONS)
+            )
+            sources = build_sources(settings.PRICE_SOURCES, self._client, self.currency)
+        self.sources = sources
+
+        # Fetches in progress by PriceKey digest (single-flight)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # Metrics
+        self.hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.source_errors = 0
+
+    def is_available(self) -> bool:
+        """Check if any price source is configured"""
+        return bool(self.sources)
+
+    async def close(self) -> None:
+        """Close sources and the pooled HTTP client"""
+        for source in self.sources:
+            await source.close()
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def get_price(self, key: PriceKey, refresh: bool = False) -> MarketPrice:
+        """
+        Price for a card identity, from card_prices while fresh, else fetched
+
+        Args:
+            key: Normalized card identity
+            refresh: Fetch even if the stored price is still fresh
+
+        Returns:
+            Stored price (average_price is None if no source had data)
+
+        Raises:
+            PriceLookupError: If every source failed and nothing is stored
+        """
+        if not refresh:
+            stored = await self._load(key)
+            if stored is not None and _is_fresh(stored, datetime.now(timezone.utc)):
+                self.hits += 1
+                return stored
+
+        digest = key.digest
+        fetch = self._inflight.get(digest)
+        if fetch is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fetch)
+
+        fetch = asyncio.ensure_future(self._fetch_and_store(key))
+        self._inflight[digest] = fetch
+        try:
+            return await asyncio.shield(fetch)
+        finally:
+            self._inflight.pop(digest, None)
+
+    async def refresh_collection(
+        self,
+        force: bool = False,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Reprice every distinct card identity in the collection
+
+        Args:
+            force: Also refetch prices that are still fresh
+            concurrency: Lookups in flight at once (defaults to settings)
+
+        Returns:
+            Counts of keys seen, skipped as fresh, priced, without data and failed
+        """
+        async with SessionLocal() as db:
+            rows = await db.execute(
+                select(
+                    CardModel.player_name, CardModel.year, CardModel.brand,
+                    CardModel.card_number, CardModel.set_name
+                ).distinct()
+            )
+            keys: Set[PriceKey] = {PriceKey.from_card(row) for row in rows}
+
+            fresh: Set[str] = set()
+            if not force:
+                fresh = set((await db.execute(
+                    select(MarketPrice.price_key)
+                    .where(MarketPrice.expires_at > datetime.now(timezone.utc))
+                )).scalars())
+
+        stale = [key for key in keys if key.digest not in fresh]
+        counts = {"keys": len(keys), "fresh": len(keys) - len(stale), "priced": 0, "no_data": 0, "failed": 0}
+        semaphore = asyncio.Semaphore(concurrency or settings.PRICE_REFRESH_CONCURRENCY)
+
+        async def refresh(key: PriceKey) -> None:
+            async with semaphore:
+                try:
+                    price = await self.get_price(key, refresh=True)
+                except PriceLookupError:
+                    counts["failed"] += 1
+                    return
+            counts["priced" if price.average_price is not None else "no_data"] += 1
+
+        await asyncio.gather(*(refresh(key) for key in stale))
+        logger.info(f"Price refresh finished: {counts}")
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counters"""
+        return {
+            "sources": [source.name for source in self.sources],
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "source_errors": self.source_errors
+        }
+
+    async def _load(self, key: PriceKey) -> Optional[MarketPrice]:
+        async with SessionLocal() as db:
+            return (await db.execute(
+                select(MarketPrice).where(MarketPrice.price_key == key.digest)
+            )).scalar_one_or_none()
+
+    async def _fetch_and_store(self, key: PriceKey) -> MarketPrice:
+        self.fetches += 1
+        results = await asyncio.gather(
+            *(source.fetch(key) for source in self.sources),
+            return_exceptions=True
+        )
+
+        quotes = []
+        for source, result in zip(self.sources, results):
+            if isinstance(result, Exception):
+                self.source_errors += 1
+                logger.warning(f"Price source {source.name} failed for {key}: {result!r}")
+            elif result is not None and result.currency == self.currency:
+                quotes.append(result)
+
+        if not quotes and all(isinstance(result, Exception) for result in results):
+            # Keep serving the last known price rather than caching an outage
+            stored = await self._load(key)
+            if stored is not None:
+                return stored
+            raise PriceLookupError(f"All price sources failed for {key.player_name}")
+
+        now = datetime.now(timezone.utc)
+        values = {
+            "price_key": key.digest,
+            **key._asdict(),
+            "average_price": None,
+            "low_price": None,
+            "high_price": None,
+            "sample_size": 0,
+            "sources": [],
+            **(aggregate_quotes(quotes) if quotes else {}),
+            "currency": self.currency,
+            "fetched_at": now,
+            "expires_at": now + self.ttl,
+        }
+        async def store(session: AsyncSession) -> None:
+            # Collection value moves with the price, in the same transaction
+            old_price = (await session.execute(
+                select(MarketPrice.average_price).where(MarketPrice.price_key == key.digest)
+            )).scalar_one_or_none()
+            await self._upsert(session, values)
+            await collection_stats.price_changed(session, key.digest, old_price, values["average_price"])
+
+        async with SessionLocal() as db:
+            await write(db, store)
+        return MarketPrice(**values)
+
+    @staticmethod
+    async def _upsert(db: AsyncSession, values: Dict[str, Any]) -> None:
+        insert = upsert_insert(db)
+        statement = insert(MarketPrice).values(**values)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[MarketPrice.price_key],
+            set_={name: statement.excluded[name] for name in values if name != "price_key"}
+        ))
+
+
+async def process_price_refresh_job(job: Job, db: AsyncSession) -> Dict[str, int]:
+    """
+    Reprice the whole collection (job handler)
+
+    Args:
+        job: The refresh job; payload may set {"force": true}
+        db: Database session owned by the worker (unused; lookups use their own)
+
+    Returns:
+        Refresh counts from PricingService.refresh_collection
+    """
+    payload = json.loads(job.payload or "{}")
+    return await get_pricing_service().refresh_collection(force=bool(payload.get("force")))
+
+
+# Process-wide instance, created in the application lifespan
+_pricing_service: Optional[PricingService] = None
+
+
+def init_pricing_service() -> PricingService:
+    """Create the shared PricingService (called once at startup)"""
+    global _pricing_service
+    if _pricing_service is None:
+        _pricing_service = PricingService()
+    return _pricing_service
+
+
+def get_pricing_service() -> PricingService:
+    """Get the shared PricingService, creating it on first use"""
+    return _pricing_service or init_pricing_service()
+
+
+async def close_pricing_service() -> None:
+    """Close the shared PricingService's connection pool (called at shutdown)"""
+    global _pricing_service
+    if _pricing_service is not None:
+        await _pricing_service.close()
+        _pricing_service = None
@@ -0,0 +1,131 @@
+"""
+HTTP market data adapters
+
+Each adapter sends the normalized card fields as query parameters to a
+configured URL and maps the JSON reply onto a PriceQuote. URLs come from
+settings, so every adapter can be pointed at a local fixture server.
+"""
+import statistics
+from abc import abstractmethod
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+import httpx
+from .base import PriceKey, PriceQuote, PriceSource
+
+
+class HttpPriceSource(PriceSource):
+    """Abstract base for sources queried with GET {url}?player_name=...&year=..."""
+
+    kind = "http"
+
+    def __init__(
+        self,
+        url: str,
+        client: httpx.AsyncClient,
+        name: Optional[str] = None,
+        currency: str = "USD"
+    ):
+        """
+        Args:
+            url: Endpoint to query
+            client: Shared pooled HTTP client (owned by the pricing service)
+            name: Source name reported with prices (defaults to kind@host)
+            currency: Currency prices are wanted in
+        """
+        self.url = url
+        self.client = client
+        self.name = name or f"{self.kind}@{urlsplit(url).netloc}"
+        self.currency = currency
+
+    def params(self, key: PriceKey) -> Dict[str, Any]:
+        return {field: value for field, value in key._asdict().items() if value not in (None, "")}
+
+    async def fetch(self, key: PriceKey) -> Optional[PriceQuote]:
+        response = await self.client.get(self.url, params=self.params(key))
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return self.parse(response.json())
+
+    @abstractmethod
+    def parse(self, data: Any) -> Optional[PriceQuote]:
+        """
+        Map a reply onto a quote
+
+        Args:
+            data: Decoded JSON body
+
+        Returns:
+            Quote, or None if the reply holds no prices
+        """
+        pass
+
+
+class SummaryPriceSource(HttpPriceSource):
+    """
+    Source that returns precomputed statistics
+
+    Expected reply: {"average": 12.5, "low": 8.0, "high": 20.0, "count": 14,
+    "currency": "USD"}; a null average means no data.
+    """
+
+    kind = "summary"
+
+    def parse(self, data: Any) -> Optional[PriceQuote]:
+        if not isinstance(data, dict) or data.get("average") is None:
+            return None
+        return PriceQuote(
+            source=self.name,
+            average_price=float(data["average"]),
+            low_price=_optional_float(data.get("low")),
+            high_price=_optional_float(data.get("high")),
+            sample_size=int(data.get("count") or 1),
+            currency=data.get("currency") or "USD"
+        )
+
+
+class SoldListingsPriceSource(HttpPriceSource):
+    """
+    Source that returns individual completed sales
+
+    Expected reply: {"items": [{"price": 12.5, "currency": "USD"}, ...]}
+    (currency defaults to USD). Only sales in the wanted currency are
+    averaged. With ten or more of them the top and bottom 10% are dropped,
+    so a single mislabeled lot doesn't skew the price.
+    """
+
+    kind = "sold_listings"
+    TRIM_FRACTION = 0.1
+    TRIM_MIN_SALES = 10
+
+    def parse(self, data: Any) -> Optional[PriceQuote]:
+        items = data.get("items") if isinstance(data, dict) else None
+        prices: List[float] = sorted(
+            float(item["price"]) for item in items or []
+            if isinstance(item, dict) and item.get("price") is not None
+            and (item.get("currency") or "USD") == self.currency
+        )
+        if not prices:
+            return None
+        if len(prices) >= self.TRIM_MIN_SALES:
+            trim = int(len(prices) * self.TRIM_FRACTION)
+            prices = prices[trim:len(prices) - trim]
+        return PriceQuote(
+            source=self.name,
+            average_price=statistics.fmean(prices),
+            low_price=prices[0],
+            high_price=prices[-1],
+            sample_size=len(prices),
+            currency=self.currency
+        )
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+# Adapter classes by the kind used in PRICE_SOURCES entries ("kind=url")
+SOURCE_TYPES = {
+    SummaryPriceSource.kind: SummaryPriceSource,
+    SoldListingsPriceSource.kind: SoldListingsPriceSource,
+}
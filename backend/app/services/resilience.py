@@ -0,0 +1,195 @@
+"""
+Building blocks for calling a flaky upstream API
+
+- ``backoff_delay``: capped exponential backoff with full jitter, so clients
+  that failed together don't retry together.
+- ``RetryBudget``: retries are paid for by requests, which caps retries at a
+  fraction of traffic; when most calls fail, retries stop instead of
+  multiplying the load on a struggling provider.
+- ``CircuitBreaker``: after enough consecutive failures calls are rejected
+  immediately for a cool-down period, then a single probe decides whether
+  the provider has recovered.
+- ``LatencyTracker``: a window of recent latencies whose p95 sets when a
+  slow request is hedged with a second one.
+"""
+import bisect
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Circuit breaker states
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def backoff_delay(
+    attempt: int,
+    base_delay: float,
+    max_delay: float,
+    retry_after: Optional[float] = None
+) -> float:
+    """
+    Seconds to wait before a retry
+
+    Args:
+        attempt: Retries already made (0 before the first retry)
+        base_delay: Upper bound of the first delay; doubles per attempt
+        max_delay: Cap on any delay
+        retry_after: Delay the server asked for (Retry-After), used as a floor
+
+    Returns:
+        A random delay in [0, min(max_delay, base_delay * 2**attempt)], raised
+        to retry_after if the server asked for longer (still capped)
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return min(delay, max_delay)
+
+
+class RetryBudget:
+    """Token bucket that earns a fraction of a retry per request"""
+
+    def __init__(self, ratio: float, capacity: float):
+        """
+        Args:
+            ratio: Tokens earned per request; retries settle at this share of requests
+            capacity: Most tokens held, and the starting balance (a burst of retries)
+        """
+        self.ratio = ratio
+        self.capacity = capacity
+        self._tokens = capacity
+
+    def deposit(self) -> None:
+        """Credit one request"""
+        self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Spend a token on a retry; False if the budget is exhausted"""
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe is let
+                through; also how long a probe may take before another is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+
+        # Metrics
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may be made now (and count it as rejected if not)
+
+        An open circuit turns half-open once reset_timeout has passed and lets
+        one probe through; further calls are rejected until the probe reports
+        back, or until it has been out for reset_timeout (a lost probe).
+        """
+        now = time.monotonic()
+        if self.state == CIRCUIT_OPEN and now - self._opened_at >= self.reset_timeout:
+            self.state = CIRCUIT_HALF_OPEN
+            self._probe_started = 0.0
+        if self.state == CIRCUIT_HALF_OPEN and now - self._probe_started >= self.reset_timeout:
+            self._probe_started = now
+            return True
+        if self.state == CIRCUIT_CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        """The provider answered; close the circuit"""
+        self._failures = 0
+        self.state = CIRCUIT_CLOSED
+
+    def record_failure(self) -> None:
+        """The provider failed or timed out; open the circuit at the threshold"""
+        self._failures += 1
+        if self.state == CIRCUIT_HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != CIRCUIT_OPEN:
+                self.times_opened += 1
+            self.state = CIRCUIT_OPEN
+            self._opened_at = time.monotonic()
+
+    def retry_after(self) -> Optional[float]:
+        """
+        Seconds until calls are let through again
+
+        Returns:
+            None while closed; otherwise the remaining open time (0 once a
+            probe may be, or is being, made)
+        """
+        if self.state == CIRCUIT_CLOSED:
+            return None
+        if self.state == CIRCUIT_OPEN:
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """Percentiles over the most recent request latencies"""
+
+    def __init__(self, window: int, min_samples: int):
+        """
+        Args:
+            window: Latencies kept (older ones are dropped)
+            min_samples: Latencies needed before percentiles are reported
+        """
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._sorted: List[float] = []
+
+    def record(self, seconds: float) -> None:
+        """Add the latency of a completed request"""
+        if len(self._samples) == self._samples.maxlen:
+            del self._sorted[bisect.bisect_left(self._sorted, self._samples[0])]
+        self._samples.append(seconds)
+        bisect.insort(self._sorted, seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """The given percentile (0-100) of the window, or None with too few samples"""
+        if len(self._sorted) < max(self.min_samples, 1):
+            return None
+        index = min(len(self._sorted) - 1, int(len(self._sorted) * percent / 100))
+        return self._sorted[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
@@ -0,0 +1,325 @@
+"""
+Background processing for scanned cards
+
+The scan endpoint stores the image and queues a ``scan`` job; the handler
+below runs the slow metadata extraction without holding a database
+connection, then creates the card in the same transaction as the job's
+result.
+
+When extraction fails because the vision API's circuit breaker is open, the
+card is still created and a follow-up scan job for it is queued to run after
+the breaker's cool-down (see queue_retry). A scan that fails before its card
+exists releases the images it held (see release_scan_images).
+"""
+import asyncio
+import json
+import logging
+import random
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Dict, Optional, Tuple, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.models import Card as CardModel, CardImage, Job
+from app.services import collection_stats
+from app.services.blob_store import blob_store
+from app.services.catalog import UNKNOWN_PLAYER
+from app.services.collection_stats import CardFacts
+from app.services.image_service import ImageService
+from app.services.extraction_service import ExtractionService, get_extraction_service
+from app.services.job_queue import AfterCommit, JobCompletion, job_queue
+
+logger = logging.getLogger(__name__)
+
+SCAN_JOB = "scan"
+BACK_SIDE = "back"  # card_images.side of a front/back scan's second image
+EDITED_ERROR = "Card was edited before extraction was retried"
+
+# Extractions in progress by blob, so concurrent duplicate uploads share one call
+_inflight: Dict[str, asyncio.Future] = {}
+
+# Vision-ready images of queued scans by job id, handed over by the scan
+# request so the worker doesn't read back what was just processed. Bounded:
+# jobs whose images were evicted (or that run after a restart) load them from
+# storage instead.
+HANDOFF_MAX_JOBS = 64
+_handoff: "OrderedDict[str, Tuple[Optional[bytes], Optional[bytes]]]" = OrderedDict()
+
+
+def hand_off_images(job_id: str, image: Optional[bytes], back_image: Optional[bytes] = None) -> None:
+    """
+    Keep a scan's in-memory vision images for its job (call before enqueueing)
+
+    Args:
+        job_id: The queued scan job
+        image: StoredImage.vision_image of the front
+        back_image: StoredImage.vision_image of the back, if scanned
+    """
+    if image is None and back_image is None:
+        return
+    _handoff[job_id] = (image, back_image)
+    while len(_handoff) > HANDOFF_MAX_JOBS:
+        _handoff.popitem(last=False)
+
+
+def queue_retry(
+    db: AsyncSession,
+    card_id: int,
+    payload: Dict[str, Any],
+    retry_after: float
+) -> Tuple[Job, float]:
+    """
+    Queue a scan job that extracts a card's metadata again once the vision API is back
+
+    The retry's payload names its card: a retry only ever updates that card
+    (and fails if it was deleted), never creates one, and leaves the image
+    references to it.
+
+    Args:
+        db: Session the job is added to; the caller commits, then enqueues
+            the job with the returned delay
+        card_id: Card the retry fills in
+        payload: Scan job payload describing the card's images
+        retry_after: Seconds until the vision API's circuit lets calls through
+
+    Returns:
+        Tuple of (the new job, seconds to delay it by)
+    """
+    payload = {**payload, "card_id": card_id, "deferrals": payload.get("deferrals", 0) + 1}
+    job = job_queue.create_job(db, SCAN_JOB, card_id=card_id, payload=payload)
+    # Spread retries over a cool-down period so a recovering API isn't met by
+    # every deferred card at once (the breaker only lets one probe through)
+    delay = max(retry_after, 1.0) + random.uniform(0, settings.VISION_BREAKER_RESET_TIMEOUT)
+    return job, delay
+
+
+async def release_scan_images(db: AsyncSession, job: Job) -> Optional[AfterCommit]:
+    """
+    Drop the image references a failed scan job took for the card it never created
+
+    Registered as the scan job's failure handler, so the references are
+    released in the transaction that marks the job failed. A retry (whose
+    payload names its card) holds no references of its own: they belong to
+    the card, or were already released when it was deleted.
+
+    Args:
+        db: Session of the transaction recording the failure
+        job: The failed scan job
+
+    Returns:
+        Coroutine function deleting the files nothing references any more
+    """
+    payload = json.loads(job.payload or "{}")
+    if payload.get("card_id") is not None:
+        return None
+    image_service = ImageService()
+    urls = []
+    for image in (payload, payload.get("back")):
+        if image and image.get("image_url"):
+            urls += await image_service.release_image(db, image["image_url"], image.get("image_srcset"))
+    return partial(image_service.delete_files, urls) if urls else None
+
+
+async def extract_metadata(
+    extraction_service: ExtractionService,
+    image_service: ImageService,
+    relative_path: str,
+    content_hash: Optional[str] = None,
+    back_path: Optional[str] = None,
+    back_hash: Optional[str] = None,
+    image: Optional[bytes] = None,
+    back_image: Optional[bytes] = None,
+    mode: Optional[str] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+    """
+    Run metadata extraction, reusing the result already recorded for the image blob
+
+    Args:
+        extraction_service: Extraction service to run on a miss
+        image_service: Image service used to load the image from storage
+        relative_path: Storage path of the processed image
+        content_hash: Blob key of the image, if it is content-addressed
+        back_path: Storage path of the card's back, for a front/back scan
+        back_hash: Blob key of the back image
+        image: Vision-sized front already in memory (skips loading it)
+        back_image: Vision-sized back already in memory
+        mode: Extraction mode ("cloud", "local" or "auto"; defaults to settings)
+
+    Returns:
+        Tuple of (metadata dict or None, confidence or None, error message or None)
+    """
+    async def load(path: str, loaded: Optional[bytes]) -> Union[str, bytes]:
+        return loaded if loaded is not None else await image_service.load_for_vision(path)
+
+    async def extract() -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str], Optional[str]]:
+        if back_path is None:
+            return await extraction_service.extract(await load(relative_path, image), mode=mode)
+        front, back = await asyncio.gather(load(relative_path, image), load(back_path, back_image))
+        return await extraction_service.extract(front, back_image=back, mode=mode)
+
+    if not content_hash or (back_path is not None and not back_hash):
+        return (await extract())[:3]
+
+    # A blob records what its image alone yielded; front/back pairs are only
+    # shared while in flight (the vision cache covers rescans)
+    if back_path is None:
+        recorded = await blob_store.get_metadata(content_hash)
+        if recorded:
+            return recorded[0], recorded[1], None
+
+    key = content_hash if back_path is None else f"{content_hash}:{back_hash}"
+    key = f"{key}:{mode or settings.EXTRACTION_MODE}"
+    extraction = _inflight.get(key)
+    if extraction is not None:
+        return (await asyncio.shield(extraction))[:3]
+
+    extraction = asyncio.ensure_future(extract())
+    _inflight[key] = extraction
+    try:
+        metadata, confidence, error, source = await asyncio.shield(extraction)
+        # Only record results a later cloud scan of the blob couldn't improve on
+        if metadata and back_path is None and (
+            source == extraction_service.cloud.name or confidence == "high"
+        ):
+            await blob_store.set_metadata(content_hash, metadata, confidence)
+    finally:
+        _inflight.pop(key, None)
+    return metadata, confidence, error
+
+
+async def process_scan_job(job: Job, db: AsyncSession) -> JobCompletion:
+    """
+    Extract metadata for a scanned image; the returned completion creates its card
+
+    Extraction runs without a database connection. The card is then written
+    by the completion, in the transaction that marks the job succeeded, so
+    it is committed together with the job's result and only ever appears
+    fully populated. A front/back scan's payload carries the back image,
+    which is linked to the card in card_images. A retry queued while the
+    vision API was down names its card in the payload instead; that card is
+    updated, unless it was edited in the meantime, and the job fails if the
+    card was deleted.
+
+    Args:
+        job: The scan job being processed
+        db: Database session owned by the worker
+
+    Returns:
+        Completion that writes the card and returns the extraction outcome
+    """
+    payload = json.loads(job.payload or "{}")
+    back = payload.get("back")
+    deferrals = payload.get("deferrals", 0)
+    # Set on retries only (jobs.card_id is cleared when the card is deleted)
+    card_id = payload.get("card_id")
+
+    edited = False
+    if card_id is not None:
+        db_card = await db.get(CardModel, card_id)
+        if db_card is None:
+            raise ValueError("Card for scan job no longer exists")
+        edited = db_card.player_name != UNKNOWN_PLAYER
+        # Return the connection to the pool before the slow extraction
+        await db.close()
+
+    metadata = None
+    extraction_confidence = None
+    extraction_error = None
+    retry_after = None
+
+    extraction_service = get_extraction_service()
+    mode = payload.get("extractor")
+    if edited:
+        extraction_error = EDITED_ERROR
+        logger.info(f"Skipping extraction retry for card {card_id}: {extraction_error}")
+    elif settings.ENABLE_VISION_EXTRACTION and extraction_service.is_available(mode):
+        image_service = ImageService()
+        relative_path = image_service.storage.get_path(payload["image_url"])
+        image, back_image = _handoff.pop(job.id, (None, None))
+
+        metadata, confidence, error = await extract_metadata(
+            extraction_service,
+            image_service,
+            relative_path,
+            payload.get("content_hash"),
+            back_path=image_service.storage.get_path(back["image_url"]) if back else None,
+            back_hash=back.get("content_hash") if back else None,
+            image=image,
+            back_image=back_image,
+            mode=mode
+        )
+
+        if metadata:
+            extraction_confidence = confidence
+        else:
+            extraction_error = error
+            retry_after = extraction_service.retry_after(mode)
+            logger.warning(
+                f"Metadata extraction failed for scan job {job.id}: {error}"
+            )
+    else:
+        if not settings.ENABLE_VISION_EXTRACTION:
+            logger.info("Vision extraction disabled via feature flag")
+        else:
+            logger.info("No metadata extractor available - skipping metadata extraction")
+
+    async def save(session: AsyncSession, job: Job) -> Tuple[Dict[str, Any], Optional[AfterCommit]]:
+        before = None
+        if card_id is not None:
+            db_card = await session.get(CardModel, card_id)
+            if db_card is None:
+                raise ValueError("Card for scan job no longer exists")
+            before = CardFacts.of(db_card)
+        else:
+            db_card = CardModel(
+                player_name=UNKNOWN_PLAYER,
+                notes=f"Scanned from file: {payload.get('filename')}",
+                image_url=payload["image_url"],
+                image_srcset=payload.get("image_srcset")
+            )
+
+        result = {
+            "metadata_extracted": False,
+            "extraction_confidence": None,
+            "extraction_error": extraction_error
+        }
+        if metadata and before is not None and db_card.player_name != UNKNOWN_PLAYER:
+            # Edited while the retry's extraction ran
+            result["extraction_error"] = EDITED_ERROR
+        elif metadata:
+            # Fill in extracted metadata (only non-null values)
+            for key, value in metadata.items():
+                if value is not None and hasattr(db_card, key):
+                    setattr(db_card, key, value)
+            result["metadata_extracted"] = True
+            result["extraction_confidence"] = extraction_confidence
+
+        if before is not None:
+            await collection_stats.card_updated(session, before, db_card)
+        else:
+            await collection_stats.card_added(session, db_card)
+            session.add(db_card)
+            await session.flush()
+            job.card_id = db_card.id
+
+        if back and before is None:
+            session.add(CardImage(
+                card_id=db_card.id,
+                side=BACK_SIDE,
+                image_url=back["image_url"],
+                image_srcset=back.get("image_srcset")
+            ))
+
+        # The vision API is down: try this card again once it is back
+        enqueue_retry = None
+        if retry_after is not None and deferrals < settings.VISION_DEFER_MAX_ATTEMPTS:
+            retry_job, delay = queue_retry(session, db_card.id, payload, retry_after)
+            result["extraction_retry_job_id"] = retry_job.id
+            logger.info(f"Extraction for card {db_card.id} requeued as job {retry_job.id} in {delay:.0f}s")
+
+            # Only once the job row has committed
+            async def enqueue_retry() -> None:
+                job_queue.enqueue(retry_job.id, delay)
+        return result, enqueue_retry
+
+    return save
@@ -1,7 +1,11 @@
+from typing import Optional
 from .base import StorageBackend
 from .local import LocalStorageBackend
 from app.core.config import settings
 
+# Remote backends hold a connection pool, so one instance is shared per process
+_remote_backend: Optional[StorageBackend] = None
+
 
 def get_storage_backend() -> StorageBackend:
     """
@@ -10,9 +14,23 @@ def get_storage_backend() -> StorageBackend:
     Returns:
         Configured storage backend instance
     """
-    # For now, always return local storage
-    # Future: check settings.STORAGE_TYPE and return S3Backend, etc.
+    global _remote_backend
+    if settings.STORAGE_TYPE == "s3":
+        if _remote_backend is None:
+            from .s3 import S3StorageBackend
+            _remote_backend = S3StorageBackend()
+        return _remote_backend
+    if settings.STORAGE_TYPE != "local":
+        raise ValueError(f"Unknown storage type: {settings.STORAGE_TYPE}")
     return LocalStorageBackend(base_dir=settings.UPLOAD_DIR)
 
 
-__all__ = ['StorageBackend', 'LocalStorageBackend', 'get_storage_backend']
+async def close_storage_backend() -> None:
+    """Close the shared remote backend's connections (called at shutdown)"""
+    global _remote_backend
+    if _remote_backend is not None:
+        await _remote_backend.close()
+        _remote_backend = None
+
+
+__all__ = ['StorageBackend', 'LocalStorageBackend', 'get_storage_backend', 'close_storage_backend']
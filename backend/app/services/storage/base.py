@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import BinaryIO
+from typing import AsyncIterator, BinaryIO, Optional, Union
 
 
 class StorageBackend(ABC):
@@ -10,7 +10,7 @@ class StorageBackend(ABC):
         self,
         file_data: BinaryIO,
         filename: str,
-        card_id: int
+        card_id: Union[int, str]
     ) -> str:
         """
         Save file and return the storage path
@@ -18,7 +18,7 @@ class StorageBackend(ABC):
         Args:
             file_data: Binary file data to save
             filename: Name of the file
-            card_id: ID of the card this image belongs to
+            card_id: ID of the card (or other directory key) this image belongs to
 
         Returns:
             Relative path from base directory
@@ -51,6 +51,32 @@ class StorageBackend(ABC):
         """
         pass
 
+    @abstractmethod
+    async def modified_at(self, file_path: str) -> Optional[float]:
+        """
+        Last modification time of a file
+
+        Args:
+            file_path: Relative path to the file
+
+        Returns:
+            Unix timestamp, or None if the file does not exist
+        """
+        pass
+
+    @abstractmethod
+    def iter_files(self, prefix: str) -> AsyncIterator[str]:
+        """
+        List stored files under a directory, grouped by directory
+
+        Args:
+            prefix: Relative directory path
+
+        Yields:
+            Relative paths of the files
+        """
+        pass
+
     @abstractmethod
     def get_url(self, file_path: str) -> str:
         """
@@ -63,3 +89,56 @@ class StorageBackend(ABC):
             URL path that can be used to access the file
         """
         pass
+
+    @abstractmethod
+    async def read(self, file_path: str) -> bytes:
+        """
+        Read a stored file
+
+        Args:
+            file_path: Relative path to the file
+
+        Returns:
+            File contents
+        """
+        pass
+
+    def get_path(self, url: str) -> Optional[str]:
+        """
+        Map a URL returned by get_url back to its relative path
+
+        Args:
+            url: URL from get_url
+
+        Returns:
+            Relative path, or None if the URL is not from this backend
+        """
+        return None
+
+    def local_path(self, file_path: str) -> Optional[str]:
+        """
+        Absolute filesystem path of a stored file, if the backend has one
+
+        Args:
+            file_path: Relative path to the file
+
+        Returns:
+            Absolute path, or None for remote backends
+        """
+        return None
+
+    async def get_download_url(self, file_path: str) -> str:
+        """
+        URL a client can fetch the file from directly (e.g. a presigned URL)
+
+        Args:
+            file_path: Relative path to the file
+
+        Returns:
+            Download URL (defaults to get_url)
+        """
+        return self.get_url(file_path)
+
+    async def close(self) -> None:
+        """Release pooled connections (called at shutdown)"""
+        pass
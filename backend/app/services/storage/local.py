@@ -1,12 +1,24 @@
+import asyncio
+import hashlib
+import os
+import tempfile
 from pathlib import Path
-from typing import BinaryIO
-import aiofiles
+from typing import AsyncIterator, BinaryIO, List, Optional, Union
 
 from .base import StorageBackend
 
+# Bytes written per write() call when streaming a buffer to disk
+WRITE_CHUNK_SIZE = 1024 * 1024
+
 
 class LocalStorageBackend(StorageBackend):
-    """Local filesystem storage implementation"""
+    """
+    Local filesystem storage implementation
+
+    Every filesystem call runs in a worker thread so the event loop never
+    blocks on disk I/O. Files are written to a temp file in the target
+    directory and renamed into place, so readers never see a partial image.
+    """
 
     def __init__(self, base_dir: str):
         """
@@ -17,50 +29,139 @@ class LocalStorageBackend(StorageBackend):
         """
         self.base_dir = Path(base_dir).resolve()
 
+    @staticmethod
+    def shard(card_id: Union[int, str]) -> str:
+        """
+        Directory for a storage key, relative to base_dir
+
+        Single-segment keys (card IDs) are spread over two hash-prefix levels,
+        {xx}/{yy}/{card_id}, so no directory grows to hundreds of thousands of
+        entries. Keys containing '/' are already laid out by the caller (e.g.
+        blob keys) and are used as is.
+        """
+        key = str(card_id)
+        if '/' in key:
+            return key
+        digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+        return f"{digest[:2]}/{digest[2:4]}/{key}"
+
     async def save(
         self,
         file_data: BinaryIO,
         filename: str,
-        card_id: int
+        card_id: Union[int, str]
     ) -> str:
         """
-        Save file to uploads/{card_id}/{filename}
+        Save file to uploads/{shard(card_id)}/{filename}
 
         Returns:
             Relative path from base_dir
         """
-        # Create card-specific directory
-        card_dir = self.base_dir / str(card_id)
-        card_dir.mkdir(parents=True, exist_ok=True)
-
-        # Full file path
-        file_path = card_dir / filename
-
-        # Write file asynchronously
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = file_data.read()
-            await f.write(content)
+        relative_path = f"{self.shard(card_id)}/{filename}"
+        await asyncio.to_thread(self._write_atomic, self.base_dir / relative_path, file_data)
 
         # Return relative path for database storage
-        return f"{card_id}/{filename}"
+        return relative_path
+
+    @staticmethod
+    def _write_atomic(file_path: Path, file_data: BinaryIO) -> None:
+        """Stream file_data to a temp file next to file_path, then rename it into place"""
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=".tmp-")
+        except FileNotFoundError:
+            # A concurrent _delete pruned the directory between mkdir and
+            # mkstemp; once the temp file exists the directory is non-empty
+            # and can no longer be removed
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(file_data, 'getbuffer'):
+                    # BytesIO: write slices of its buffer without copying it
+                    with file_data.getbuffer() as buffer:
+                        for offset in range(0, len(buffer), WRITE_CHUNK_SIZE):
+                            f.write(buffer[offset:offset + WRITE_CHUNK_SIZE])
+                else:
+                    for chunk in iter(lambda: file_data.read(WRITE_CHUNK_SIZE), b''):
+                        f.write(chunk)
+            os.chmod(temp_path, 0o644)  # mkstemp creates files as 0600
+            os.replace(temp_path, file_path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
 
     async def delete(self, file_path: str) -> bool:
         """Delete file from filesystem"""
-        full_path = self.base_dir / file_path
+        return await asyncio.to_thread(self._delete, self.base_dir / file_path)
+
+    def _delete(self, full_path: Path) -> bool:
         try:
             full_path.unlink()
-            # Clean up empty directories
-            parent = full_path.parent
-            if parent != self.base_dir and not any(parent.iterdir()):
-                parent.rmdir()
-            return True
         except FileNotFoundError:
             return False
 
+        # Clean up empty directories up to base_dir; rmdir fails on the first
+        # non-empty one, so no directory listing is needed
+        parent = full_path.parent
+        while parent != self.base_dir and self.base_dir in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+        return True
+
     async def exists(self, file_path: str) -> bool:
         """Check if file exists"""
-        return (self.base_dir / file_path).exists()
+        return await asyncio.to_thread(os.path.isfile, self.base_dir / file_path)
+
+    async def modified_at(self, file_path: str) -> Optional[float]:
+        """File mtime"""
+        try:
+            return (await asyncio.to_thread(os.stat, self.base_dir / file_path)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    async def iter_files(self, prefix: str) -> AsyncIterator[str]:
+        """Walk the tree, listing one directory at a time and skipping temp files"""
+        directories = await asyncio.to_thread(self._file_directories, self.base_dir / prefix)
+        for directory in directories:
+            for relative_path in await asyncio.to_thread(self._list_directory, directory):
+                yield relative_path
+
+    @staticmethod
+    def _file_directories(root: Path) -> List[Path]:
+        return sorted(Path(path) for path, _, files in os.walk(root) if files)
+
+    def _list_directory(self, directory: Path) -> List[str]:
+        try:
+            with os.scandir(directory) as entries:
+                return sorted(
+                    (directory / entry.name).relative_to(self.base_dir).as_posix()
+                    for entry in entries
+                    if entry.is_file() and not entry.name.startswith(".tmp-")
+                )
+        except FileNotFoundError:
+            return []
+
+    async def read(self, file_path: str) -> bytes:
+        """Read file contents"""
+        return await asyncio.to_thread((self.base_dir / file_path).read_bytes)
 
     def get_url(self, file_path: str) -> str:
         """Get URL path for static file serving"""
         return f"/uploads/{file_path}"
+
+    def get_path(self, url: str) -> Optional[str]:
+        """Relative path from a /uploads/ URL"""
+        if url.startswith('/uploads/'):
+            return url[len('/uploads/'):]
+        return None
+
+    def local_path(self, file_path: str) -> Optional[str]:
+        """Absolute path under base_dir"""
+        return str(self.base_dir / file_path)
@@ -0,0 +1,223 @@
+import asyncio
+import mimetypes
+from typing import Any, AsyncIterator, BinaryIO, Optional, Union
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+    from botocore.exceptions import ClientError
+except ImportError:  # Optional dependency, only needed for STORAGE_TYPE=s3
+    get_session = None
+
+from app.core.config import settings
+from .base import StorageBackend
+
+# Stored filenames embed a content hash, so objects never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3-compatible object storage (AWS S3, MinIO, moto, ...)
+
+    One aiobotocore client, with its own HTTP connection pool, is shared by
+    all requests. Objects at or above S3_MULTIPART_THRESHOLD are sent with a
+    multipart upload. Unless S3_PUBLIC_URL points at a public bucket or CDN,
+    get_url returns /api/images/... which redirects to a presigned GET URL, so
+    image bytes never pass through the API process.
+    """
+
+    def __init__(
+        self,
+        bucket: Optional[str] = None,
+        prefix: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        public_url: Optional[str] = None
+    ):
+        """
+        Initialize S3 storage backend
+
+        Args:
+            bucket: Bucket name (defaults to settings)
+            prefix: Key prefix inside the bucket (defaults to settings)
+            endpoint_url: Custom endpoint, e.g. MinIO (defaults to settings)
+            region: Bucket region (defaults to settings)
+            public_url: Public base URL for objects (defaults to settings)
+        """
+        if get_session is None:
+            raise RuntimeError("STORAGE_TYPE=s3 requires aiobotocore (pip install aiobotocore)")
+
+        self.bucket = bucket or settings.S3_BUCKET
+        if not self.bucket:
+            raise RuntimeError("S3_BUCKET must be set when STORAGE_TYPE=s3")
+        self.prefix = (settings.S3_PREFIX if prefix is None else prefix).strip("/")
+        self.endpoint_url = endpoint_url or settings.S3_ENDPOINT_URL or None
+        self.region = region or settings.S3_REGION
+        self.public_url = (public_url or settings.S3_PUBLIC_URL).rstrip("/")
+
+        self._session = get_session()
+        self._client_context = None
+        self._client = None
+        self._lock = asyncio.Lock()
+
+    async def _get_client(self) -> Any:
+        """Create the shared client on first use"""
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._client_context = self._session.create_client(
+                        "s3",
+                        region_name=self.region,
+                        endpoint_url=self.endpoint_url,
+                        aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+                        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+                        config=AioConfig(
+                            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                            retries={"max_attempts": 3, "mode": "standard"}
+                        )
+                    )
+                    self._client = await self._client_context.__aenter__()
+        return self._client
+
+    async def close(self) -> None:
+        """Close the shared client and its connection pool"""
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client_context = None
+            self._client = None
+
+    def _key(self, file_path: str) -> str:
+        return f"{self.prefix}/{file_path}" if self.prefix else file_path
+
+    async def save(
+        self,
+        file_data: BinaryIO,
+        filename: str,
+        card_id: Union[int, str]
+    ) -> str:
+        """
+        Upload file to {prefix}/{card_id}/{filename}
+
+        Returns:
+            Relative path (key without prefix)
+        """
+        file_path = f"{card_id}/{filename}"
+        extra = {
+            "ContentType": mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            "CacheControl": IMMUTABLE_CACHE_CONTROL
+        }
+        client = await self._get_client()
+
+        data = file_data.read()
+        if len(data) < settings.S3_MULTIPART_THRESHOLD:
+            await client.put_object(Bucket=self.bucket, Key=self._key(file_path), Body=data, **extra)
+        else:
+            await self._multipart_upload(client, self._key(file_path), data, extra)
+        return file_path
+
+    async def _multipart_upload(self, client: Any, key: str, data: bytes, extra: dict) -> None:
+        """Upload parts concurrently, aborting the upload on failure"""
+        upload = await client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra)
+        upload_id = upload["UploadId"]
+        chunk_size = settings.S3_MULTIPART_CHUNK_SIZE
+        semaphore = asyncio.Semaphore(settings.S3_MULTIPART_CONCURRENCY)
+        view = memoryview(data)
+
+        async def upload_part(number: int, offset: int) -> dict:
+            async with semaphore:
+                part = await client.upload_part(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=bytes(view[offset:offset + chunk_size])
+                )
+            return {"PartNumber": number, "ETag": part["ETag"]}
+
+        try:
+            parts = await asyncio.gather(*(
+                upload_part(number, offset)
+                for number, offset in enumerate(range(0, len(data), chunk_size), start=1)
+            ))
+            await client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            await client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def delete(self, file_path: str) -> bool:
+        """Delete object (S3 deletes are idempotent, so check existence first)"""
+        if not await self.exists(file_path):
+            return False
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=self._key(file_path))
+        return True
+
+    async def exists(self, file_path: str) -> bool:
+        """Check if object exists"""
+        client = await self._get_client()
+        try:
+            await client.head_object(Bucket=self.bucket, Key=self._key(file_path))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def modified_at(self, file_path: str) -> Optional[float]:
+        """Object LastModified time"""
+        client = await self._get_client()
+        try:
+            head = await client.head_object(Bucket=self.bucket, Key=self._key(file_path))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head["LastModified"].timestamp()
+
+    async def iter_files(self, prefix: str) -> AsyncIterator[str]:
+        """Page through ListObjectsV2 (keys come back in lexicographic order)"""
+        client = await self._get_client()
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        paginator = client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix.rstrip("/") + "/")):
+            for item in page.get("Contents", []):
+                yield item["Key"][strip:]
+
+    async def read(self, file_path: str) -> bytes:
+        """Download object contents"""
+        client = await self._get_client()
+        response = await client.get_object(Bucket=self.bucket, Key=self._key(file_path))
+        async with response["Body"] as stream:
+            return await stream.read()
+
+    def get_url(self, file_path: str) -> str:
+        """Public object URL, or the API route that redirects to a presigned URL"""
+        if self.public_url:
+            return f"{self.public_url}/{self._key(file_path)}"
+        return f"/api/images/{file_path}"
+
+    def get_path(self, url: str) -> Optional[str]:
+        """Relative path from a URL returned by get_url"""
+        if self.public_url and url.startswith(f"{self.public_url}/"):
+            key = url[len(self.public_url) + 1:]
+            if self.prefix:
+                return key[len(self.prefix) + 1:] if key.startswith(f"{self.prefix}/") else None
+            return key
+        if url.startswith("/api/images/"):
+            return url[len("/api/images/"):]
+        return None
+
+    async def get_download_url(self, file_path: str) -> str:
+        """Presigned GET URL, valid for S3_PRESIGN_EXPIRY seconds"""
+        client = await self._get_client()
+        return await client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(file_path)},
+            ExpiresIn=settings.S3_PRESIGN_EXPIRY
+        )
@@ -0,0 +1,295 @@
+"""
+Cache of vision extraction results keyed by perceptual image hash
+
+Rescans of the same card produce slightly different photos, so entries are
+keyed by a 64-bit difference hash (dHash) of the processed image rather than
+by its bytes. A lookup first tries an exact hash match, then any entry within
+VISION_CACHE_MAX_DISTANCE differing bits. The hash is split into four 16-bit
+bands: two hashes that differ in at most 3 bits always share a band, so
+near-duplicate candidates come from an indexed band lookup, not a table scan.
+
+Cards of one set share a template, so their hashes can be only a few bits
+apart, or even equal: a dHash captures the layout, not the printed text. Any
+hit, exact or near, is therefore only served once the caller's verify step
+(the printed card number, read locally) confirms it is the same card. Callers
+without such a check (no local OCR) get exact matches only, accepting that a
+same-template card with an identical hash may be served its sibling's result.
+
+Lookups don't write: last-access times are buffered and written in batches
+(with the next put, or every TOUCH_BATCH_SIZE hits). All writes go through
+the single writer.
+"""
+import hashlib
+import json
+import logging
+from io import BytesIO
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
+from pathlib import Path
+from PIL import Image
+from sqlalchemy import bindparam, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import VisionCacheEntry
+from app.db.writer import write
+
+logger = logging.getLogger(__name__)
+
+HASH_BANDS = 4
+TOUCH_BATCH_SIZE = 64  # Buffered last-access updates written at once
+
+
+def dhash(image: Union[str, Path, bytes, Image.Image], hash_size: int = 8) -> str:
+    """
+    Compute a difference hash of an image
+
+    Args:
+        image: Image path, encoded image bytes or opened PIL image
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        Hash as a hex string (16 chars for the default 64 bits)
+    """
+    if isinstance(image, bytes):
+        image = BytesIO(image)
+    img = image if isinstance(image, Image.Image) else Image.open(image)
+    # Decode at reduced size for JPEGs; the hash only needs a 9x8 grayscale
+    img.draft('L', (hash_size * 8, hash_size * 8))
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Number of differing bits between two hex hashes"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def _bands(image_hash: str) -> Tuple[str, ...]:
+    width = len(image_hash) // HASH_BANDS
+    return tuple(image_hash[i * width:(i + 1) * width] for i in range(HASH_BANDS))
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class VisionCache:
+    """SQLite-backed LRU/TTL cache of vision results"""
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        prompt: str = "",
+        ttl_seconds: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        max_distance: Optional[int] = None
+    ):
+        """
+        Initialize vision cache
+
+        Args:
+            model: Vision model name, part of the cache key (defaults to settings)
+            prompt: System prompt; its hash is part of the cache key
+            ttl_seconds: Entry lifetime (defaults to settings)
+            max_entries: Size bound before LRU eviction (defaults to settings)
+            max_distance: Max hash bits differing for a near hit (defaults to settings)
+        """
+        self.model = model or settings.VISION_MODEL
+        self.prompt_hash = _prompt_hash(prompt)
+        self.ttl = timedelta(seconds=ttl_seconds or settings.VISION_CACHE_TTL)
+        self.max_entries = max_entries or settings.VISION_CACHE_MAX_ENTRIES
+        distance = settings.VISION_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+        # Band lookup only guarantees recall below HASH_BANDS differing bits
+        self.max_distance = max(0, min(distance, HASH_BANDS - 1))
+
+        # Entry id -> last access time, not yet written
+        self._touched: Dict[int, datetime] = {}
+
+        self.hits = 0
+        self.near_hits = 0
+        self.rejected = 0
+        self.misses = 0
+
+    async def get(
+        self,
+        image_hash: str,
+        prompt: Optional[str] = None,
+        verify: Optional[Callable[[Dict], Awaitable[bool]]] = None
+    ) -> Optional[Tuple[Dict, Optional[str]]]:
+        """
+        Look up a cached result for an image hash
+
+        Args:
+            image_hash: dhash() of the (front) image
+            prompt: Prompt the result must have been produced with, if not
+                the cache's own (e.g. the front/back prompt)
+            verify: Called with a cached result's metadata; the hit is only
+                served if it returns True (without it, only exact matches
+                are served)
+
+        Returns:
+            (metadata, confidence) on a hit, None on a miss
+        """
+        now = datetime.now(timezone.utc)
+        prompt_hash = self.prompt_hash if prompt is None else _prompt_hash(prompt)
+        key = (
+            VisionCacheEntry.model == self.model,
+            VisionCacheEntry.prompt_hash == prompt_hash
+        )
+        async with SessionLocal() as db:
+            entry = (await db.execute(
+                select(VisionCacheEntry).where(*key, VisionCacheEntry.image_hash == image_hash)
+            )).scalars().first()
+            near = False
+
+            if entry is None and self.max_distance > 0:
+                bands = _bands(image_hash)
+                candidates = (await db.execute(
+                    select(VisionCacheEntry).where(*key, or_(
+                        VisionCacheEntry.band0 == bands[0],
+                        VisionCacheEntry.band1 == bands[1],
+                        VisionCacheEntry.band2 == bands[2],
+                        VisionCacheEntry.band3 == bands[3]
+                    ))
+                )).scalars().all()
+                scored = [
+                    (hamming_distance(image_hash, c.image_hash), c) for c in candidates
+                ]
+                scored = [s for s in scored if s[0] <= self.max_distance]
+                if scored:
+                    entry = min(scored, key=lambda s: s[0])[1]
+                    near = True
+
+        # Expired entries are a miss; put() deletes them
+        if entry is None or self._as_utc(entry.created_at) + self.ttl < now:
+            self.misses += 1
+            return None
+
+        metadata = json.loads(entry.extracted_metadata)
+        if verify is not None:
+            confirmed = await verify(dict(metadata))
+        else:
+            confirmed = not near
+        if not confirmed:
+            self.rejected += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if near:
+            self.near_hits += 1
+        self._touched[entry.id] = now
+        if len(self._touched) >= TOUCH_BATCH_SIZE:
+            touched, self._touched = self._touched, {}
+
+            async def record(session: AsyncSession) -> None:
+                await self._write_touches(session, touched)
+
+            try:
+                async with SessionLocal() as db:
+                    await write(db, record)
+            except Exception as e:
+                logger.warning(f"Failed to record vision cache access times: {str(e)}")
+        return metadata, entry.confidence
+
+    @staticmethod
+    async def _write_touches(db: AsyncSession, touched: Dict[int, datetime]) -> None:
+        """Write last-access times in the caller's transaction"""
+        if not touched:
+            return
+        # One executemany on the table; entries evicted meanwhile match nothing
+        table = VisionCacheEntry.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("entry_id"))
+            .values(last_accessed_at=bindparam("accessed_at")),
+            [{"entry_id": entry_id, "accessed_at": at} for entry_id, at in touched.items()]
+        )
+
+    async def put(
+        self,
+        image_hash: str,
+        metadata: Dict,
+        confidence: Optional[str],
+        prompt: Optional[str] = None
+    ) -> None:
+        """Store a result (produced with `prompt`, see get), evicting expired and least recently used entries"""
+        now = datetime.now(timezone.utc)
+        bands = _bands(image_hash)
+        prompt_hash = self.prompt_hash if prompt is None else _prompt_hash(prompt)
+        touched, self._touched = self._touched, {}
+
+        async def store(session: AsyncSession) -> None:
+            entry = (await session.execute(
+                select(VisionCacheEntry).where(
+                    VisionCacheEntry.model == self.model,
+                    VisionCacheEntry.prompt_hash == prompt_hash,
+                    VisionCacheEntry.image_hash == image_hash
+                )
+            )).scalars().first()
+            if entry is None:
+                entry = VisionCacheEntry(
+                    model=self.model,
+                    prompt_hash=prompt_hash,
+                    image_hash=image_hash,
+                    band0=bands[0],
+                    band1=bands[1],
+                    band2=bands[2],
+                    band3=bands[3]
+                )
+                session.add(entry)
+            entry.extracted_metadata = json.dumps(metadata)
+            entry.confidence = confidence
+            entry.created_at = now
+            entry.last_accessed_at = now
+            await session.flush()
+            await self._write_touches(session, touched)
+
+            # Expire old entries, then trim to size by least recent access
+            await session.execute(
+                delete(VisionCacheEntry).where(VisionCacheEntry.created_at < now - self.ttl)
+            )
+            count = await session.scalar(select(func.count()).select_from(VisionCacheEntry))
+            overflow = count - self.max_entries
+            if overflow > 0:
+                stale_ids = select(VisionCacheEntry.id).order_by(
+                    VisionCacheEntry.last_accessed_at
+                ).limit(overflow).scalar_subquery()
+                await session.execute(
+                    delete(VisionCacheEntry).where(VisionCacheEntry.id.in_(stale_ids))
+                )
+
+        try:
+            async with SessionLocal() as db:
+                await write(db, store)
+        except Exception as e:
+            logger.warning(f"Failed to store vision cache entry: {str(e)}")
+
+    async def stats(self) -> Dict:
+        """Hit/miss counters for this process plus current size"""
+        async with SessionLocal() as db:
+            entries = await db.scalar(select(func.count()).select_from(VisionCacheEntry))
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "rejected": self.rejected,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries
+        }
+
+    @staticmethod
+    def _as_utc(value: datetime) -> datetime:
+        # SQLite returns naive datetimes
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -1,20 +1,68 @@
 """
 Service for extracting card metadata using OpenAI Vision API
+
+Calls are made resilient with the helpers in services.resilience: transient
+failures (timeouts, connection errors, 408/409/429 and 5xx responses) are
+retried with jittered backoff within a retry budget, a circuit breaker makes
+calls fail fast while the API keeps failing, and with VISION_HEDGE_ENABLED a
+request still unanswered at the observed p95 latency is raced by a second one.
+The client's own retries are disabled so every attempt goes through this.
 """
+import asyncio
 import base64
 import json
 import logging
-from typing import Dict, Optional, Tuple
-from pathlib import Path
-from openai import OpenAI, APIError, APITimeoutError
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+import httpx
+from openai import (
+    AsyncOpenAI, DefaultAsyncHttpxClient, APIConnectionError, APIError,
+    APIStatusError, APITimeoutError
+)
+from openai.types.chat import ChatCompletion
 from app.core.config import settings
+from app.services.extractor import Extraction, ImageInput, MetadataExtractor
+from app.services.image_processor import ImageProcessor
+from app.services.resilience import (
+    CircuitBreaker, CircuitOpenError, LatencyTracker, RetryBudget, backoff_delay
+)
+from app.services.vision_cache import VisionCache, dhash
 
 logger = logging.getLogger(__name__)
 
+# Status codes worth retrying: the request may succeed if sent again
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+
+def is_transient(error: APIError) -> bool:
+    """Check if a failed call may succeed when retried (and counts against the provider's health)"""
+    if isinstance(error, APIConnectionError):  # Includes timeouts
+        return True
+    return isinstance(error, APIStatusError) and (
+        error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    )
+
 
-class VisionService:
+def requested_delay(error: APIError) -> Optional[float]:
+    """Seconds the server asked to wait (retry-after-ms / retry-after in seconds), if any"""
+    if not isinstance(error, APIStatusError):
+        return None
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:  # An HTTP date; fall back to our own backoff
+        pass
+    return None
+
+
+class VisionService(MetadataExtractor):
     """Service for analyzing card images with GPT-4 Vision"""
 
+    name = "openai"
+
     # System prompt for card metadata extraction
     SYSTEM_PROMPT = """You are a sports card identification expert. Analyze the provided card image and extract all visible metadata.
 
@@ -48,79 +96,191 @@ Rules:
 - confidence: "high" if most fields identified, "medium" if some fields, "low" if only 1-2 fields
 """
 
-    def __init__(self, api_key: Optional[str] = None):
+    # Appended to SYSTEM_PROMPT when both sides of the card are sent
+    FRONT_BACK_PROMPT = SYSTEM_PROMPT + """
+You are given two images of the same card: the first is the FRONT, the second is the BACK.
+Merge what each side shows into one answer:
+- The front usually shows the player name, and often the brand/logo and set design
+- The back usually carries the card number, the year (copyright line), set name and manufacturer
+- Use the back for card_number and year when it prints them; fall back to the front otherwise
+- If the two sides disagree, use the value printed most clearly and mention it in notes
+"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        cache: Optional[VisionCache] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
         """
         Initialize Vision Service
 
+        The service owns one AsyncOpenAI client with a pooled, keep-alive
+        HTTP connection; create it once per process (see init_vision_service).
+
         Args:
             api_key: OpenAI API key (defaults to settings)
+            base_url: API base URL override (defaults to settings)
+            max_concurrency: Maximum in-flight vision requests (defaults to settings)
+            cache: Result cache consulted before calling the API (optional)
+            http_client: HTTP client for the API, e.g. a DefaultAsyncHttpxClient
+                with a custom transport (defaults to a pooled one from settings)
         """
         self.api_key = api_key or settings.OPENAI_API_KEY
+        self.cache = cache
+        # Confirms a near-duplicate cache hit shows the same card (set by the
+        # extraction service to the local OCR check); near hits are skipped without one
+        self.verify_near_hit: Optional[
+            Callable[[ImageInput, Optional[ImageInput], Dict], Awaitable[bool]]
+        ] = None
+        self._semaphore = asyncio.Semaphore(
+            max_concurrency or settings.VISION_MAX_CONCURRENCY
+        )
+        self.breaker = CircuitBreaker(
+            settings.VISION_BREAKER_FAILURE_THRESHOLD,
+            settings.VISION_BREAKER_RESET_TIMEOUT
+        )
+        self.retry_budget = RetryBudget(
+            settings.VISION_RETRY_BUDGET_RATIO,
+            settings.VISION_RETRY_BUDGET_BURST
+        )
+        self.latency = LatencyTracker(
+            settings.VISION_LATENCY_WINDOW,
+            settings.VISION_HEDGE_MIN_SAMPLES
+        )
+
+        # Metrics
+        self.retries = 0
+        self.retries_over_budget = 0
+        self.hedges = 0
+        self.hedge_wins = 0
         if not self.api_key:
             logger.warning("OpenAI API key not configured - vision service will not work")
             self.client = None
         else:
-            self.client = OpenAI(
+            self.client = AsyncOpenAI(
                 api_key=self.api_key,
-                timeout=settings.VISION_TIMEOUT
+                base_url=base_url or settings.OPENAI_BASE_URL or None,
+                timeout=settings.VISION_TIMEOUT,
+                max_retries=0,  # Retried by _create, which the circuit breaker sees
+                http_client=http_client or DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.VISION_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.VISION_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=settings.VISION_KEEPALIVE_EXPIRY
+                    )
+                )
             )
 
     def is_available(self) -> bool:
         """Check if vision service is available (API key configured)"""
         return self.client is not None
 
+    def retry_after(self) -> Optional[float]:
+        """Seconds until the circuit breaker lets calls through again, or None if it is closed"""
+        return self.breaker.retry_after() if self.is_available() else None
+
+    async def close(self) -> None:
+        """Close the pooled HTTP connections"""
+        if self.client is not None:
+            await self.client.close()
+
     async def extract_card_metadata(
         self,
-        image_path: str
-    ) -> Tuple[Optional[Dict], Optional[str], Optional[str]]:
+        image_path: ImageInput,
+        back_image: Optional[ImageInput] = None
+    ) -> Extraction:
         """
         Extract card metadata from image using GPT-4 Vision
 
+        With a back image, both sides go to the model in one request whose
+        prompt merges the fields printed on each side.
+
         Args:
-            image_path: Absolute path to saved card image
+            image_path: Absolute path to saved card image, or its bytes
+                (remote storage, or the in-memory rendition of a fresh upload)
+            back_image: Path or bytes of the card's back, if it was scanned
 
         Returns:
             Tuple of (metadata_dict, confidence_level, error_message)
             - metadata_dict: Extracted fields or None on failure
             - confidence_level: "high", "medium", "low", or None
-            - error_message: Error description or None on success
+            - error_message: Error description or None on success; while the
+              circuit is open this is returned at once (see retry_after)
         """
         if not self.is_available():
             logger.error("Vision service not available - missing API key")
             return None, None, "Vision service not configured"
 
+        images = [image_path] if back_image is None else [image_path, back_image]
+        prompt = self.SYSTEM_PROMPT if back_image is None else self.FRONT_BACK_PROMPT
+
         try:
-            # Read and encode image
-            image_base64 = self._encode_image(image_path)
+            # Serve rescans of the same card from the cache (keyed by the
+            # front; front/back results are cached under their own prompt)
+            image_hash = None
+            if self.cache is not None:
+                image_hash = await asyncio.to_thread(dhash, image_path)
+                verify = None
+                if self.verify_near_hit is not None:
+                    async def verify(metadata: Dict) -> bool:
+                        return await self.verify_near_hit(image_path, back_image, metadata)
+                cached = await self.cache.get(image_hash, prompt=prompt, verify=verify)
+                if cached:
+                    metadata, confidence = cached
+                    logger.info(
+                        f"Vision cache hit ({image_hash}): "
+                        f"{metadata.get('player_name', 'Unknown')}"
+                    )
+                    return metadata, confidence, None
+
+            # Fail fast while the API is down rather than wait out its timeout
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(self.breaker.retry_after() or 0.0)
+
+            # Shrink to the size the model looks at, then base64-encode
+            encoded = await asyncio.gather(*(
+                asyncio.to_thread(self._encode_image, image) for image in images
+            ))
 
-            # Call OpenAI Vision API
-            response = self.client.chat.completions.create(
+            # Call OpenAI Vision API (retried, hedged and bounded by the semaphore)
+            response = await self._create(dict(
                 model=settings.VISION_MODEL,
                 messages=[
                     {
                         "role": "system",
-                        "content": self.SYSTEM_PROMPT
+                        "content": prompt
                     },
                     {
                         "role": "user",
                         "content": [
                             {
                                 "type": "text",
-                                "text": "Analyze this sports card and extract all visible metadata."
+                                "text": (
+                                    "Analyze this sports card and extract all visible metadata."
+                                    if back_image is None else
+                                    "Analyze the front (first image) and back (second image) "
+                                    "of this sports card and extract all visible metadata."
+                                )
                             },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}",
-                                    "detail": settings.VISION_DETAIL_LEVEL
+                            *(
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{image_base64}",
+                                        "detail": settings.VISION_DETAIL_LEVEL
+                                    }
                                 }
-                            }
+                                for image_base64 in encoded
+                            )
                         ]
                     }
                 ],
                 max_tokens=settings.VISION_MAX_TOKENS,
                 response_format={"type": "json_object"}
-            )
+            ))
 
             # Parse response
             content = response.choices[0].message.content
@@ -136,10 +296,17 @@ Rules:
                     f"{metadata.get('player_name', 'Unknown')}"
                 )
 
+                if image_hash is not None:
+                    await self.cache.put(image_hash, dict(metadata), confidence, prompt=prompt)
+
                 return metadata, confidence, None
             else:
                 return None, None, "Failed to parse Vision API response"
 
+        except CircuitOpenError as e:
+            logger.warning(f"Vision API call skipped: {e}")
+            return None, None, f"Vision API unavailable ({e})"
+
         except APITimeoutError:
             logger.error("Vision API timeout")
             return None, None, "Vision API request timed out"
@@ -152,10 +319,119 @@ Rules:
             logger.exception(f"Unexpected error in vision service: {str(e)}")
             return None, None, f"Unexpected error: {str(e)}"
 
-    def _encode_image(self, image_path: str) -> str:
-        """Encode image to base64 string"""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    async def _create(self, request: Dict[str, Any]) -> ChatCompletion:
+        """
+        Create a chat completion, retrying transient failures
+
+        The first attempt has already been let through by the circuit
+        breaker. A retry waits a jittered, exponentially growing delay (at
+        least what the server asked for), is paid for from the retry budget
+        and must be let through by the breaker again, so retrying stops as
+        soon as the circuit opens.
+
+        Raises:
+            APIError: The last attempt's error, once retrying stops
+            CircuitOpenError: The circuit opened before a retry
+        """
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await self._hedged(request)
+            except APIError as e:
+                if not is_transient(e):
+                    # The API is up; it rejected this request
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= settings.VISION_MAX_RETRIES:
+                    raise
+                if not self.retry_budget.withdraw():
+                    self.retries_over_budget += 1
+                    raise
+                delay = backoff_delay(
+                    attempt,
+                    settings.VISION_RETRY_BASE_DELAY,
+                    settings.VISION_RETRY_MAX_DELAY,
+                    requested_delay(e)
+                )
+                logger.warning(f"Vision API attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+            else:
+                self.breaker.record_success()
+                return response
+
+            await asyncio.sleep(delay)
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(self.breaker.retry_after() or 0.0)
+            attempt += 1
+            self.retries += 1
+
+    async def _hedged(self, request: Dict[str, Any]) -> ChatCompletion:
+        """
+        Send a request; with hedging on, race a second copy once the first
+        has been out longer than VISION_HEDGE_PERCENTILE of recent latencies
+
+        The first successful response wins and the other request is
+        cancelled; if both fail, the first request's error is raised.
+        """
+        hedge_after = None
+        if settings.VISION_HEDGE_ENABLED:
+            hedge_after = self.latency.percentile(settings.VISION_HEDGE_PERCENTILE)
+        if hedge_after is None:
+            return await self._send(request)
+
+        tasks = [asyncio.ensure_future(self._send(request))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            # Only hedge with spare concurrency; otherwise the copy would
+            # just queue behind (and delay) other scans
+            if not done and not self._semaphore.locked():
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(self._send(request)))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is not tasks[0]
+                        return task.result()
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _send(self, request: Dict[str, Any]) -> ChatCompletion:
+        """Make one API call within the concurrency limit, recording its latency"""
+        async with self._semaphore:
+            started = time.monotonic()
+            response = await self.client.chat.completions.create(**request)
+            self.latency.record(time.monotonic() - started)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Circuit breaker state and retry/hedging counters"""
+        p95 = self.latency.percentile(95)
+        return {
+            "available": self.is_available(),
+            "circuit": self.breaker.stats(),
+            "retries": self.retries,
+            "retries_over_budget": self.retries_over_budget,
+            "retry_budget": round(self.retry_budget.tokens, 2),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_latency_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+    def _encode_image(self, image_path: ImageInput) -> str:
+        """Encode image to base64, downscaled for VISION_DETAIL_LEVEL (runs in a thread)"""
+        if isinstance(image_path, bytes):
+            data = image_path
+        else:
+            with open(image_path, "rb") as image_file:
+                data = image_file.read()
+        data = ImageProcessor().prepare_for_vision(data, settings.VISION_DETAIL_LEVEL)
+        return base64.b64encode(data).decode('ascii')
 
     def _parse_vision_response(self, content: str) -> Optional[Dict]:
         """
@@ -194,3 +470,31 @@ Rules:
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse Vision API JSON: {str(e)}")
             return None
+
+
+# Process-wide instance, created in the application lifespan
+_vision_service: Optional[VisionService] = None
+
+
+def init_vision_service() -> VisionService:
+    """Create the shared VisionService (called once at startup)"""
+    global _vision_service
+    if _vision_service is None:
+        cache = None
+        if settings.VISION_CACHE_ENABLED:
+            cache = VisionCache(prompt=VisionService.SYSTEM_PROMPT)
+        _vision_service = VisionService(cache=cache)
+    return _vision_service
+
+
+def get_vision_service() -> VisionService:
+    """Get the shared VisionService, creating it on first use"""
+    return _vision_service or init_vision_service()
+
+
+async def close_vision_service() -> None:
+    """Close the shared VisionService's connection pool (called at shutdown)"""
+    global _vision_service
+    if _vision_service is not None:
+        await _vision_service.close()
+        _vision_service = None
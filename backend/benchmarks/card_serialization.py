@@ -0,0 +1,124 @@
+"""
+Benchmark card listing serialization at 1k, 10k and 100k cards
+
+Compares the previous path (select ORM entities, validate each one against
+the Card response model, json.dumps the encoded result) with the current one
+(select column tuples into plain dicts and render them with orjson). Both
+variants read the same cards from a temporary SQLite database, and the time
+is split into the query and the serialization.
+
+Usage (from backend/):
+    python -m benchmarks.card_serialization [--sizes 1000 10000 100000] [--runs 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+# Point the app at a throwaway database before any app module is imported
+_db_dir = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{_db_dir.name}/bench.db"
+
+from fastapi.responses import JSONResponse as StdlibJSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import delete, select  # noqa: E402
+from app.core.responses import JSONResponse  # noqa: E402
+from app.db.database import SessionLocal, close_db, init_db  # noqa: E402
+from app.db.models import Card as CardModel  # noqa: E402
+from app.models.card import Card as CardSchema  # noqa: E402
+from app.services.card_listing import CARD_COLUMNS  # noqa: E402
+
+SRCSET = {
+    'webp': {'96': '/uploads/a/x_96.webp', '320': '/uploads/a/x_320.webp'},
+    'jpeg': {'96': '/uploads/a/x_96.jpg', '320': '/uploads/a/x_320.jpg'},
+}
+
+_cards_adapter = TypeAdapter(List[CardSchema])
+
+
+async def seed(count: int) -> None:
+    """Replace the cards table with `count` generated cards"""
+    rows = [
+        {
+            'player_name': f'Player {i}',
+            'year': 1980 + i % 40,
+            'brand': ('Topps', 'Fleer', 'Upper Deck', 'Panini')[i % 4],
+            'card_number': str(i % 700),
+            'set_name': f'Series {i % 12}',
+            'sport': ('Baseball', 'Basketball', 'Hockey')[i % 3],
+            'condition': 'Near Mint',
+            'notes': 'Bought at a card show',
+            'image_url': f'/uploads/a/card{i}.jpg',
+            'image_srcset': SRCSET,
+        }
+        for i in range(count)
+    ]
+    async with SessionLocal() as db:
+        await db.execute(delete(CardModel))
+        await db.execute(CardModel.__table__.insert(), rows)
+        await db.commit()
+
+
+async def legacy_path() -> Tuple[float, bytes]:
+    """ORM entities validated through the response model, rendered with json.dumps"""
+    start = time.perf_counter()
+    async with SessionLocal() as db:
+        cards = list((await db.execute(select(CardModel).order_by(CardModel.id))).scalars())
+    queried = time.perf_counter()
+    # What FastAPI does for response_model=List[Card] with the default JSONResponse
+    validated = _cards_adapter.validate_python(cards, from_attributes=True)
+    body = StdlibJSONResponse(_cards_adapter.dump_python(validated, mode='json')).body
+    return queried - start, body
+
+
+async def current_path() -> Tuple[float, bytes]:
+    """Column tuples into plain dicts, rendered with orjson"""
+    start = time.perf_counter()
+    async with SessionLocal() as db:
+        rows = (await db.execute(select(*CARD_COLUMNS).order_by(CardModel.id))).all()
+    queried = time.perf_counter()
+    body = JSONResponse([row._asdict() for row in rows]).body
+    return queried - start, body
+
+
+async def measure(path: Callable, runs: int) -> Tuple[float, float, int]:
+    """Median query and serialization time (s) over `runs`, plus response size"""
+    await path()  # warm up statement caches
+    query_times, serialize_times = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        query_time, body = await path()
+        serialize_times.append(time.perf_counter() - start - query_time)
+        query_times.append(query_time)
+    return statistics.median(query_times), statistics.median(serialize_times), len(body)
+
+
+async def run(sizes: List[int], runs: int) -> None:
+    await init_db()
+    print(f"{'cards':>7} {'path':<8} {'query (ms)':>11} {'serialize (ms)':>15} {'total (ms)':>11} {'body (KB)':>10}")
+    for size in sizes:
+        await seed(size)
+        for name, path in (('legacy', legacy_path), ('current', current_path)):
+            query_time, serialize_time, body_size = await measure(path, runs)
+            print(
+                f"{size:>7} {name:<8} {query_time * 1000:>11.1f} {serialize_time * 1000:>15.1f} "
+                f"{(query_time + serialize_time) * 1000:>11.1f} {body_size / 1024:>10.0f}"
+            )
+    await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Collection sizes to serialize')
+    parser.add_argument('--runs', type=int, default=5, help='Timed runs per size and path')
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.runs))
+    _db_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
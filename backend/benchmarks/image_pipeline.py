@@ -0,0 +1,93 @@
+"""
+Benchmark the scan image pipeline on 12MP phone-sized photos
+
+Compares the previous pipeline (read all bytes, verify(), decode again at
+full resolution, LANCZOS thumbnail, optimized JPEG save) with the current
+single-decode process_upload, which also produces every derivative size and
+format from that one decode. Each variant runs in its own process so peak RSS
+is measured independently; the output column is the full-size JPEG.
+
+Usage (from backend/):
+    python -m benchmarks.image_pipeline [--runs 10]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from io import BytesIO
+from PIL import Image, ImageFilter
+
+PHOTO_SIZE = (4032, 3024)  # 12MP, typical phone camera
+
+
+def make_photo(path: str) -> None:
+    """Write a photo-like 12MP JPEG (smooth gradients plus sensor noise)"""
+    base = Image.linear_gradient('L').resize(PHOTO_SIZE)
+    noise = Image.effect_noise(PHOTO_SIZE, 40).filter(ImageFilter.GaussianBlur(1))
+    img = Image.merge('RGB', (base, noise, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    img.save(path, format='JPEG', quality=92)
+
+
+def legacy_pipeline(path: str) -> int:
+    """The pre-streaming pipeline, reproduced for comparison"""
+    with open(path, 'rb') as f:
+        file_data = f.read()
+    Image.open(BytesIO(file_data)).verify()
+    img = Image.open(BytesIO(file_data))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=85, optimize=True)
+    return output.tell()
+
+
+def current_pipeline(path: str) -> int:
+    from app.services.image_processor import process_upload
+
+    with open(path, 'rb') as f:
+        renditions, error = process_upload(f)
+    if error:
+        raise RuntimeError(f"Processing failed: {error}")
+    return next(len(r.data) for r in renditions if r.name == 'full' and r.format == 'jpeg')
+
+
+def _measure(name: str, path: str, runs: int, queue) -> None:
+    # Import app code in both variants so the RSS baseline is the same
+    import app.services.image_processor  # noqa: F401
+
+    pipeline = legacy_pipeline if name == 'legacy' else current_pipeline
+    pipeline(path)  # warm up imports and codecs
+    start = time.process_time()
+    for _ in range(runs):
+        size = pipeline(path)
+    cpu = (time.process_time() - start) / runs
+    # ru_maxrss is in KB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((name, cpu, peak_rss_mb, size))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10, help='Scans per variant')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as photo:
+        make_photo(photo.name)
+        size_mb = os.path.getsize(photo.name) / 1e6
+        print(f"Input: {PHOTO_SIZE[0]}x{PHOTO_SIZE[1]} JPEG, {size_mb:.1f}MB, {args.runs} runs\n")
+        print(f"{'pipeline':<10} {'cpu/scan (ms)':>14} {'peak RSS (MB)':>14} {'output (KB)':>12}")
+        for name in ('legacy', 'current'):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_measure, args=(name, photo.name, args.runs, queue))
+            proc.start()
+            name, cpu, rss, size = queue.get()
+            proc.join()
+            print(f"{name:<10} {cpu * 1000:>14.1f} {rss:>14.1f} {size / 1024:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Shared fixtures
+
+Tests run against a throwaway SQLite database and upload directory; the
+settings are pointed at them before the app is imported. Async tests use the
+anyio pytest plugin (anyio is installed with httpx and Starlette).
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="card_collx_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ["IMAGE_EXECUTOR"] = "thread"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from app.db.database import Base, engine, init_db  # noqa: E402
+from app.db.fts import FTS_TABLE  # noqa: E402
+from app.db.writer import db_writer  # noqa: E402
+from app.services import catalog, vision_service  # noqa: E402
+from app.services.job_queue import job_queue  # noqa: E402
+from fake_openai import FakeOpenAI  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db_tables():
+    """Fresh, empty tables for one test"""
+    async with engine.begin() as conn:
+        # The FTS index is not in the metadata, and would outlive the cards it indexes
+        await conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+        await conn.run_sync(Base.metadata.drop_all)
+    await init_db()
+    yield
+    await engine.dispose()
+
+
+@pytest.fixture
+def fake_openai() -> FakeOpenAI:
+    """The vision API seen by the app started by `client`"""
+    return FakeOpenAI()
+
+
+@pytest.fixture
+async def client(db_tables, fake_openai, monkeypatch):
+    """HTTP client for the app, run through its lifespan with the vision API faked"""
+    from app.main import app, lifespan
+
+    for name in os.listdir(settings.UPLOAD_DIR):
+        shutil.rmtree(os.path.join(settings.UPLOAD_DIR, name))
+    # Each test runs on its own event loop; the process-wide queues must too
+    monkeypatch.setattr(db_writer, "_queue", asyncio.Queue())
+    monkeypatch.setattr(job_queue, "_queue", asyncio.Queue())
+    monkeypatch.setattr(catalog, "_lock", asyncio.Lock())
+    # Picked up by init_vision_service instead of a real client
+    monkeypatch.setattr(vision_service, "_vision_service", vision_service.VisionService(
+        api_key="sk-test",
+        base_url="http://openai.test/v1",
+        cache=vision_service.VisionCache(prompt=vision_service.VisionService.SYSTEM_PROMPT),
+        http_client=fake_openai.http_client()
+    ))
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            yield http
+
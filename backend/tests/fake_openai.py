@@ -0,0 +1,76 @@
+"""
+Fake OpenAI-compatible chat completions endpoint for tests
+
+Mounted as an httpx MockTransport behind the SDK's DefaultAsyncHttpxClient,
+so VisionService runs unchanged without network access.
+"""
+import asyncio
+import io
+import json
+
+import httpx
+from openai import DefaultAsyncHttpxClient
+from PIL import Image
+
+from app.core.config import settings
+
+METADATA = {"player_name": "Ken Griffey Jr.", "year": 1989, "brand": "Upper Deck", "confidence": "high"}
+
+
+def card_image(color="white", size=(60, 84)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def completion(metadata: dict) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": settings.VISION_MODEL,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(metadata)},
+            "finish_reason": "stop",
+        }],
+    }
+
+
+class FakeOpenAI:
+    """
+    Chat completions endpoint answering from a script
+
+    Each call pops the next (status, delay) from `replies`, falling back to
+    `default` once the script runs out; successful replies carry `metadata`.
+    Request bodies are kept in `requests`, and `peak_in_flight` records the
+    most calls served at once.
+    """
+
+    def __init__(self, *replies, default=(200, 0.0), metadata=None):
+        self.replies = list(replies)
+        self.default = default
+        self.metadata = dict(metadata or METADATA)
+        self.calls = 0
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path.endswith("/chat/completions")
+        self.calls += 1
+        self.requests.append(json.loads(request.content))
+        status, delay = self.replies.pop(0) if self.replies else self.default
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+        if status != 200:
+            return httpx.Response(status, json={"error": {"message": f"status {status}"}})
+        return httpx.Response(200, json=completion(self.metadata))
+
+    def http_client(self) -> httpx.AsyncClient:
+        return DefaultAsyncHttpxClient(transport=httpx.MockTransport(self))
@@ -0,0 +1,42 @@
+import asyncio
+import os
+from typing import List
+
+import httpx
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Card, ImageBlob
+
+
+async def wait_for_job(client: httpx.AsyncClient, job_id: str, timeout: float = 10.0) -> dict:
+    """Poll a job until it finishes; returns its status body"""
+    async with asyncio.timeout(timeout):
+        while True:
+            status = (await client.get(f"/api/jobs/{job_id}")).json()
+            if status["status"] in ("succeeded", "failed"):
+                return status
+            await asyncio.sleep(0.05)
+
+
+async def scan(client: httpx.AsyncClient, image: bytes) -> dict:
+    """Scan an image and wait for its job; returns the job status"""
+    response = await client.post("/api/cards/scan", files={"file": ("card.jpg", image, "image/jpeg")})
+    assert response.status_code == 202
+    return await wait_for_job(client, response.json()["job_id"])
+
+
+def stored_path(url: str) -> str:
+    """Filesystem path of a local /uploads/ URL"""
+    return os.path.join(settings.UPLOAD_DIR, url.split("/uploads/", 1)[1])
+
+
+async def blob_refcounts() -> List[int]:
+    async with SessionLocal() as db:
+        return sorted((await db.execute(select(ImageBlob.refcount))).scalars())
+
+
+async def card_count() -> int:
+    async with SessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(Card))
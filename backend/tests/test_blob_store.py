@@ -0,0 +1,91 @@
+import os
+from typing import List
+
+import pytest
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ImageBlob
+from app.services.blob_store import blob_key, hash_upload
+from app.services.image_service import ImageService
+from fake_openai import card_image
+from helpers import blob_refcounts, scan, stored_path
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    """Treat files as old enough to delete as soon as they are written"""
+    monkeypatch.setattr(settings, "BLOB_ORPHAN_GRACE_SECONDS", 0)
+
+
+def image_urls(card: dict) -> List[str]:
+    urls = {url for by_width in card["image_srcset"].values() for url in by_width.values()}
+    return sorted(urls - {card["image_url"]}) + [card["image_url"]]
+
+
+def blob_files(content_hash: str) -> List[str]:
+    directory = os.path.join(settings.UPLOAD_DIR, blob_key(content_hash))
+    if not os.path.isdir(directory):
+        return []
+    return [name for name in os.listdir(directory) if name.startswith(content_hash)]
+
+
+async def get_card(client, card_id: int) -> dict:
+    return (await client.get(f"/api/cards/{card_id}")).json()
+
+
+async def test_duplicate_scans_share_files_until_last_card_is_deleted(no_grace, client):
+    image = card_image("green")
+    first, second = await scan(client, image), await scan(client, image)
+    card = await get_card(client, first["card_id"])
+    assert (await get_card(client, second["card_id"]))["image_url"] == card["image_url"]
+    assert await blob_refcounts() == [2]
+
+    await client.delete(f"/api/cards/{first['card_id']}")
+    assert await blob_refcounts() == [1]
+    assert all(os.path.exists(stored_path(url)) for url in image_urls(card))
+
+    await client.delete(f"/api/cards/{second['card_id']}")
+    assert await blob_refcounts() == []
+    assert not any(os.path.exists(stored_path(url)) for url in image_urls(card))
+
+
+async def test_released_files_are_kept_when_the_blob_is_stored_again(client, monkeypatch):
+    card = await get_card(client, (await scan(client, card_image("orange")))["card_id"])
+    urls = image_urls(card)
+
+    # Row re-inserted by a concurrent upload of the same bytes
+    await ImageService().delete_files(urls)
+    assert all(os.path.exists(stored_path(url)) for url in urls)
+
+    # Row gone, but the files were just (re)written by an upload that has not committed
+    async with SessionLocal() as db:
+        await db.execute(delete(ImageBlob))
+        await db.commit()
+    await ImageService().delete_files(urls)
+    assert all(os.path.exists(stored_path(url)) for url in urls)
+
+    monkeypatch.setattr(settings, "BLOB_ORPHAN_GRACE_SECONDS", 0)
+    await ImageService().delete_files(urls)
+    assert not any(os.path.exists(stored_path(url)) for url in urls)
+
+
+async def test_sweep_deletes_only_unreferenced_files(client):
+    kept = await get_card(client, (await scan(client, card_image("purple")))["card_id"])
+
+    # Renditions of a scan whose transaction rolled back: written, never referenced
+    image = card_image("yellow")
+    orphan_hash = hash_upload(image)
+    await ImageService().save_image(image, orphan_hash)
+    written = len(blob_files(orphan_hash))
+    assert written > 0
+
+    assert await ImageService().sweep_orphans() == 0  # Still within the grace period
+    assert await ImageService().sweep_orphans(grace_seconds=0) == written
+
+    assert blob_files(orphan_hash) == []
+    assert all(os.path.exists(stored_path(url)) for url in image_urls(kept))
+    assert await blob_refcounts() == [1]
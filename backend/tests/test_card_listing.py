@@ -0,0 +1,68 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+CARDS = """player_name,year,brand,set_name,sport
+Ken Griffey Jr.,1989,Upper Deck,Upper Deck,Baseball
+Ken Griffey Sr.,1975,Topps,Topps,Baseball
+Frank Thomas,1990,Topps,Topps,Baseball
+Michael Jordan,1986,Fleer,Fleer,Basketball
+Kenny Lofton,1992,Topps,Stadium Club,Baseball
+Ken% Literal,1990,Topps,Topps,Baseball
+Derek Jeter,1993,SP,SP,Baseball
+"""
+
+
+@pytest.fixture
+async def cards(client):
+    response = await client.post("/api/cards/import", files={"file": ("cards.csv", CARDS.encode(), "text/csv")})
+    assert response.json()["created"] == 7
+    # Created after the import, so it sorts first
+    await client.post("/api/cards", json={"player_name": "Newest Card", "year": 2024, "sport": "Baseball"})
+
+
+async def all_pages(client, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        body = (await client.get("/api/cards", params={**params, **({"cursor": cursor} if cursor else {})})).json()
+        pages.append(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+async def test_pages_walk_the_collection_newest_first(client, cards):
+    pages = await all_pages(client, limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 2]
+    ids = [card["id"] for page in pages for card in page]
+    assert len(set(ids)) == 8
+    assert pages[0][0]["player_name"] == "Newest Card"
+    # Cards created in the same instant are ordered by id, newest first
+    assert ids[1:] == sorted(ids[1:], reverse=True)
+
+
+async def test_filters_combine_across_pages(client, cards):
+    pages = await all_pages(client, limit=1, sport="Baseball", year_min=1989, year_max=1992, brand="Topps")
+    assert sorted(card["player_name"] for page in pages for card in page) == [
+        "Frank Thomas", "Ken% Literal", "Kenny Lofton"
+    ]
+
+    pages = await all_pages(client, limit=2, player_name="Ken ")
+    assert sorted(card["player_name"] for page in pages for card in page) == ["Ken Griffey Jr.", "Ken Griffey Sr."]
+
+    # LIKE wildcards in the prefix match literally
+    pages = await all_pages(client, player_name="Ken%")
+    assert [card["player_name"] for page in pages for card in page] == ["Ken% Literal"]
+
+
+async def test_fields_limit_the_returned_columns(client, cards):
+    body = (await client.get("/api/cards", params={"limit": 2, "fields": "player_name,year"})).json()
+
+    assert [list(card) for card in body["items"]] == [["player_name", "year"]] * 2
+    assert body["next_cursor"]
+
+
+async def test_bad_parameters_are_rejected(client, cards):
+    assert (await client.get("/api/cards", params={"cursor": "not-a-cursor"})).status_code == 400
+    assert (await client.get("/api/cards", params={"fields": "player_name,secret"})).status_code == 400
@@ -0,0 +1,60 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_card(client, **fields) -> int:
+    response = await client.post("/api/cards", json={"sport": "Baseball", **fields})
+    return response.json()["id"]
+
+
+async def search(client, q: str, **params) -> dict:
+    response = await client.get("/api/cards/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def names(results: dict) -> list:
+    return [card["player_name"] for card in results["items"]]
+
+
+async def test_terms_match_as_prefixes_in_any_order(client):
+    await add_card(client, player_name="Ken Griffey Jr.", brand="Upper Deck", card_number="1")
+    await add_card(client, player_name="Ken Caminiti", brand="Topps")
+
+    assert names(await search(client, "grif ken")) == ["Ken Griffey Jr."]
+    assert sorted(names(await search(client, "ken"))) == ["Ken Caminiti", "Ken Griffey Jr."]
+    assert names(await search(client, "upper ken")) == ["Ken Griffey Jr."]
+    # FTS operators in the query are treated as plain text
+    assert names(await search(client, 'grif* "ken-')) == ["Ken Griffey Jr."]
+    assert names(await search(client, "***")) == []
+
+
+async def test_player_name_matches_rank_above_notes(client):
+    await add_card(client, player_name="Frank Thomas", notes="Traded for a Jeter rookie")
+    await add_card(client, player_name="Derek Jeter")
+
+    assert names(await search(client, "jeter")) == ["Derek Jeter", "Frank Thomas"]
+
+
+async def test_index_follows_updates_and_deletes(client):
+    card_id = await add_card(client, player_name="Mike Trout")
+    await client.put(f"/api/cards/{card_id}", json={"player_name": "Shohei Ohtani"})
+
+    assert names(await search(client, "trout")) == []
+    assert names(await search(client, "ohtani")) == ["Shohei Ohtani"]
+
+    await client.delete(f"/api/cards/{card_id}")
+    assert names(await search(client, "ohtani")) == []
+
+
+async def test_results_page_by_offset(client):
+    for number in range(5):
+        await add_card(client, player_name=f"Cal Ripken {number}")
+
+    first = await search(client, "ripken", limit=3)
+    second = await search(client, "ripken", limit=3, offset=first["next_offset"])
+
+    assert (len(first["items"]), first["next_offset"]) == (3, 3)
+    assert (len(second["items"]), second["next_offset"]) == (2, None)
+    assert len(set(names(first) + names(second))) == 5
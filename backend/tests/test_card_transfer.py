@@ -0,0 +1,98 @@
+import asyncio
+import csv
+import io
+import json
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.models.card import CardCreate
+from app.services import card_transfer
+
+pytestmark = pytest.mark.anyio
+
+CSV_IMPORT = """player_name,year,brand,card_number,sport
+Ken Griffey Jr.,1989,Upper Deck,1,Baseball
+,1990,Topps,2,Baseball
+Frank Thomas,1990,Topps,414,Baseball
+Michael Jordan,not a year,Fleer,57,Basketball
+Derek Jeter,1993,SP,279,Baseball
+"""
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """Import and export a few rows at a time, so every test crosses batch boundaries"""
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 2)
+
+
+async def test_import_creates_valid_rows_and_reports_invalid_ones(small_batches, client):
+    response = await client.post(
+        "/api/cards/import", files={"file": ("cards.csv", CSV_IMPORT.encode(), "text/csv")}
+    )
+
+    summary = response.json()
+    assert (summary["total"], summary["created"], summary["failed"]) == (5, 3, 2)
+    assert [(error["row"], error["errors"][0]["field"]) for error in summary["errors"]] == [
+        (2, "player_name"), (4, "year")
+    ]
+    stats = (await client.get("/api/cards/stats")).json()
+    assert stats["total_cards"] == 3
+
+
+async def test_export_streams_every_card_in_order(small_batches, client):
+    await client.post("/api/cards/import", files={"file": ("cards.csv", CSV_IMPORT.encode(), "text/csv")})
+
+    exported = (await client.get("/api/cards/export", params={"format": "csv"})).text
+    rows = list(csv.DictReader(io.StringIO(exported)))
+    assert [row["player_name"] for row in rows] == ["Ken Griffey Jr.", "Frank Thomas", "Derek Jeter"]
+    assert list(rows[0]) == card_transfer.EXPORT_FIELDS
+
+    lines = (await client.get("/api/cards/export", params={"format": "ndjson"})).text.splitlines()
+    assert [json.loads(line)["card_number"] for line in lines] == ["1", "414", "279"]
+
+
+async def test_exported_ndjson_imports_back(small_batches, client):
+    await client.post("/api/cards/import", files={"file": ("cards.csv", CSV_IMPORT.encode(), "text/csv")})
+    exported = (await client.get("/api/cards/export", params={"format": "ndjson"})).content
+
+    response = await client.post(
+        "/api/cards/import", files={"file": ("cards.ndjson", exported, "application/x-ndjson")}
+    )
+
+    assert response.json()["created"] == 3
+    assert (await client.get("/api/cards/stats")).json()["total_cards"] == 6
+
+
+async def test_failed_import_stops_reading_the_upload(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 50)
+    read = []
+
+    def rows(upload, fields):
+        for number in range(1000):
+            time.sleep(0.002)
+            read.append(number)
+            yield {"player_name": f"Player {number}"}
+
+    def insert_batch(rows):
+        async def insert(session):
+            await asyncio.sleep(0.01)  # The next batch is being read meanwhile
+            raise RuntimeError("disk full")
+        return insert
+
+    async def write(db, op):
+        return await op(db)
+
+    monkeypatch.setitem(card_transfer.ROW_READERS, "csv", rows)
+    monkeypatch.setattr(card_transfer, "write", write)
+
+    with pytest.raises(RuntimeError):
+        await card_transfer.import_rows(None, io.BytesIO(), "csv", CardCreate, insert_batch, "cards")
+
+    # The batch being read ahead is abandoned before import_rows returns
+    stopped_at = len(read)
+    await asyncio.sleep(0.1)
+    assert len(read) == stopped_at
+    assert stopped_at < 2 * settings.IMPORT_BATCH_SIZE
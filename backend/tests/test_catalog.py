@@ -0,0 +1,44 @@
+import pytest
+
+from app.db.database import SessionLocal
+from app.services import catalog
+
+pytestmark = pytest.mark.anyio
+
+
+def entry(player_name, card_number="1"):
+    return {
+        "player_name": player_name,
+        "year": 1989,
+        "brand": "Upper Deck",
+        "set_name": None,
+        "card_number": card_number,
+        "sport": "Baseball",
+    }
+
+
+async def upsert(rows):
+    async with SessionLocal() as db:
+        count = await catalog._upsert_batch(rows)(db)
+        await db.commit()
+    return count
+
+
+async def test_upsert_counts_rows_written_once(db_tables):
+    # The second row has the same checklist key and replaces the first
+    assert await upsert([entry("Ken Grifey Jr."), entry("Ken Griffey Jr."), entry("Randy Johnson", "25")]) == 2
+
+
+async def test_index_reloads_after_update_within_the_same_second(db_tables, monkeypatch):
+    await upsert([entry("Ken Grifey Jr.")])
+    index = await catalog.load_catalog()
+    assert index.lookup("1", 1989, "Upper Deck")[0].player_name == "Ken Grifey Jr."
+
+    # A corrected re-import leaves the row count (and, within a second, the
+    # updated_at maximum) unchanged
+    await upsert([entry("Ken Griffey Jr.")])
+    monkeypatch.setattr(catalog, "_checked_at", 0.0)
+    index = await catalog.get_catalog()
+
+    assert index.version == 2
+    assert index.lookup("1", 1989, "Upper Deck")[0].player_name == "Ken Griffey Jr."
@@ -0,0 +1,53 @@
+import pytest
+
+from app.services import collection_stats
+
+pytestmark = pytest.mark.anyio
+
+IMPORT = """player_name,year,brand,sport
+Michael Jordan,1986,Fleer,Basketball
+Scottie Pippen,1988,Fleer,Basketball
+"""
+
+
+async def add_card(client, **fields) -> int:
+    return (await client.post("/api/cards", json=fields)).json()["id"]
+
+
+async def get_stats(client) -> dict:
+    return (await client.get("/api/cards/stats")).json()
+
+
+def counts(buckets: list) -> dict:
+    return {bucket["value"]: bucket["card_count"] for bucket in buckets}
+
+
+async def test_stats_follow_every_card_write(client):
+    griffey = await add_card(client, player_name="Ken Griffey Jr.", year=1989, brand="Upper Deck", sport="Baseball")
+    thomas = await add_card(client, player_name="Frank Thomas", year=1990, brand="Topps", sport="Baseball")
+    await add_card(client, player_name="Unsorted")
+    response = await client.put(
+        f"/api/cards/{thomas}",
+        json={"player_name": "Frank Thomas", "year": 1989, "brand": "Topps", "sport": "Football"}
+    )
+    assert response.status_code == 200
+    await client.delete(f"/api/cards/{griffey}")
+    await client.post("/api/cards/import", files={"file": ("cards.csv", IMPORT.encode(), "text/csv")})
+
+    stats = await get_stats(client)
+
+    assert (stats["total_cards"], stats["priced_cards"], stats["total_value"]) == (4, 0, 0.0)
+    assert counts(stats["by_sport"]) == {"Basketball": 2, "Football": 1, None: 1}
+    assert counts(stats["by_year"]) == {"1986": 1, "1988": 1, "1989": 1, None: 1}
+    assert counts(stats["by_brand"]) == {"Fleer": 2, "Topps": 1, None: 1}
+    # Largest bucket first
+    assert stats["by_sport"][0]["value"] == "Basketball"
+
+
+async def test_rebuild_reproduces_the_incremental_totals(client):
+    await add_card(client, player_name="Derek Jeter", year=1993, brand="SP", sport="Baseball")
+    await client.post("/api/cards/import", files={"file": ("cards.csv", IMPORT.encode(), "text/csv")})
+    incremental = await get_stats(client)
+
+    assert await collection_stats.rebuild() == 3
+    assert await get_stats(client) == incremental
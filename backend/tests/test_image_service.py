@@ -0,0 +1,46 @@
+import io
+import os
+
+import pytest
+from starlette.datastructures import Headers, UploadFile
+
+from app.services import image_service as image_service_module
+from app.services.image_executor import EXECUTOR_PROCESS, ImageExecutor
+from app.services.image_service import ImageService
+from fake_openai import card_image
+from helpers import stored_path
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_process_executor_gets_large_uploads_as_a_temp_file(db_tables, monkeypatch):
+    copies = []
+    copy = image_service_module.copy_to_temp_file
+
+    def copy_to_temp_file(source):
+        copies.append(copy(source))
+        return copies[-1]
+
+    monkeypatch.setattr(image_service_module, "INLINE_UPLOAD_SIZE", 0)
+    monkeypatch.setattr(image_service_module, "copy_to_temp_file", copy_to_temp_file)
+
+    class ChunkedOnly(io.BytesIO):
+        def read(self, size=-1):
+            assert size > 0, "upload read into memory in one piece"
+            return super().read(size)
+
+    data = card_image("navy", size=(300, 420))
+    upload = UploadFile(
+        ChunkedOnly(data), size=len(data), filename="card.jpg",
+        headers=Headers({"content-type": "image/jpeg"})
+    )
+    executor = ImageExecutor(EXECUTOR_PROCESS, max_workers=1)
+    executor.start()
+    try:
+        stored = await ImageService(executor=executor).save_card_image(upload)
+    finally:
+        await executor.shutdown()
+
+    assert len(copies) == 1 and not os.path.exists(copies[0])
+    assert os.path.exists(stored_path(stored.image_url))
+    assert stored.vision_image
@@ -0,0 +1,126 @@
+"""
+Job leases: a second JobQueue in the same event loop plays another process
+sharing the database
+"""
+import asyncio
+import json
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Job
+from app.db.writer import write
+from app.services.job_queue import JOB_RUNNING, JobQueue, _now, job_queue
+
+pytestmark = pytest.mark.anyio
+
+KIND = "test"
+
+
+@pytest.fixture
+def short_leases(monkeypatch):
+    """Leases expire (and the reaper runs) every 0.3s"""
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.3)
+
+
+async def add_job(**values) -> str:
+    async def add(session):
+        job = job_queue.create_job(session, KIND, payload={})
+        for name, value in values.items():
+            setattr(job, name, value)
+        return job.id
+
+    async with SessionLocal() as db:
+        return await write(db, add)
+
+
+async def get_job(job_id: str) -> Job:
+    async with SessionLocal() as db:
+        return await db.get(Job, job_id)
+
+
+async def wait_until_finished(job_id: str, timeout: float = 5.0) -> Job:
+    async with asyncio.timeout(timeout):
+        while (job := await get_job(job_id)).status in ("queued", "running"):
+            await asyncio.sleep(0.02)
+    return job
+
+
+async def test_reaper_takes_over_a_job_whose_lease_expired(short_leases, client, monkeypatch):
+    async def handler(job, db):
+        return {"ran_by": "this process"}
+
+    monkeypatch.setitem(job_queue._handlers, KIND, handler)
+    # Claimed by a process that died without finishing it
+    job_id = await add_job(
+        status=JOB_RUNNING, attempts=1, lease_owner="dead-process",
+        lease_expires_at=_now() - timedelta(seconds=1)
+    )
+
+    job = await wait_until_finished(job_id)
+
+    assert (job.status, job.attempts, job.lease_owner) == ("succeeded", 2, None)
+    assert json.loads(job.result) == {"ran_by": "this process"}
+
+
+async def test_heartbeat_keeps_a_long_job_from_being_taken_over(short_leases, client, monkeypatch):
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    async def handler(job, db):
+        started.set()
+        await finish.wait()
+        return {"ran_by": "first"}
+
+    monkeypatch.setitem(job_queue._handlers, KIND, handler)
+    job_id = await add_job()
+    job_queue.enqueue(job_id)
+    await started.wait()
+
+    # Well past the original lease; the renewed one still holds
+    await asyncio.sleep(1.0)
+    other = JobQueue()
+    other.register(KIND, handler)
+    await other._run(job_id)
+    assert (await get_job(job_id)).lease_owner == job_queue.owner
+
+    finish.set()
+    job = await wait_until_finished(job_id)
+    assert (job.status, job.attempts, json.loads(job.result)) == ("succeeded", 1, {"ran_by": "first"})
+
+
+async def test_worker_that_lost_its_lease_writes_nothing(client, monkeypatch):
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    async def stalled(job, db):
+        started.set()
+        await finish.wait()
+        return {"ran_by": "stalled"}
+
+    async def healthy(job, db):
+        return {"ran_by": "new owner"}
+
+    monkeypatch.setitem(job_queue._handlers, KIND, stalled)
+    job_id = await add_job()
+    job_queue.enqueue(job_id)
+    await started.wait()
+
+    # The stalled worker's lease runs out and another process takes the job
+    async def expire(session):
+        await session.execute(
+            update(Job).where(Job.id == job_id).values(lease_expires_at=_now() - timedelta(seconds=1))
+        )
+
+    async with SessionLocal() as db:
+        await write(db, expire)
+    other = JobQueue()
+    other.register(KIND, healthy)
+    await other._run(job_id)
+
+    finish.set()
+    async with asyncio.timeout(5):
+        await job_queue._queue.join()  # The stalled worker has finished
+    job = await get_job(job_id)
+    assert (job.status, job.attempts, json.loads(job.result)) == ("succeeded", 2, {"ran_by": "new owner"})
@@ -0,0 +1,39 @@
+import tempfile
+from io import BytesIO
+
+import pytest
+
+from app.services.storage.local import LocalStorageBackend
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_save_recreates_directory_pruned_by_concurrent_delete(tmp_path, monkeypatch):
+    storage = LocalStorageBackend(str(tmp_path))
+    mkstemp = tempfile.mkstemp
+    calls = []
+
+    def pruned_once(dir, prefix):
+        # Another thread deleted the shard's last file and removed the directory
+        calls.append(dir)
+        if len(calls) == 1:
+            storage._delete(dir / "sibling.jpg")
+        return mkstemp(dir=dir, prefix=prefix)
+
+    (tmp_path / "blobs" / "ab" / "cd").mkdir(parents=True)
+    (tmp_path / "blobs" / "ab" / "cd" / "sibling.jpg").write_bytes(b"old")
+    monkeypatch.setattr(tempfile, "mkstemp", pruned_once)
+
+    path = await storage.save(BytesIO(b"new"), "abcd.jpg", "blobs/ab/cd")
+
+    assert len(calls) == 2
+    assert (tmp_path / path).read_bytes() == b"new"
+
+
+async def test_delete_prunes_empty_shard_directories(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path))
+    path = await storage.save(BytesIO(b"data"), "front.jpg", 42)
+
+    assert await storage.delete(path)
+    assert not await storage.delete(path)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,45 @@
+from app.services.catalog import NameIndex
+from app.services.ocr_extractor import parse_card_text
+
+PLAYERS = NameIndex(["Ken Griffey Jr.", "Frank Thomas", "Derek Jeter"])
+
+
+def test_front_and_back_text_yield_every_field():
+    lines = [
+        "UPPER DECK",
+        "KEN GRIFFEY JR.",
+        "OUTFIELD  SEATTLE MARINERS",
+        "Card No. 1",
+        "1987 SAN BERNARDINO  .338  1988 VERMONT  .279",
+        "© 1989 The Upper Deck Company. MLB baseball",
+    ]
+
+    fields, confidence = parse_card_text(lines, [PLAYERS])
+
+    assert fields["player_name"] == "Ken Griffey Jr."
+    # The copyright year wins over the stat lines' seasons
+    assert fields["year"] == 1989
+    assert (fields["brand"], fields["card_number"], fields["sport"]) == ("Upper Deck", "1", "Baseball")
+    assert confidence == "high"
+
+
+def test_misread_names_match_the_closest_known_player():
+    fields, _ = parse_card_text(["FRANK THOMA5", "#414"], [PLAYERS])
+
+    assert (fields["player_name"], fields["card_number"]) == ("Frank Thomas", "414")
+
+
+def test_unknown_names_are_guessed_from_name_like_lines():
+    lines = ["ROOKIE CARD", "Topps", "JOHNNY UNKNOWN", "Shortstop"]
+
+    fields, confidence = parse_card_text(lines, [PLAYERS])
+
+    assert (fields["player_name"], fields["brand"]) == ("Johnny Unknown", "Topps")
+    assert confidence == "medium"
+
+
+def test_ambiguous_years_and_sports_are_left_unset():
+    fields, confidence = parse_card_text(["1990 1991 football baseball"], ())
+
+    assert (fields["year"], fields["sport"], fields["player_name"]) == (None, None, None)
+    assert confidence == "low"
@@ -0,0 +1,186 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import update
+
+from app.db.database import SessionLocal
+from app.db.models import MarketPrice
+from app.db.writer import db_writer
+from app.services.pricing import (
+    PriceKey,
+    PriceLookupError,
+    PriceQuote,
+    PricingService,
+    SoldListingsPriceSource,
+    SummaryPriceSource,
+)
+from app.services.pricing import service as pricing_module
+from app.services.pricing.service import aggregate_quotes, build_sources
+
+pytestmark = pytest.mark.anyio
+
+KEY = PriceKey("ken griffey jr", 1989, "upper deck", "1", "")
+
+SOURCES = ["summary=http://summary.test/price", "sold_listings=http://sold.test/sales"]
+
+
+def market(summary=None, sold=None, calls=None, gate=None):
+    """MockTransport answering for both test sources"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if calls is not None:
+            calls.append(host)
+        if gate is not None:
+            await gate.wait()
+        reply = summary if host == "summary.test" else sold
+        if isinstance(reply, int):
+            return httpx.Response(reply)
+        return httpx.Response(200, json=reply)
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def service(client, currency="USD"):
+    return PricingService(sources=build_sources(SOURCES, client, currency), currency=currency)
+
+
+def test_build_sources():
+    client = httpx.AsyncClient()
+    sources = build_sources(SOURCES, client, "EUR")
+
+    assert [type(source) for source in sources] == [SummaryPriceSource, SoldListingsPriceSource]
+    assert [source.name for source in sources] == ["summary@summary.test", "sold_listings@sold.test"]
+    assert all(source.currency == "EUR" and source.client is client for source in sources)
+
+    for entry in ("summary", "bogus=http://x.test", "=http://x.test"):
+        with pytest.raises(ValueError):
+            build_sources([entry], client)
+
+
+def test_aggregate_quotes_weights_by_sample_size():
+    result = aggregate_quotes([
+        PriceQuote(source="b", average_price=10.0, low_price=5.0, high_price=12.0, sample_size=3),
+        PriceQuote(source="a", average_price=20.0, sample_size=1),
+    ])
+
+    assert result == {
+        "average_price": 12.5,
+        "low_price": 5.0,
+        "high_price": 20.0,
+        "sample_size": 4,
+        "sources": ["a", "b"],
+    }
+
+
+async def test_sold_listings_drops_other_currencies():
+    items = [{"price": price} for price in (10, 11, 12)] + [
+        {"price": 500, "currency": "JPY"},
+        {"price": 13, "currency": "USD"},
+    ]
+    async with market(summary=404, sold={"items": items}) as client:
+        summary, sold = build_sources(SOURCES, client)
+        assert await summary.fetch(KEY) is None
+        quote = await sold.fetch(KEY)
+
+    assert quote.currency == "USD"
+    assert quote.sample_size == 4
+    assert quote.average_price == 11.5
+    assert (quote.low_price, quote.high_price) == (10.0, 13.0)
+
+
+async def test_sold_listings_trims_outliers():
+    prices = [1] + [10] * 8 + [1000]
+    async with market(sold={"items": [{"price": price} for price in prices]}) as client:
+        quote = await build_sources(SOURCES[1:], client)[0].fetch(KEY)
+
+    assert quote.sample_size == 8
+    assert quote.average_price == 10.0
+
+
+async def test_get_price_fetches_once_for_concurrent_lookups(db_tables):
+    calls, gate = [], asyncio.Event()
+    summary = {"average": 30.0, "low": 20.0, "high": 40.0, "count": 2, "currency": "USD"}
+    async with market(summary=summary, sold={"items": [{"price": 15.0}]}, calls=calls, gate=gate) as client:
+        pricing = service(client)
+        lookups = [asyncio.ensure_future(pricing.get_price(KEY)) for _ in range(5)]
+        await asyncio.sleep(0.1)
+        gate.set()
+        prices = await asyncio.gather(*lookups)
+
+        assert sorted(calls) == ["sold.test", "summary.test"]
+        assert pricing.fetches == 1
+        assert pricing.coalesced == 4
+        assert {price.average_price for price in prices} == {25.0}
+        assert prices[0].sources == ["sold_listings@sold.test", "summary@summary.test"]
+
+        # Stored and served while fresh
+        stored = await pricing.get_price(KEY)
+        assert stored.average_price == 25.0
+        assert pricing.hits == 1
+        assert len(calls) == 2
+
+
+async def test_get_price_ignores_quotes_in_other_currencies(db_tables):
+    summary = {"average": 3000.0, "count": 1, "currency": "JPY"}
+    async with market(summary=summary, sold={"items": [{"price": 15.0, "currency": "USD"}]}) as client:
+        price = await service(client).get_price(KEY)
+
+    assert price.average_price == 15.0
+    assert price.sources == ["sold_listings@sold.test"]
+
+
+async def test_get_price_serves_stale_price_when_sources_fail(db_tables):
+    async with market(summary={"average": 12.0, "currency": "USD"}, sold={"items": []}) as client:
+        assert (await service(client).get_price(KEY)).average_price == 12.0
+
+    async with SessionLocal() as db:
+        await db.execute(
+            update(MarketPrice)
+            .where(MarketPrice.price_key == KEY.digest)
+            .values(expires_at=datetime.now(timezone.utc) - timedelta(hours=1))
+        )
+        await db.commit()
+
+    async with market(summary=503, sold=500) as client:
+        pricing = service(client)
+        price = await pricing.get_price(KEY)
+
+        assert price.average_price == 12.0
+        assert pricing.source_errors == 2
+
+        other = PriceKey("nolan ryan", 1990, "topps", "1", "")
+        with pytest.raises(PriceLookupError):
+            await pricing.get_price(other)
+
+
+async def test_get_price_caches_no_data(db_tables):
+    async with market(summary=404, sold={"items": []}) as client:
+        pricing = service(client)
+        price = await pricing.get_price(KEY)
+        await pricing.get_price(KEY)
+
+    assert price.average_price is None
+    assert price.sample_size == 0
+    assert pricing.fetches == 1
+
+
+async def test_price_endpoint_updates_collection_value(client, monkeypatch):
+    summary = {"average": 40.0, "count": 1, "currency": "USD"}
+    async with market(summary=summary, sold={"items": [{"price": 20.0}]}) as http:
+        monkeypatch.setattr(pricing_module, "_pricing_service", service(http))
+        created = []
+        for _ in range(2):
+            response = await client.post("/api/cards", json={
+                "player_name": "Ken Griffey Jr.", "year": 1989, "brand": "Upper Deck", "card_number": "1"
+            })
+            created.append(response.json()["id"])
+        operations = db_writer.operations
+
+        price = (await client.get(f"/api/cards/{created[0]}/price")).json()
+
+    assert price["average_price"] == 30.0
+    # Stored by the single writer, with the collection value of both cards
+    assert db_writer.operations == operations + 1
+    stats = (await client.get("/api/cards/stats")).json()
+    assert (stats["priced_cards"], stats["total_value"]) == (2, 60.0)
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from app.core.config import settings
+from fake_openai import card_image
+from helpers import blob_refcounts, card_count, scan, stored_path, wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def fast_deferral(monkeypatch):
+    """Open the circuit on the first failure and retry deferred scans within about a second"""
+    monkeypatch.setattr(settings, "VISION_MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "VISION_BREAKER_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "VISION_BREAKER_RESET_TIMEOUT", 0.2)
+
+
+async def test_deferred_retry_of_deleted_card_fails_and_keeps_shared_images(fast_deferral, client, fake_openai):
+    fake_openai.default = (503, 0.0)
+    image = card_image("red")
+    deleted, kept = await scan(client, image), await scan(client, image)
+    assert deleted["extraction_retry_job_id"] and kept["extraction_retry_job_id"]
+    assert await blob_refcounts() == [2]
+
+    assert (await client.delete(f"/api/cards/{deleted['card_id']}")).status_code == 200
+    fake_openai.default = (200, 0.0)
+
+    retry = await wait_for_job(client, deleted["extraction_retry_job_id"])
+    assert retry["status"] == "failed"
+    assert retry["error"] == "Card for scan job no longer exists"
+
+    retry = await wait_for_job(client, kept["extraction_retry_job_id"])
+    assert (retry["status"], retry["card_id"], retry["metadata_extracted"]) == ("succeeded", kept["card_id"], True)
+
+    # The failed retry neither created a card nor released the image again
+    assert await card_count() == 1
+    assert await blob_refcounts() == [1]
+    card = (await client.get(f"/api/cards/{kept['card_id']}")).json()
+    assert card["player_name"] == "Ken Griffey Jr."
+    assert os.path.exists(stored_path(card["image_url"]))
+
+
+async def test_deferred_retry_skips_edited_card(fast_deferral, client, fake_openai):
+    fake_openai.default = (503, 0.0)
+    scanned = await scan(client, card_image("blue"))
+    await client.put(f"/api/cards/{scanned['card_id']}", json={"player_name": "Hand Edited"})
+    fake_openai.default = (200, 0.0)
+
+    retry = await wait_for_job(client, scanned["extraction_retry_job_id"])
+
+    assert retry["status"] == "succeeded"
+    assert retry["extraction_error"] == "Card was edited before extraction was retried"
+    assert (await client.get(f"/api/cards/{scanned['card_id']}")).json()["player_name"] == "Hand Edited"
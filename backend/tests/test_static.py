@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+BODY = bytes(range(256)) * 4
+HASHED = "blobs/ab/cd/abcd.0123456789abcdef.jpg"
+
+
+@pytest.fixture
+def stored(client):
+    for name in (HASHED, "legacy/front.jpg"):
+        path = os.path.join(settings.UPLOAD_DIR, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(BODY)
+
+
+async def test_content_hashed_files_are_immutable(client, stored):
+    response = await client.get(f"/uploads/{HASHED}")
+
+    assert response.status_code == 200
+    assert response.content == BODY
+    assert response.headers["etag"] == '"0123456789abcdef"'
+    assert response.headers["cache-control"] == f"public, max-age={settings.UPLOADS_CACHE_MAX_AGE}, immutable"
+    assert response.headers["accept-ranges"] == "bytes"
+
+    revalidated = await client.get(f"/uploads/{HASHED}", headers={"if-none-match": 'W/"0123456789abcdef"'})
+    assert (revalidated.status_code, revalidated.content) == (304, b"")
+
+
+async def test_other_files_must_be_revalidated(client, stored):
+    response = await client.get("/uploads/legacy/front.jpg")
+
+    assert response.headers["cache-control"] == "public, no-cache"
+    etag = response.headers["etag"]
+    assert etag.endswith(f'-{len(BODY):x}"')
+
+    assert (await client.get("/uploads/legacy/front.jpg", headers={"if-none-match": etag})).status_code == 304
+    modified_since = {"if-modified-since": response.headers["last-modified"]}
+    assert (await client.get("/uploads/legacy/front.jpg", headers=modified_since)).status_code == 304
+
+
+async def test_single_byte_ranges(client, stored):
+    url = f"/uploads/{HASHED}"
+
+    partial = await client.get(url, headers={"range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == BODY[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(BODY)}"
+
+    suffix = await client.get(url, headers={"range": "bytes=-5"})
+    assert (suffix.status_code, suffix.content) == (206, BODY[-5:])
+
+    open_ended = await client.get(url, headers={"range": "bytes=1000-"})
+    assert (open_ended.status_code, open_ended.content) == (206, BODY[1000:])
+
+    unsatisfiable = await client.get(url, headers={"range": f"bytes={len(BODY)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(BODY)}"
+
+    # Multiple ranges, or an If-Range for another version, get the whole file
+    for headers in ({"range": "bytes=0-1,5-6"}, {"range": "bytes=0-1", "if-range": '"stale"'}):
+        full = await client.get(url, headers=headers)
+        assert (full.status_code, full.content) == (200, BODY)
+
+
+async def test_head_sends_headers_only(client, stored):
+    response = await client.head(f"/uploads/{HASHED}")
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-length"] == str(len(BODY))
@@ -0,0 +1,54 @@
+import pytest
+
+from app.db.writer import db_writer
+from app.services.vision_cache import VisionCache
+
+pytestmark = pytest.mark.anyio
+
+HASH = "f0f0f0f0f0f0f0f0"
+NEAR_HASH = "f0f0f0f0f0f0f0f1"  # One bit apart
+METADATA = {"player_name": "Ken Griffey Jr.", "card_number": "1"}
+
+
+def verifier(answer: bool, seen: list):
+    async def verify(metadata):
+        seen.append(metadata["card_number"])
+        return answer
+    return verify
+
+
+async def test_writes_go_through_the_single_writer(client):
+    cache = VisionCache(prompt="test")
+    operations = db_writer.operations
+
+    await cache.put(HASH, METADATA, "high")
+
+    assert db_writer.operations == operations + 1
+    assert await cache.get(HASH) == (METADATA, "high")
+
+
+async def test_exact_and_near_hits_are_served_only_once_verified(client):
+    cache = VisionCache(prompt="test", max_distance=3)
+    await cache.put(HASH, METADATA, "high")
+    seen = []
+
+    # Same-template cards can share a hash, so exact matches are checked too
+    assert await cache.get(HASH, verify=verifier(False, seen)) is None
+    assert await cache.get(HASH, verify=verifier(True, seen)) == (METADATA, "high")
+    assert await cache.get(NEAR_HASH, verify=verifier(True, seen)) == (METADATA, "high")
+    assert seen == ["1", "1", "1"]
+
+    # Without a check only exact matches are served
+    assert await cache.get(NEAR_HASH) is None
+    assert await cache.get(HASH) == (METADATA, "high")
+
+    stats = await cache.stats()
+    assert (stats["hits"], stats["near_hits"], stats["rejected"], stats["misses"]) == (3, 1, 2, 2)
+
+
+async def test_results_are_keyed_by_prompt(client):
+    cache = VisionCache(prompt="front only")
+    await cache.put(HASH, METADATA, "high", prompt="front and back")
+
+    assert await cache.get(HASH) is None
+    assert await cache.get(HASH, prompt="front and back") == (METADATA, "high")
@@ -0,0 +1,184 @@
+"""
+VisionService retries, circuit breaker and hedging against a fake
+OpenAI-compatible endpoint (an httpx MockTransport behind the SDK's
+DefaultAsyncHttpxClient)
+"""
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.resilience import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    CircuitBreaker,
+    RetryBudget,
+)
+from app.services.vision_service import VisionService
+from fake_openai import FakeOpenAI, card_image
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "VISION_RETRY_MAX_DELAY", 0.001)
+
+
+def vision(endpoint: FakeOpenAI, max_concurrency: int = 4) -> VisionService:
+    return VisionService(
+        api_key="sk-test",
+        base_url="http://openai.test/v1",
+        max_concurrency=max_concurrency,
+        http_client=endpoint.http_client()
+    )
+
+
+async def test_breaker_opens_then_probe_closes_it(monkeypatch, no_backoff):
+    monkeypatch.setattr(settings, "VISION_MAX_RETRIES", 0)
+    endpoint = FakeOpenAI(default=(503, 0.0))
+    service = vision(endpoint)
+    service.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    image = card_image()
+
+    for _ in range(2):
+        metadata, _, error = await service.extract_card_metadata(image)
+        assert metadata is None and "503" in error
+    assert service.breaker.state == CIRCUIT_OPEN
+
+    # Open: fails fast without calling the API
+    metadata, _, error = await service.extract_card_metadata(image)
+    assert error.startswith("Vision API unavailable")
+    assert endpoint.calls == 2
+    assert service.retry_after() > 0
+
+    # Half-open: one slow probe goes through, concurrent calls are rejected
+    await asyncio.sleep(0.25)
+    endpoint.default = (200, 0.1)
+    probe = asyncio.ensure_future(service.extract_card_metadata(image))
+    await asyncio.sleep(0.02)
+    assert service.breaker.state == CIRCUIT_HALF_OPEN
+    _, _, error = await service.extract_card_metadata(image)
+    assert error.startswith("Vision API unavailable")
+
+    metadata, confidence, error = await probe
+    assert (metadata["player_name"], confidence, error) == ("Ken Griffey Jr.", "high", None)
+    assert service.breaker.state == CIRCUIT_CLOSED
+    assert endpoint.calls == 3
+    assert service.stats()["circuit"]["rejected"] == 2
+
+    metadata, _, _ = await service.extract_card_metadata(image)
+    assert metadata is not None
+    await service.close()
+
+
+async def test_failed_probe_reopens_circuit(monkeypatch, no_backoff):
+    monkeypatch.setattr(settings, "VISION_MAX_RETRIES", 0)
+    endpoint = FakeOpenAI(default=(500, 0.0))
+    service = vision(endpoint)
+    service.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    image = card_image()
+
+    await service.extract_card_metadata(image)
+    await asyncio.sleep(0.15)
+    await service.extract_card_metadata(image)
+
+    assert service.breaker.state == CIRCUIT_OPEN
+    assert service.breaker.times_opened == 2
+    assert endpoint.calls == 2
+    await service.close()
+
+
+async def test_lost_probe_lets_another_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    await asyncio.sleep(0.06)
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    # The probe never reported back
+    await asyncio.sleep(0.06)
+    assert breaker.allow_request()
+
+
+async def test_transient_errors_are_retried(monkeypatch, no_backoff):
+    monkeypatch.setattr(settings, "VISION_MAX_RETRIES", 2)
+    endpoint = FakeOpenAI((429, 0.0), (502, 0.0))
+    service = vision(endpoint)
+
+    metadata, _, error = await service.extract_card_metadata(card_image())
+
+    assert error is None and metadata["year"] == 1989
+    assert endpoint.calls == 3
+    assert service.retries == 2
+    assert service.breaker.state == CIRCUIT_CLOSED
+    await service.close()
+
+
+async def test_client_errors_are_not_retried(monkeypatch, no_backoff):
+    monkeypatch.setattr(settings, "VISION_MAX_RETRIES", 2)
+    endpoint = FakeOpenAI((400, 0.0))
+    service = vision(endpoint)
+
+    _, _, error = await service.extract_card_metadata(card_image())
+
+    assert "400" in error
+    assert endpoint.calls == 1
+    assert service.breaker.stats()["consecutive_failures"] == 0
+    await service.close()
+
+
+async def test_retries_stop_when_budget_runs_out(monkeypatch, no_backoff):
+    monkeypatch.setattr(settings, "VISION_MAX_RETRIES", 10)
+    endpoint = FakeOpenAI(default=(503, 0.0))
+    service = vision(endpoint)
+    service.breaker = CircuitBreaker(failure_threshold=100, reset_timeout=60)
+    service.retry_budget = RetryBudget(ratio=0.5, capacity=2)
+    image = card_image()
+
+    _, _, error = await service.extract_card_metadata(image)
+    assert "503" in error
+    # The first attempt plus the two retries the burst allowed
+    assert endpoint.calls == 3
+    assert (service.retries, service.retries_over_budget) == (2, 1)
+
+    # Each request earns half a retry, so the next one still can't retry
+    await service.extract_card_metadata(image)
+    assert endpoint.calls == 4
+    assert service.retries_over_budget == 2
+    await service.close()
+
+
+def warm_up_latency(service: VisionService, seconds: float = 0.02) -> None:
+    for _ in range(settings.VISION_HEDGE_MIN_SAMPLES):
+        service.latency.record(seconds)
+
+
+async def test_hedge_wins_over_slow_request(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_HEDGE_ENABLED", True)
+    endpoint = FakeOpenAI((200, 5.0), (200, 0.0))
+    service = vision(endpoint)
+    warm_up_latency(service)
+
+    metadata, _, error = await asyncio.wait_for(service.extract_card_metadata(card_image()), 2)
+
+    assert error is None and metadata is not None
+    assert endpoint.calls == 2
+    assert (service.hedges, service.hedge_wins) == (1, 1)
+    await service.close()
+
+
+async def test_no_hedge_without_spare_concurrency(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_HEDGE_ENABLED", True)
+    endpoint = FakeOpenAI((200, 0.3), (200, 0.0))
+    service = vision(endpoint, max_concurrency=1)
+    warm_up_latency(service)
+
+    metadata, _, _ = await service.extract_card_metadata(card_image())
+
+    assert metadata is not None
+    assert endpoint.calls == 1
+    assert service.hedges == 0
+    await service.close()
@@ -0,0 +1,55 @@
+"""
+VisionService against a fake OpenAI-compatible endpoint: the shared client
+serves scans end to end and the semaphore caps requests in flight
+"""
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.vision_service import VisionService, get_vision_service
+from fake_openai import FakeOpenAI, card_image
+from helpers import scan
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_scan_fills_the_card_from_the_vision_api(client, fake_openai):
+    job = await scan(client, card_image("teal"))
+
+    assert (job["status"], job["metadata_extracted"]) == ("succeeded", True)
+    card = (await client.get(f"/api/cards/{job['card_id']}")).json()
+    assert (card["player_name"], card["year"], card["brand"]) == ("Ken Griffey Jr.", 1989, "Upper Deck")
+
+    assert fake_openai.calls == 1
+    request = fake_openai.requests[0]
+    assert request["model"] == settings.VISION_MODEL
+    image = request["messages"][-1]["content"][-1]["image_url"]
+    assert image["url"].startswith("data:image/jpeg;base64,")
+
+
+async def test_scans_use_the_shared_service(client, fake_openai):
+    service = get_vision_service()
+
+    await scan(client, card_image("olive"))
+
+    assert get_vision_service() is service
+    assert fake_openai.calls == 1
+
+
+async def test_concurrency_is_capped():
+    endpoint = FakeOpenAI(default=(200, 0.05))
+    service = VisionService(
+        api_key="sk-test",
+        base_url="http://openai.test/v1",
+        max_concurrency=2,
+        http_client=endpoint.http_client()
+    )
+    colors = ["red", "green", "blue", "black", "gray", "pink"]
+
+    results = await asyncio.gather(*(service.extract_card_metadata(card_image(c)) for c in colors))
+
+    assert all(metadata["player_name"] == "Ken Griffey Jr." for metadata, _, _ in results)
+    assert endpoint.calls == len(colors)
+    assert endpoint.peak_in_flight == 2
+    await service.close()
@@ -1,5 +1,8 @@
 import axios from 'axios';
-import type { Card, CardCreate } from '../types/card';
+import type {
+  Card, CardCreate, CardDetail, CardImportResult, CardListParams, CardPage, CollectionStats, ExportFormat,
+  Extractor, JobStatus, ScanJobAccepted,
+} from '../types/card';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
 
@@ -11,14 +14,20 @@ const api = axios.create({
 });
 
 export const cardApi = {
-  // Get all cards
-  getAllCards: async (): Promise<Card[]> => {
-    const response = await api.get('/cards');
+  // Get a page of cards (pass the previous page's next_cursor to continue)
+  getCards: async (params: CardListParams = {}): Promise<CardPage> => {
+    const response = await api.get('/cards', { params });
     return response.data;
   },
 
-  // Get single card
-  getCard: async (id: number): Promise<Card> => {
+  // Get collection totals (computed server-side, no need to page through every card)
+  getStats: async (): Promise<CollectionStats> => {
+    const response = await api.get('/cards/stats');
+    return response.data;
+  },
+
+  // Get single card, with its back image if it was scanned
+  getCard: async (id: number): Promise<CardDetail> => {
     const response = await api.get(`/cards/${id}`);
     return response.data;
   },
@@ -29,20 +38,60 @@ export const cardApi = {
     return response.data;
   },
 
-  // Scan card image
-  scanCard: async (file: File) => {
+  // Download URL for the whole collection (streamed by the server)
+  getExportUrl: (format: ExportFormat = 'csv'): string =>
+    `${API_BASE_URL}/cards/export?format=${format}`,
+
+  // Bulk-import cards from a CSV, NDJSON or Parquet file
+  importCards: async (file: File): Promise<CardImportResult> => {
+    const formData = new FormData();
+    formData.append('file', file);
+
+    const response = await api.post('/cards/import', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+    return response.data;
+  },
+
+  // Add set checklists (CSV, NDJSON or Parquet) to the reference catalog scans are matched against
+  importCatalog: async (file: File): Promise<CardImportResult> => {
     const formData = new FormData();
     formData.append('file', file);
 
+    const response = await api.post('/catalog/import', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+    return response.data;
+  },
+
+  // Scan card image, optionally with its back (metadata extraction runs as a background job);
+  // extractor overrides the server's EXTRACTION_MODE
+  scanCard: async (file: File, back?: File, extractor?: Extractor): Promise<ScanJobAccepted> => {
+    const formData = new FormData();
+    formData.append('file', file);
+    if (back) {
+      formData.append('back', back);
+    }
+
     const response = await api.post('/cards/scan', formData, {
+      params: extractor ? { extractor } : undefined,
       headers: {
         'Content-Type': 'multipart/form-data',
       },
-      timeout: 30000, // 30 second timeout for Vision API processing
     });
     return response.data;
   },
 
+  // Get status of a background job (e.g. a queued scan)
+  getJob: async (jobId: string): Promise<JobStatus> => {
+    const response = await api.get(`/jobs/${jobId}`);
+    return response.data;
+  },
+
   // Get card price
   getCardPrice: async (id: number) => {
     const response = await api.get(`/cards/${id}/price`);
@@ -14,15 +14,105 @@ export interface CardCreate extends CardBase {}
 export interface Card extends CardBase {
   id: number;
   image_url?: string;
+  // Derivative URLs by format then pixel width, e.g. { webp: { "96": url } }
+  image_srcset?: Record<string, Record<string, string>>;
   created_at: string;
   updated_at: string;
 }
 
+export interface CardImage {
+  side: string; // "back"
+  image_url: string;
+  image_srcset?: Record<string, Record<string, string>>;
+}
+
+export interface CardDetail extends Card {
+  images: CardImage[];
+}
+
+export interface CardPage {
+  items: Partial<Card>[];
+  next_cursor?: string;
+}
+
+export interface CardListParams {
+  limit?: number;
+  cursor?: string;
+  fields?: string;
+  sport?: string;
+  year_min?: number;
+  year_max?: number;
+  brand?: string;
+  set_name?: string;
+  player_name?: string;
+}
+
 export interface CardPrice {
   card_id: number;
   average_price: number;
   low_price?: number;
   high_price?: number;
+  currency: string;
+  sample_size: number;
   last_updated: string;
   sources: string[];
 }
+
+// Metadata extractor for a scan: vision API, local OCR, or OCR first with the API as fallback
+export type Extractor = 'cloud' | 'local' | 'auto';
+
+export interface ScanJobAccepted {
+  message: string;
+  job_id: string;
+  status: string;
+  image_url: string;
+  back_image_url?: string;
+}
+
+export interface JobStatus {
+  id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  card_id?: number;
+  attempts: number;
+  error?: string;
+  metadata_extracted?: boolean;
+  extraction_confidence?: string;
+  extraction_error?: string;
+  extraction_retry_job_id?: string; // Set when extraction is retried after a vision API outage
+  card?: Card;
+  result?: Record<string, unknown>;
+  created_at: string;
+  updated_at: string;
+}
+
+export interface StatsBucket {
+  value: string | null;
+  card_count: number;
+  priced_count: number;
+  total_value: number;
+}
+
+export interface CollectionStats {
+  total_cards: number;
+  priced_cards: number;
+  total_value: number;
+  currency: string;
+  by_sport: StatsBucket[];
+  by_year: StatsBucket[];
+  by_brand: StatsBucket[];
+}
+
+export type ExportFormat = 'csv' | 'ndjson' | 'parquet';
+
+export interface ImportRowError {
+  row: number;
+  errors: { field: string | null; message: string }[];
+}
+
+export interface CardImportResult {
+  total: number;
+  created: number;
+  failed: number;
+  errors: ImportRowError[];
+}